@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Compare PyMuPDF and pdfminer.six text extraction on a local corpus of PDFs,
+with and without the character budget used by arxiv_search_tool.
+
+Usage:
+    python benchmarks/bench_pdf_extraction.py path/to/pdfs [--max-pages 6] [--max-chars 5000]
+                                                           [--repeat 3] [--json out.json]
+"""
+import argparse
+import glob
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.research_tools import clean_text, extract_text_pdfminer, extract_text_pymupdf
+
+ENGINES = {
+    "pymupdf": extract_text_pymupdf,
+    "pdfminer": extract_text_pdfminer,
+}
+
+
+def bench_file(fn, pdf_bytes: bytes, max_pages, max_chars, repeat: int):
+    timings = []
+    text = ""
+    for _ in range(repeat):
+        started = time.perf_counter()
+        text = fn(pdf_bytes, max_pages=max_pages, max_chars=max_chars)
+        timings.append(time.perf_counter() - started)
+    return min(timings), len(clean_text(text))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("corpus", help="Directory containing sample PDFs")
+    parser.add_argument("--max-pages", type=int, default=6)
+    parser.add_argument("--max-chars", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per file; the fastest is kept")
+    parser.add_argument("--json", dest="json_path", help="Write raw results to this file")
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.corpus, "**", "*.pdf"), recursive=True))
+    if not paths:
+        sys.exit(f"No PDFs found under {args.corpus}")
+
+    modes = {
+        "pages-only": (args.max_pages, None),
+        "budgeted": (args.max_pages, args.max_chars),
+    }
+    results = []
+    for path in paths:
+        with open(path, "rb") as f:
+            pdf_bytes = f.read()
+        for engine, fn in ENGINES.items():
+            for mode, (max_pages, max_chars) in modes.items():
+                try:
+                    seconds, chars = bench_file(fn, pdf_bytes, max_pages, max_chars, args.repeat)
+                    results.append({"file": os.path.basename(path), "engine": engine, "mode": mode,
+                                    "seconds": seconds, "chars": chars})
+                except Exception as e:
+                    print(f"ERROR: {engine}/{mode} failed on {path}: {e}")
+
+    print(f"\n{len(paths)} PDFs, max_pages={args.max_pages}, max_chars={args.max_chars}\n")
+    print(f"{'engine':<10} {'mode':<11} {'files':>5} {'total s':>9} {'mean ms':>9} {'p95 ms':>9} {'chars/file':>11}")
+    for engine in ENGINES:
+        for mode in modes:
+            rows = [r for r in results if r["engine"] == engine and r["mode"] == mode]
+            if not rows:
+                continue
+            secs = sorted(r["seconds"] for r in rows)
+            p95 = secs[min(len(secs) - 1, int(round(0.95 * (len(secs) - 1))))]
+            print(
+                f"{engine:<10} {mode:<11} {len(rows):>5} {sum(secs):>9.2f} "
+                f"{statistics.mean(secs) * 1000:>9.1f} {p95 * 1000:>9.1f} "
+                f"{statistics.mean(r['chars'] for r in rows):>11.0f}"
+            )
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,500 @@
+# -*- coding: utf-8 -*-
+"""
+End-to-end benchmark of the orchestration layer: planner_agent ->
+run_agent_workflow -> executor_agent_step, with the Azure OpenAI client and
+the research tools replaced by stubs that sleep for lognormally distributed
+latencies and return text of lognormally distributed size. Model and network
+time are therefore synthetic; what changes between commits is the
+orchestration around them.
+
+Reports wall time per step, end-to-end p50/p95, peak thread count, peak RSS
+and prompt tokens per task (estimated as characters / 4), and writes them to
+a JSON file that a later run can be compared against. Run with
+--llm-latency-ms 0 --tool-latency-ms 0 to measure orchestration cost alone.
+
+Plan steps run as a dependency graph by default; --schedule linear runs them
+strictly one after another, e.g. to measure what the scheduler saves:
+    python benchmarks/bench_workflow.py --schedule linear --json linear.json
+    python benchmarks/bench_workflow.py --compare linear.json
+
+Usage:
+    python benchmarks/bench_workflow.py [--tasks 8] [--concurrency 4] [--async]
+                                        [--schedule dag|linear]
+                                        [--llm-latency-ms 800] [--tool-latency-ms 300]
+                                        [--json out.json] [--compare baseline.json] [--verbose]
+"""
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SCHEMA_VERSION = 1
+_TASK_RE = re.compile(r"Benchmark task (\d+)")
+_DATE_RE = re.compile(r"Today is \d{4}-\d{2}-\d{2}\.")
+_VOCABULARY = [f"{a}{b}" for a in ("lo", "re", "mi", "sa", "tu", "ve", "ko", "da") for b in range(250)]
+
+# Summary metrics where lower is better; used by --compare
+COMPARED_METRICS = [
+    "e2e_p50_s",
+    "e2e_p95_s",
+    "peak_threads",
+    "peak_rss_mb",
+    "prompt_tokens_per_task",
+]
+
+
+def percentile(values, q: float):
+    values = sorted(values)
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+class Backend:
+    """
+    Shared state of the stubs: seeded distributions and per-task accounting.
+    Each call draws from a generator seeded by its own request, so results
+    don't depend on the order in which concurrent calls arrive.
+    """
+
+    def __init__(self, args):
+        self.args = args
+        self._lock = threading.Lock()
+        self.tasks = {}
+        self._prefixes = set()
+
+    def rng(self, request: str) -> random.Random:
+        return random.Random(f"{self.args.seed}:{request}")
+
+    @staticmethod
+    def draw(rng: random.Random, median: float, sigma: float) -> float:
+        if median <= 0:
+            return 0.0
+        return rng.lognormvariate(math.log(median), sigma)
+
+    def account(self, text: str, **deltas):
+        m = _TASK_RE.search(text)
+        if not m:
+            return
+        with self._lock:
+            stats = self.tasks.setdefault(
+                int(m.group(1)),
+                {"llm_calls": 0, "tool_calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0,
+                 "llm_seconds": 0.0, "tool_seconds": 0.0},
+            )
+            for name, delta in deltas.items():
+                stats[name] += delta
+
+    def cached_tokens(self, prompt_text: str) -> int:
+        """
+        Stand-in for the provider's prompt prefix cache: prompts are cached in
+        128-token blocks once they reach 1024 tokens, and a block counts as
+        cached if any earlier call sent the same prefix.
+        """
+        block = 128 * 4
+        h = hashlib.sha256()
+        digests = []
+        for end in range(block, len(prompt_text) + 1, block):
+            h.update(prompt_text[end - block:end].encode("utf-8"))
+            digests.append((end, h.hexdigest()))
+        cached = 0
+        with self._lock:
+            for end, digest in digests:
+                if digest not in self._prefixes:
+                    break
+                cached = end
+            self._prefixes.update(digest for _, digest in digests)
+        return cached // 4 if cached >= 1024 * 4 else 0
+
+    def text(self, rng: random.Random, median_chars: float) -> str:
+        n = max(1, int(self.draw(rng, median_chars, self.args.size_sigma)))
+        # Random words, so distinct results don't look like near-duplicates to the dedup stage
+        words = []
+        length = 0
+        while length < n:
+            words.append(_VOCABULARY[rng.randrange(len(_VOCABULARY))])
+            length += len(words[-1]) + 1
+        return " ".join(words)[:n]
+
+
+class StubCompletions:
+    def __init__(self, backend: Backend):
+        self.backend = backend
+
+    def _respond(self, kwargs):
+        args = self.backend.args
+        prompt_text = "\n".join(str(m.get("content", "")) for m in kwargs["messages"])
+        rng = self.backend.rng(_DATE_RE.sub("", prompt_text))
+        content = self.backend.text(rng, args.completion_chars)
+        tool_calls = None
+        if kwargs.get("tools"):
+            # Research step: ask for every tool once, with a query unique to the task
+            m = _TASK_RE.search(prompt_text)
+            topic = f"benchmark topic {m.group(1) if m else 0}"
+            tool_calls = [
+                types.SimpleNamespace(
+                    id=f"call_{i}",
+                    type="function",
+                    function=types.SimpleNamespace(name=tool["function"]["name"], arguments=json.dumps({"query": topic})),
+                )
+                for i, tool in enumerate(kwargs["tools"])
+            ]
+        prompt_tokens = len(prompt_text) // 4
+        completion_tokens = len(content) // 4
+        cached_tokens = self.backend.cached_tokens(prompt_text)
+        latency = self.backend.draw(rng, args.llm_latency_ms, args.llm_sigma) / 1000
+        self.backend.account(
+            prompt_text, llm_calls=1, prompt_tokens=prompt_tokens, cached_tokens=cached_tokens,
+            completion_tokens=completion_tokens, llm_seconds=latency,
+        )
+        resp = types.SimpleNamespace(
+            choices=[types.SimpleNamespace(message=types.SimpleNamespace(content=content, tool_calls=tool_calls))],
+            usage=types.SimpleNamespace(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                total_tokens=prompt_tokens + completion_tokens,
+                prompt_tokens_details=types.SimpleNamespace(cached_tokens=cached_tokens),
+            ),
+        )
+        return latency, resp
+
+    def create(self, **kwargs):
+        latency, resp = self._respond(kwargs)
+        time.sleep(latency)
+        return resp
+
+
+class AsyncStubCompletions(StubCompletions):
+    async def create(self, **kwargs):
+        latency, resp = self._respond(kwargs)
+        await asyncio.sleep(latency)
+        return resp
+
+
+def stub_client(completions):
+    return types.SimpleNamespace(chat=types.SimpleNamespace(completions=completions))
+
+
+def make_tools(backend: Backend):
+    """Stub tools with the real signatures, so the single-flight/cassette wrappers see the same arguments."""
+    args = backend.args
+
+    def _results(tool: str, query: str, n: int):
+        rng = backend.rng(f"{tool}:{query}:{n}")
+        latency = backend.draw(rng, args.tool_latency_ms, args.tool_sigma) / 1000
+        backend.account(query.replace("benchmark topic", "Benchmark task"), tool_calls=1, tool_seconds=latency)
+        results = [
+            {"title": f"{query} result {i}", "content": backend.text(rng, args.result_chars),
+             "url": f"https://example.org/{tool}/{query.replace(' ', '-')}/{i}",
+             "summary": backend.text(rng, args.result_chars), "authors": ["A. Author"], "published": "2024-01-01",
+             "link_pdf": f"https://example.org/{tool}/{query.replace(' ', '-')}/{i}.pdf"}
+            for i in range(n)
+        ]
+        return latency, results
+
+    def tavily(query: str, max_results: int = 20, include_images: bool = False):
+        latency, results = _results("tavily", query, min(max_results, args.tool_results))
+        time.sleep(latency)
+        return results
+
+    def arxiv(query: str, max_results: int = 20):
+        latency, results = _results("arxiv", query, min(max_results, args.tool_results))
+        time.sleep(latency)
+        return results
+
+    def wikipedia(query: str, sentences: int = 5):
+        latency, results = _results("wikipedia", query, 1)
+        time.sleep(latency)
+        return results
+
+    async def tavily_async(query: str, max_results: int = 20, include_images: bool = False):
+        latency, results = _results("tavily", query, min(max_results, args.tool_results))
+        await asyncio.sleep(latency)
+        return results
+
+    async def arxiv_async(query: str, max_results: int = 20):
+        latency, results = _results("arxiv", query, min(max_results, args.tool_results))
+        await asyncio.sleep(latency)
+        return results
+
+    async def wikipedia_async(query: str, sentences: int = 5):
+        latency, results = _results("wikipedia", query, 1)
+        await asyncio.sleep(latency)
+        return results
+
+    return (
+        {"tavily_search_tool": tavily, "arxiv_search_tool": arxiv, "wikipedia_search_tool": wikipedia},
+        {"tavily_search_tool": tavily_async, "arxiv_search_tool": arxiv_async,
+         "wikipedia_search_tool": wikipedia_async},
+    )
+
+
+def install_stubs(backend: Backend):
+    import src.llm_gateway as llm_gateway
+    import src.research_tools as research_tools
+
+    llm_gateway.llm_gateway = llm_gateway.LLMGateway(
+        client=stub_client(StubCompletions(backend)),
+        async_client=stub_client(AsyncStubCompletions(backend)),
+    )
+    sync_tools, async_tools = make_tools(backend)
+    for name, fn in sync_tools.items():
+        research_tools.tool_mapping[name] = research_tools._single_flight(name, research_tools._recorded(name, fn))
+    for name, fn in async_tools.items():
+        research_tools.async_tool_mapping[name] = research_tools._single_flight_async(
+            name, research_tools._recorded_async(name, fn)
+        )
+
+
+class ThreadSampler:
+    """Tracks the peak number of live threads while the block runs."""
+
+    def __init__(self, interval: float = 0.02):
+        self.interval = interval
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, threading.active_count())
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, name="thread-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def run(args) -> dict:
+    tmp = tempfile.mkdtemp(prefix="bench-workflow-")
+    os.environ["USE_COSMOS_DB"] = "false"
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    os.environ["CASSETTE_MODE"] = "off"
+    os.environ["LLM_CACHE_ENABLED"] = "false"
+    # The stub client answers whole completions only
+    os.environ["STREAM_COMPLETIONS"] = "false"
+    os.environ["WORKFLOW_DAG"] = "true" if args.schedule == "dag" else "false"
+    os.environ.setdefault("AZURE_OPENAI_KEY", "benchmark")
+    os.environ.setdefault("TAVILY_API_KEY", "benchmark")
+    os.chdir(ROOT)  # main.py mounts ./static and ./templates
+
+    import main
+    from src.memory_monitor import PeakRssMonitor
+    from src.fanout import get_fanout_limiter
+    from src.planning_agent import planner_agent
+
+    backend = Backend(args)
+    install_stubs(backend)
+
+    def start_task(k: int):
+        prompt = f"Benchmark task {k}: survey recent work on topic {k}"
+        task_id = f"bench-{k}"
+        db = main.SessionLocal()
+        db.add(main.Task(id=task_id, prompt=prompt, status="running"))
+        db.commit()
+        db.close()
+        steps = planner_agent(prompt)
+        main.task_progress[task_id] = {
+            "steps": [{"title": s, "status": "pending", "description": "", "substeps": []} for s in steps]
+        }
+        return task_id, prompt, steps
+
+    timings = {}
+
+    def run_task(k: int):
+        task_id, prompt, steps = start_task(k)
+        started = time.perf_counter()
+        main.run_agent_workflow(task_id, prompt, steps, {"reportFormat": "academic"})
+        timings[k] = time.perf_counter() - started
+
+    async def run_task_async(k: int, slots: asyncio.Semaphore):
+        async with slots:
+            task_id, prompt, steps = start_task(k)
+            started = time.perf_counter()
+            await main.run_agent_workflow_async(task_id, prompt, steps, {"reportFormat": "academic"})
+            timings[k] = time.perf_counter() - started
+
+    async def run_all_async():
+        slots = asyncio.Semaphore(args.concurrency)
+        await asyncio.gather(*(run_task_async(k, slots) for k in range(args.tasks)))
+        await main.close_async_http()
+
+    # The agents print their full outputs; keep them out of the report unless asked for
+    output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+
+    started = time.perf_counter()
+    with output, PeakRssMonitor() as rss, ThreadSampler() as threads:
+        if args.use_async:
+            asyncio.run(run_all_async())
+        else:
+            with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                list(pool.map(run_task, range(args.tasks)))
+    wall = time.perf_counter() - started
+
+    tasks = []
+    for k in range(args.tasks):
+        steps = main.task_progress[f"bench-{k}"]["steps"]
+        stats = backend.tasks.get(k, {})
+        tasks.append({
+            "task": k,
+            "seconds": round(timings.get(k, 0.0), 3),
+            "status": "error" if any(s["status"] == "error" for s in steps) else "done",
+            "step_seconds": [s.get("seconds") for s in steps],
+            "step_agents": [s["substeps"][-1]["title"].replace("Called ", "") if s["substeps"] else None
+                            for s in steps],
+            **{name: round(v, 3) if isinstance(v, float) else v for name, v in stats.items()},
+        })
+
+    e2e = [t["seconds"] for t in tasks]
+    n_steps = max(len(t["step_seconds"]) for t in tasks)
+    steps = []
+    for i in range(n_steps):
+        secs = [t["step_seconds"][i] for t in tasks if i < len(t["step_seconds"]) and t["step_seconds"][i] is not None]
+        steps.append({
+            "step": i + 1,
+            "agent": tasks[0]["step_agents"][i],
+            "p50_s": percentile(secs, 0.5),
+            "p95_s": percentile(secs, 0.95),
+        })
+    summary = {
+        "tasks": len(tasks),
+        "errors": sum(1 for t in tasks if t["status"] == "error"),
+        "wall_s": round(wall, 3),
+        "throughput_tasks_per_s": round(len(tasks) / wall, 3) if wall else None,
+        "e2e_p50_s": percentile(e2e, 0.5),
+        "e2e_p95_s": percentile(e2e, 0.95),
+        "peak_threads": threads.peak,
+        "peak_rss_mb": rss.as_dict()["peak_mb"],
+        "prompt_tokens_per_task": round(statistics.mean(t.get("prompt_tokens", 0) for t in tasks)),
+        "prompt_tokens_p95": percentile([t.get("prompt_tokens", 0) for t in tasks], 0.95),
+        # Prompt tokens the provider's prefix cache would serve (simulated)
+        "cached_tokens_per_task": round(statistics.mean(t.get("cached_tokens", 0) for t in tasks)),
+        "llm_calls_per_task": round(statistics.mean(t.get("llm_calls", 0) for t in tasks), 2),
+        "tool_calls_per_task": round(statistics.mean(t.get("tool_calls", 0) for t in tasks), 2),
+        # Summed over calls, so parallel calls count in full
+        "llm_seconds_per_task": round(statistics.mean(t.get("llm_seconds", 0.0) for t in tasks), 3),
+        # Where the adaptive section-writing concurrency ended up
+        "fanout_limit": get_fanout_limiter().stats()["limit"],
+    }
+    return {
+        "schema": SCHEMA_VERSION,
+        "name": args.name,
+        "created_at": datetime.utcnow().isoformat(),
+        "git_commit": git_commit(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("json_path", "compare", "name", "tolerance", "verbose")},
+        "summary": summary,
+        "steps": steps,
+        "tasks": tasks,
+    }
+
+
+def print_report(result: dict):
+    s = result["summary"]
+    cfg = result["config"]
+    mode = "async" if cfg["use_async"] else "threads"
+    print(f"\n{s['tasks']} tasks, concurrency={cfg['concurrency']}, mode={mode}, schedule={cfg.get('schedule', 'linear')}, "
+          f"llm~{cfg['llm_latency_ms']}ms, tools~{cfg['tool_latency_ms']}ms, seed={cfg['seed']}\n")
+    print(f"{'step':<5} {'agent':<22} {'p50 s':>8} {'p95 s':>8}")
+    for st in result["steps"]:
+        print(f"{st['step']:<5} {st['agent'] or '-':<22} {st['p50_s'] or 0:>8.3f} {st['p95_s'] or 0:>8.3f}")
+    print()
+    for key, value in s.items():
+        print(f"{key:<24} {value}")
+
+
+def compare(result: dict, baseline_path: str, tolerance: float) -> bool:
+    """Print metric deltas against a baseline run. Returns True if any metric regressed."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    if baseline.get("schema") != result["schema"]:
+        print(f"\nBaseline schema {baseline.get('schema')} != {result['schema']}; not comparing")
+        return False
+    # Comparing schedules is the point of --schedule, so that difference is only reported
+    old_config = dict(baseline.get("config", {}))
+    new_config = dict(result["config"])
+    old_schedule = old_config.pop("schedule", "linear")
+    new_schedule = new_config.pop("schedule", "linear")
+    if old_config != new_config:
+        print("\nWARNING: baseline was run with a different configuration")
+    if old_schedule != new_schedule:
+        print(f"\nSchedule: {old_schedule} (baseline) -> {new_schedule}")
+
+    regressed = False
+    print(f"\nvs {baseline_path} ({baseline.get('git_commit')}), tolerance {tolerance:.0%}")
+    print(f"{'metric':<24} {'baseline':>10} {'current':>10} {'change':>8}")
+    for metric in COMPARED_METRICS:
+        old, new = baseline["summary"].get(metric), result["summary"].get(metric)
+        if old is None or new is None:
+            continue
+        change = (new - old) / old if old else 0.0
+        flag = ""
+        if change > tolerance:
+            flag = "  REGRESSION"
+            regressed = True
+        print(f"{metric:<24} {old:>10} {new:>10} {change:>+8.1%}{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=4, help="Workflows run at the same time")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="Use run_agent_workflow_async")
+    parser.add_argument("--schedule", choices=("dag", "linear"), default="dag",
+                        help="Run plan steps by their dependencies, or strictly in order")
+    parser.add_argument("--llm-latency-ms", type=float, default=800, help="Median model latency")
+    parser.add_argument("--llm-sigma", type=float, default=0.5, help="Lognormal sigma of model latency")
+    parser.add_argument("--tool-latency-ms", type=float, default=300, help="Median tool latency")
+    parser.add_argument("--tool-sigma", type=float, default=0.6, help="Lognormal sigma of tool latency")
+    parser.add_argument("--completion-chars", type=float, default=3000, help="Median completion length")
+    parser.add_argument("--result-chars", type=float, default=600, help="Median length of each tool result field")
+    parser.add_argument("--tool-results", type=int, default=10, help="Results returned per search")
+    parser.add_argument("--size-sigma", type=float, default=0.4, help="Lognormal sigma of text sizes")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--name", default="workflow")
+    parser.add_argument("--json", dest="json_path", help="Write results to this file")
+    parser.add_argument("--compare", help="Baseline results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed relative regression")
+    parser.add_argument("--verbose", action="store_true", help="Show the agents' own output")
+    args = parser.parse_args()
+
+    result = run(args)
+    print_report(result)
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(result, f, indent=2)
+
+    if args.compare and compare(result, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
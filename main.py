@@ -2,11 +2,13 @@
 import os
 import uuid
 import json
+import time
+import asyncio
 import threading
 from datetime import datetime
 from typing import Optional, Literal
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import HTMLResponse, JSONResponse, Response
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
@@ -15,9 +17,22 @@ from sqlalchemy import create_engine, Column, Text, DateTime, String
 from sqlalchemy.orm import sessionmaker, declarative_base
 from dotenv import load_dotenv
 
-from src.planning_agent import planner_agent, executor_agent_step
+from src.planning_agent import planner_agent, plan_dependencies, executor_agent_step, executor_agent_step_async
+from src.workflow_dag import run_dag, run_dag_async, ancestors, linear_dependencies
 from src.cosmos_db import get_cosmos_service, CosmosDBService
 from src.content_filter import check_content_safety, is_content_safe
+from src.text_cache import get_text_cache
+from src.research_tools import tavily_cache_stats, wikipedia_cache_stats, single_flight_stats, close_async_http
+from src.memory_monitor import PeakRssMonitor
+from src.cassette import get_cassette_store
+from src.result_dedup import dedup_stats
+from src.relevance import ranking_stats
+from src.section_context import section_context_stats
+from src.paper_index import get_paper_index
+from src.llm_cache import get_llm_cache, llm_cache_scope, llm_cache_hits_summary
+from src.task_stream import get_task_streams, task_stream_scope, close_task_stream
+from src.llm_gateway import get_llm_gateway
+from src.fanout import get_fanout_limiter
 
 import html, textwrap
 import markdown
@@ -33,6 +48,11 @@ load_dotenv()
 
 # API keys are loaded from .env file via load_dotenv() above
 
+# Run workflows as coroutines on the server's event loop instead of one thread per task
+ASYNC_WORKFLOW = os.getenv("ASYNC_WORKFLOW", "false").lower() == "true"
+# Run plan steps as soon as the steps they depend on are done, instead of strictly one after another
+WORKFLOW_DAG = os.getenv("WORKFLOW_DAG", "true").lower() == "true"
+
 # Database configuration
 USE_COSMOS_DB = os.getenv("USE_COSMOS_DB", "true").lower() == "true"
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./research_agent.db")
@@ -90,6 +110,21 @@ templates = Jinja2Templates(directory="templates")
 
 task_progress = {}
 
+# Set on startup; async workflows are scheduled onto this loop from the request threads
+_event_loop = None
+_workflow_futures = set()
+
+
+@app.on_event("startup")
+async def _capture_event_loop():
+    global _event_loop
+    _event_loop = asyncio.get_running_loop()
+
+
+@app.on_event("shutdown")
+async def _close_async_clients():
+    await close_async_http()
+
 
 class PromptRequest(BaseModel):
     prompt: str
@@ -107,6 +142,29 @@ def health_check(request: Request):
     return {"status": "ok"}
 
 
+@app.get("/cache_stats")
+def get_cache_stats():
+    """Hit/miss counters for the research caches"""
+    text_cache = get_text_cache()
+    paper_index = get_paper_index()
+    llm_cache = get_llm_cache()
+    cassette_store = get_cassette_store()
+    return {
+        "arxiv_text": text_cache.stats() if text_cache else None,
+        "paper_index": paper_index.stats() if paper_index else None,
+        "tavily": tavily_cache_stats(),
+        "wikipedia": wikipedia_cache_stats(),
+        "single_flight": single_flight_stats(),
+        "dedup": dedup_stats(),
+        "ranking": ranking_stats(),
+        "section_context": section_context_stats(),
+        "llm_responses": llm_cache.stats() if llm_cache else None,
+        "llm_gateway": get_llm_gateway().stats(),
+        "fanout": get_fanout_limiter().stats(),
+        "cassette": cassette_store.stats() if cassette_store else None,
+    }
+
+
 @app.post("/generate_report")
 def generate_report(req: PromptRequest):
     # Content safety check
@@ -153,10 +211,19 @@ def generate_report(req: PromptRequest):
     # Get session_id from request if available
     session_id = getattr(req, 'session_id', None)
 
-    thread = threading.Thread(
-        target=run_agent_workflow, args=(task_id, req.prompt, initial_plan_steps, req.advanced_options, session_id)
-    )
-    thread.start()
+    if ASYNC_WORKFLOW and _event_loop is not None:
+        future = asyncio.run_coroutine_threadsafe(
+            run_agent_workflow_async(task_id, req.prompt, initial_plan_steps, req.advanced_options, session_id),
+            _event_loop,
+        )
+        # Keep a reference until the workflow finishes
+        _workflow_futures.add(future)
+        future.add_done_callback(_workflow_futures.discard)
+    else:
+        thread = threading.Thread(
+            target=run_agent_workflow, args=(task_id, req.prompt, initial_plan_steps, req.advanced_options, session_id)
+        )
+        thread.start()
     return {"task_id": task_id}
 
 
@@ -165,6 +232,50 @@ def get_task_progress(task_id: str):
     return task_progress.get(task_id, {"steps": []})
 
 
+@app.get("/task_stream/{task_id}")
+async def stream_task(task_id: str, request: Request):
+    """
+    Server-sent events with the writer and editor output of a running task as
+    it is generated: "step" when a workflow step starts, "delta" for each piece
+    of text (per report section in parallel writing), "part_done", and "done"
+    when the task has finished. The stored result is still fetched from
+    /task_status.
+    """
+    progress = task_progress.get(task_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    streams = get_task_streams()
+    finished = progress["steps"] and all(s["status"] in ("done", "error") for s in progress["steps"])
+    if finished and not streams.known(task_id):
+        # Finished before the retention window; nothing left to replay
+        status = "error" if any(s["status"] == "error" for s in progress["steps"]) else "done"
+        events = _single_event({"type": "done", "status": status})
+    else:
+        events = streams.subscribe(task_id)
+
+    async def sse():
+        try:
+            async for event in events:
+                if await request.is_disconnected():
+                    break
+                if event is None:
+                    yield ": ping\n\n"
+                else:
+                    yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            await events.aclose()
+
+    return StreamingResponse(
+        sse(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _single_event(event: dict):
+    yield event
+
+
 @app.get("/task_status/{task_id}")
 def get_task_status(task_id: str):
     if USE_COSMOS_DB and db_service:
@@ -338,46 +449,20 @@ def format_history_html(history):
     return "".join(formatted)
 
 
-def run_agent_workflow(task_id: str, prompt: str, initial_plan_steps: list, advanced_options: dict = None, session_id: str = None):
-    # Store session_id for later use
-    run_agent_workflow.current_session_id = session_id
-    
-    steps_data = task_progress[task_id]["steps"]
-    execution_history = []
+def _update_step_status(steps_data, index, status, description="", substep=None):
+    if index < len(steps_data):
+        steps_data[index]["status"] = status
+        if description:
+            steps_data[index]["description"] = description
+        if substep:
+            steps_data[index]["substeps"].append(substep)
+        steps_data[index]["updated_at"] = datetime.utcnow().isoformat()
 
-    def update_step_status(index, status, description="", substep=None):
-        if index < len(steps_data):
-            steps_data[index]["status"] = status
-            if description:
-                steps_data[index]["description"] = description
-            if substep:
-                steps_data[index]["substeps"].append(substep)
-            steps_data[index]["updated_at"] = datetime.utcnow().isoformat()
 
-    try:
-        for i, plan_step_title in enumerate(initial_plan_steps):
-            update_step_status(i, "running", f"Executing: {plan_step_title}")
-
-            actual_step_description, agent_name, output = executor_agent_step(
-                plan_step_title, execution_history, prompt, advanced_options
-            )
-
-            execution_history.append([plan_step_title, actual_step_description, output])
-
-            def esc(s: str) -> str:
-                return html.escape(s or "")
-
-            def nl2br(s: str) -> str:
-                return esc(s).replace("\n", "<br>")
-
-            # ...
-            update_step_status(
-                i,
-                "done",
-                f"Completed: {plan_step_title}",
-                {
-                    "title": f"Called {agent_name}",
-                    "content": f"""
+def _step_substep(prompt: str, agent_name: str, actual_step_description: str, output: str, execution_history: list) -> dict:
+    return {
+        "title": f"Called {agent_name}",
+        "content": f"""
 <div style='border:1px solid #ccc; border-radius:8px; padding:10px; margin:8px 0; background:#fff; color:#000000;'>
   <div style='font-weight:bold; color:#2563eb;'>User Prompt</div>
   <div style='white-space:pre-wrap; color:#000000;'>{prompt}</div>
@@ -397,78 +482,199 @@ def run_agent_workflow(task_id: str, prompt: str, initial_plan_steps: list, adva
   </div>
 </div>
 """.strip(),
-                },
+    }
+
+
+def _wants_fresh_output(advanced_options: dict = None) -> bool:
+    """advanced_options.freshOutput makes every model call of the task bypass the response cache"""
+    return bool(advanced_options and advanced_options.get("freshOutput"))
+
+
+def _record_llm_cache_hits(steps_data, index, hits: list):
+    if hits and index < len(steps_data):
+        steps_data[index]["llm_cache_hits"] = len(hits)
+        steps_data[index]["substeps"].append({"title": "Response cache", "content": llm_cache_hits_summary(hits)})
+
+
+def _save_task_result(task_id: str, result: dict, final_report_markdown: str, session_id: str = None):
+    # Update task in database
+    if USE_COSMOS_DB and db_service:
+        try:
+            db_service.update_task(task_id=task_id, status="done", result=json.dumps(result))
+            
+            # Save final report to chat session if session exists
+            if session_id:
+                try:
+                    db_service.add_message(
+                        session_id=session_id,
+                        message_type="assistant",
+                        content=final_report_markdown,
+                        metadata={
+                            "task_id": task_id,
+                            "report_type": "final_research_report",
+                            "workflow_completed": True
+                        }
+                    )
+                    print(f"Final report saved to chat session: {session_id}")
+                except Exception as e:
+                    print(f"Error saving final report to chat session: {e}")
+                    
+        except Exception as e:
+            print(f"Error updating task in Cosmos DB: {e}")
+    else:
+        # Fallback to SQLite
+        db = SessionLocal()
+        task = db.query(Task).filter(Task.id == task_id).first()
+        task.status = "done"
+        task.result = json.dumps(result)
+        task.updated_at = datetime.utcnow()
+        db.commit()
+        db.close()
+
+
+def _mark_step_error(steps_data, e: Exception):
+    if steps_data:
+        error_step_index = next(
+            (i for i, s in enumerate(steps_data) if s["status"] == "running"),
+            len(steps_data) - 1,
+        )
+        if error_step_index >= 0:
+            _update_step_status(
+                steps_data,
+                error_step_index,
+                "error",
+                f"Error during execution: {e}",
+                {"title": "Error", "content": str(e)},
             )
 
+
+def _mark_task_error(task_id: str):
+    # Update task status to error
+    if USE_COSMOS_DB and db_service:
+        try:
+            db_service.update_task(task_id=task_id, status="error")
+        except Exception as e:
+            print(f"Error updating task status in Cosmos DB: {e}")
+    else:
+        # Fallback to SQLite
+        db = SessionLocal()
+        task = db.query(Task).filter(Task.id == task_id).first()
+        task.status = "error"
+        task.updated_at = datetime.utcnow()
+        db.commit()
+        db.close()
+
+
+def _step_dependencies(steps_data, plan_steps: list) -> list:
+    dependencies = plan_dependencies(plan_steps) if WORKFLOW_DAG else linear_dependencies(len(plan_steps))
+    for i, deps in enumerate(dependencies):
+        if i < len(steps_data):
+            steps_data[i]["depends_on"] = [d + 1 for d in deps]
+    return dependencies
+
+
+def run_agent_workflow(task_id: str, prompt: str, initial_plan_steps: list, advanced_options: dict = None, session_id: str = None):
+    steps_data = task_progress[task_id]["steps"]
+    dependencies = _step_dependencies(steps_data, initial_plan_steps)
+    # [title, description, output] of each finished step
+    results = [None] * len(initial_plan_steps)
+
+    def run_step(i: int):
+        plan_step_title = initial_plan_steps[i]
+        # A step sees the outputs of the steps it depends on, directly or not
+        execution_history = [results[j] for j in ancestors(dependencies, i)]
+        _update_step_status(steps_data, i, "running", f"Executing: {plan_step_title}")
+
+        # Independent steps run side by side, so RSS is for the whole process
+        started = time.perf_counter()
+        with PeakRssMonitor() as rss, llm_cache_scope(fresh=_wants_fresh_output(advanced_options)) as cache_scope, \
+                task_stream_scope(task_id, i + 1, plan_step_title):
+            actual_step_description, agent_name, output = executor_agent_step(
+                plan_step_title, execution_history, prompt, advanced_options
+            )
+        steps_data[i]["seconds"] = round(time.perf_counter() - started, 3)
+        steps_data[i]["memory"] = rss.as_dict()
+        _record_llm_cache_hits(steps_data, i, cache_scope["hits"])
+
+        results[i] = [plan_step_title, actual_step_description, output]
+
+        _update_step_status(
+            steps_data,
+            i,
+            "done",
+            f"Completed: {plan_step_title}",
+            _step_substep(prompt, agent_name, actual_step_description, output, execution_history + [results[i]]),
+        )
+
+    try:
+        run_dag(dependencies, run_step)
+
         final_report_markdown = (
-            execution_history[-1][-1] if execution_history else "No report generated."
+            results[-1][-1] if results else "No report generated."
         )
 
         result = {"html_report": final_report_markdown, "history": steps_data}
-
-        # Update task in database
-        if USE_COSMOS_DB and db_service:
-            try:
-                db_service.update_task(task_id=task_id, status="done", result=json.dumps(result))
-                
-                # Save final report to chat session if session exists
-                if hasattr(run_agent_workflow, 'current_session_id') and run_agent_workflow.current_session_id:
-                    try:
-                        db_service.add_message(
-                            session_id=run_agent_workflow.current_session_id,
-                            message_type="assistant",
-                            content=final_report_markdown,
-                            metadata={
-                                "task_id": task_id,
-                                "report_type": "final_research_report",
-                                "workflow_completed": True
-                            }
-                        )
-                        print(f"Final report saved to chat session: {run_agent_workflow.current_session_id}")
-                    except Exception as e:
-                        print(f"Error saving final report to chat session: {e}")
-                        
-            except Exception as e:
-                print(f"Error updating task in Cosmos DB: {e}")
-        else:
-            # Fallback to SQLite
-            db = SessionLocal()
-            task = db.query(Task).filter(Task.id == task_id).first()
-            task.status = "done"
-            task.result = json.dumps(result)
-            task.updated_at = datetime.utcnow()
-            db.commit()
-            db.close()
+        _save_task_result(task_id, result, final_report_markdown, session_id)
+        close_task_stream(task_id, "done")
 
     except Exception as e:
         print(f"Workflow error for task {task_id}: {e}")
-        if steps_data:
-            error_step_index = next(
-                (i for i, s in enumerate(steps_data) if s["status"] == "running"),
-                len(steps_data) - 1,
+        _mark_step_error(steps_data, e)
+        _mark_task_error(task_id)
+        close_task_stream(task_id, "error")
+
+
+async def run_agent_workflow_async(task_id: str, prompt: str, initial_plan_steps: list, advanced_options: dict = None, session_id: str = None):
+    """
+    Same workflow as run_agent_workflow, run as a coroutine on the server's event loop.
+    Blocking database calls are moved off the loop.
+    """
+    steps_data = task_progress[task_id]["steps"]
+    dependencies = _step_dependencies(steps_data, initial_plan_steps)
+    results = [None] * len(initial_plan_steps)
+
+    async def run_step(i: int):
+        plan_step_title = initial_plan_steps[i]
+        execution_history = [results[j] for j in ancestors(dependencies, i)]
+        _update_step_status(steps_data, i, "running", f"Executing: {plan_step_title}")
+
+        # Other workflows share the process, so RSS here is process-wide, not per step
+        started = time.perf_counter()
+        with PeakRssMonitor(interval=None) as rss, llm_cache_scope(fresh=_wants_fresh_output(advanced_options)) as cache_scope, \
+                task_stream_scope(task_id, i + 1, plan_step_title):
+            actual_step_description, agent_name, output = await executor_agent_step_async(
+                plan_step_title, execution_history, prompt, advanced_options
             )
-            if error_step_index >= 0:
-                update_step_status(
-                    error_step_index,
-                    "error",
-                    f"Error during execution: {e}",
-                    {"title": "Error", "content": str(e)},
-                )
-
-        # Update task status to error
-        if USE_COSMOS_DB and db_service:
-            try:
-                db_service.update_task(task_id=task_id, status="error")
-            except Exception as e:
-                print(f"Error updating task status in Cosmos DB: {e}")
-        else:
-            # Fallback to SQLite
-            db = SessionLocal()
-            task = db.query(Task).filter(Task.id == task_id).first()
-            task.status = "error"
-            task.updated_at = datetime.utcnow()
-            db.commit()
-            db.close()
+        steps_data[i]["seconds"] = round(time.perf_counter() - started, 3)
+        steps_data[i]["memory"] = rss.as_dict()
+        _record_llm_cache_hits(steps_data, i, cache_scope["hits"])
+
+        results[i] = [plan_step_title, actual_step_description, output]
+
+        _update_step_status(
+            steps_data,
+            i,
+            "done",
+            f"Completed: {plan_step_title}",
+            _step_substep(prompt, agent_name, actual_step_description, output, execution_history + [results[i]]),
+        )
+
+    try:
+        await run_dag_async(dependencies, run_step)
+
+        final_report_markdown = (
+            results[-1][-1] if results else "No report generated."
+        )
+
+        result = {"html_report": final_report_markdown, "history": steps_data}
+        await asyncio.to_thread(_save_task_result, task_id, result, final_report_markdown, session_id)
+        close_task_stream(task_id, "done")
+
+    except Exception as e:
+        print(f"Workflow error for task {task_id}: {e}")
+        _mark_step_error(steps_data, e)
+        await asyncio.to_thread(_mark_task_error, task_id)
+        close_task_stream(task_id, "error")
 
 
 @app.post("/generate_pdf")
@@ -1,34 +1,390 @@
 # -*- coding: utf-8 -*-
 import os
+import json
+import time
+import asyncio
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from datetime import datetime
 from urllib import response
-from src.research_tools import (
-    arxiv_search_tool,
-    tavily_search_tool,
-    wikipedia_search_tool,
-)
+from src.research_tools import tool_mapping, async_tool_mapping
 from src.content_filter import check_content_safety, is_content_safe
+from src.cassette import recorded_call, recorded_call_async
+from src.result_dedup import dedup_tool_results
+from src.relevance import rank_tool_results
+from src.llm_cache import cached_call, cached_call_async
+from src.task_stream import stream_sink
+from src.llm_gateway import get_llm_gateway
+from src.fanout import get_fanout_limiter
+from src.section_context import section_contexts
+
+
+# === Chat completions ===
+# Every agent calls the model through these and the requests go out through
+# the LLM gateway (src/llm_gateway.py: pooled client, per-deployment rate
+# limits, retries). CASSETTE_MODE=record/replay
+# can capture and serve the traffic (see src/cassette.py); the cassette sits
+# outside the response cache, so responses served from that cache are recorded
+# too. Agents enabled in LLM_CACHE_AGENTS can be answered from the response cache (src/llm_cache.py),
+# and agents in STREAM_AGENTS stream their output to /task_stream (src/task_stream.py).
+def _dump_completion(resp) -> dict:
+    return resp.model_dump(mode="json")
+
+
+def _load_completion(data: dict):
+    from openai.types.chat import ChatCompletion
+
+    return ChatCompletion.model_validate(data)
+
+
+class _StreamedCompletion:
+    """Accumulates streamed chunks into the equivalent non-streamed completion"""
+
+    def __init__(self):
+        self.meta = {}
+        self.choices = {}
+        self.usage = None
+
+    def add(self, chunk) -> str:
+        """Take in a chunk; returns the text it adds to the first choice"""
+        if not self.meta:
+            self.meta = {"id": chunk.id, "created": chunk.created, "model": chunk.model}
+        if getattr(chunk, "usage", None):
+            self.usage = chunk.usage.model_dump(mode="json")
+        text = ""
+        for c in chunk.choices or []:
+            choice = self.choices.setdefault(c.index, {"content": [], "finish_reason": None, "tool_calls": {}})
+            if c.delta.content:
+                choice["content"].append(c.delta.content)
+                if c.index == 0:
+                    text += c.delta.content
+            for tc in c.delta.tool_calls or []:
+                call = choice["tool_calls"].setdefault(
+                    tc.index, {"id": None, "type": "function", "function": {"name": "", "arguments": ""}}
+                )
+                if tc.id:
+                    call["id"] = tc.id
+                if tc.function and tc.function.name:
+                    call["function"]["name"] += tc.function.name
+                if tc.function and tc.function.arguments:
+                    call["function"]["arguments"] += tc.function.arguments
+            if c.finish_reason:
+                choice["finish_reason"] = c.finish_reason
+        return text
+
+    @property
+    def empty(self) -> bool:
+        """No choices arrived, e.g. the response was filtered before its first chunk"""
+        return not self.choices
+
+    def completion(self) -> dict:
+        choices = []
+        for index in sorted(self.choices):
+            c = self.choices[index]
+            message = {"role": "assistant", "content": "".join(c["content"]) if c["content"] else None}
+            if c["tool_calls"]:
+                message["tool_calls"] = [c["tool_calls"][i] for i in sorted(c["tool_calls"])]
+            choices.append({"index": index, "finish_reason": c["finish_reason"] or "stop", "message": message})
+        return {"object": "chat.completion", **self.meta, "choices": choices, "usage": self.usage}
+
+
+def _empty_stream(agent: str, part: str):
+    print(f"Empty stream for {part or agent}; asking again without streaming")
+
+
+def _stream_completion(sink, agent: str, part: str, kwargs: dict):
+    """Stream a completion to the task's subscribers and return it as if it had not been streamed"""
+    acc = _StreamedCompletion()
+    for chunk in get_llm_gateway().create(stream=True, stream_options={"include_usage": True}, **kwargs):
+        sink.delta(agent, part, acc.add(chunk))
+    if acc.empty:
+        _empty_stream(agent, part)
+        resp = get_llm_gateway().create(**kwargs)
+        _send_unstreamed(sink, agent, part, resp)
+        return resp
+    sink.part_done(agent, part)
+    return _load_completion(acc.completion())
+
+
+async def _stream_completion_async(sink, agent: str, part: str, kwargs: dict):
+    acc = _StreamedCompletion()
+    stream = await get_llm_gateway().create_async(stream=True, stream_options={"include_usage": True}, **kwargs)
+    async for chunk in stream:
+        sink.delta(agent, part, acc.add(chunk))
+    if acc.empty:
+        _empty_stream(agent, part)
+        resp = await get_llm_gateway().create_async(**kwargs)
+        _send_unstreamed(sink, agent, part, resp)
+        return resp
+    sink.part_done(agent, part)
+    return _load_completion(acc.completion())
+
+
+def _send_unstreamed(sink, agent: str, part: str, resp):
+    # Served from the response cache or a cassette: pass it on in one piece
+    if sink is not None:
+        sink.delta(agent, part, resp.choices[0].message.content or "")
+        sink.part_done(agent, part)
+
+
+def _create_completion(agent: str = None, fresh: bool = False, part: str = None, **kwargs):
+    """
+    `agent` selects the response-cache and streaming policy; fresh=True always
+    asks the model. `part` labels streamed output (e.g. a report section).
+    """
+    sink = stream_sink(agent)
+    part = part or agent
+    streamed = []
+
+    def call():
+        if sink is None:
+            return get_llm_gateway().create(**kwargs)
+        streamed.append(True)
+        return _stream_completion(sink, agent, part, kwargs)
+
+    resp = recorded_call(
+        "chat_completion",
+        kwargs,
+        lambda: cached_call(agent, kwargs, call, encode=_dump_completion, decode=_load_completion, fresh=fresh),
+        encode=_dump_completion,
+        decode=_load_completion,
+    )
+    if not streamed:
+        _send_unstreamed(sink, agent, part, resp)
+    return resp
+
+
+async def _create_completion_async(agent: str = None, fresh: bool = False, part: str = None, **kwargs):
+    sink = stream_sink(agent)
+    part = part or agent
+    streamed = []
+
+    def call():
+        if sink is None:
+            return get_llm_gateway().create_async(**kwargs)
+        streamed.append(True)
+        return _stream_completion_async(sink, agent, part, kwargs)
+
+    resp = await recorded_call_async(
+        "chat_completion",
+        kwargs,
+        lambda: cached_call_async(agent, kwargs, call, encode=_dump_completion, decode=_load_completion, fresh=fresh),
+        encode=_dump_completion,
+        decode=_load_completion,
+    )
+    if not streamed:
+        _send_unstreamed(sink, agent, part, resp)
+    return resp
+
+
+# === Tool dispatch ===
+# Per-tool caps apply process-wide, across all concurrent research steps.
+# Timeouts are measured from dispatch, so they include time spent queued behind the cap.
+TOOL_LIMITS = {
+    "arxiv_search_tool": {
+        "max_concurrency": int(os.getenv("ARXIV_TOOL_CONCURRENCY", "2")),
+        "timeout": float(os.getenv("ARXIV_TOOL_TIMEOUT", "300")),
+    },
+    "tavily_search_tool": {
+        "max_concurrency": int(os.getenv("TAVILY_TOOL_CONCURRENCY", "4")),
+        "timeout": float(os.getenv("TAVILY_TOOL_TIMEOUT", "60")),
+    },
+    "wikipedia_search_tool": {
+        "max_concurrency": int(os.getenv("WIKIPEDIA_TOOL_CONCURRENCY", "4")),
+        "timeout": float(os.getenv("WIKIPEDIA_TOOL_TIMEOUT", "30")),
+    },
+}
+_tool_semaphores = {
+    name: threading.BoundedSemaphore(limits["max_concurrency"]) for name, limits in TOOL_LIMITS.items()
+}
+_tool_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("TOOL_EXECUTOR_WORKERS", "16")), thread_name_prefix="research-tool"
+)
 
-# Configure Azure OpenAI client
-from openai import AzureOpenAI
 
-client = AzureOpenAI(
-    api_version="2025-01-01-preview",
-    azure_endpoint="https://oai-sbd-genai-common-eastus2-dev.openai.azure.com/",
-    api_key=os.getenv("AZURE_OPENAI_KEY")
-)
+def _run_tool(tool_name: str, args_dict: dict, deadline: float):
+    semaphore = _tool_semaphores[tool_name]
+    if not semaphore.acquire(timeout=max(0.0, deadline - time.monotonic())):
+        raise TimeoutError(f"{tool_name} did not get a free slot before its timeout")
+    try:
+        return tool_mapping[tool_name](**args_dict)
+    finally:
+        semaphore.release()
 
 
-# === Research Agent ===
-def research_agent(
-    prompt: str, model: str = "azure:gpt-4", return_messages: bool = False
-):
-    print("==================================")
-    print("Research Agent")
-    print("==================================")
-    
-    # Content safety check removed - only initial user prompt is filtered
+def _parse_tool_call(tc):
+    """Returns (tool_name, args, error); error is set when the call can't be dispatched."""
+    tool_name = tc.function.name
+    tool_args = tc.function.arguments
+    try:
+        args_dict = json.loads(tool_args) if isinstance(tool_args, str) else tool_args
+    except Exception as e:
+        return tool_name, tool_args, f"Error executing {tool_name}: {str(e)}"
+    if tool_name not in TOOL_LIMITS:
+        return tool_name, args_dict, f"Unknown tool: {tool_name}"
+    return tool_name, args_dict, None
+
+
+def _tool_timed_out(tool_name: str) -> str:
+    return f"Error executing {tool_name}: timed out after {TOOL_LIMITS[tool_name]['timeout']:g}s"
+
+
+def _tool_failed(tool_name: str, e: Exception) -> str:
+    return f"Error executing {tool_name}: {str(e)}"
+
+
+def execute_tool_calls(tool_calls) -> list:
+    """
+    Run the model's tool calls concurrently, honouring per-tool concurrency caps
+    and timeouts. Results are returned in the original call order.
+    """
+    pending = []
+    for tc in tool_calls:
+        tool_name, args_dict, error = _parse_tool_call(tc)
+        if error:
+            pending.append((tool_name, args_dict, None, error))
+            continue
+        deadline = time.monotonic() + TOOL_LIMITS[tool_name]["timeout"]
+        future = _tool_executor.submit(_run_tool, tool_name, args_dict, deadline)
+        pending.append((tool_name, args_dict, (future, deadline), None))
+
+    tool_results = []
+    for tool_name, args, dispatched, result in pending:
+        if dispatched is not None:
+            future, deadline = dispatched
+            try:
+                result = future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except FutureTimeoutError:
+                result = _tool_timed_out(tool_name)
+            except Exception as e:
+                result = _tool_failed(tool_name, e)
+        tool_results.append({"tool_name": tool_name, "args": args, "result": result})
+    return tool_results
+
+
+# asyncio primitives are bound to one event loop, so the async caps are kept per loop
+_async_tool_semaphores = weakref.WeakKeyDictionary()
+
+
+def _async_tool_semaphore(tool_name: str) -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    semaphores = _async_tool_semaphores.get(loop)
+    if semaphores is None:
+        semaphores = {
+            name: asyncio.Semaphore(limits["max_concurrency"]) for name, limits in TOOL_LIMITS.items()
+        }
+        _async_tool_semaphores[loop] = semaphores
+    return semaphores[tool_name]
+
+
+async def _run_tool_async(tool_name: str, args_dict: dict):
+    async with _async_tool_semaphore(tool_name):
+        return await async_tool_mapping[tool_name](**args_dict)
 
+
+async def execute_tool_calls_async(tool_calls) -> list:
+    """Asyncio version of execute_tool_calls, with the same caps, timeouts and ordering."""
+    parsed = [_parse_tool_call(tc) for tc in tool_calls]
+
+    async def _dispatch(tool_name, args_dict, error):
+        if error:
+            return error
+        try:
+            return await asyncio.wait_for(_run_tool_async(tool_name, args_dict), TOOL_LIMITS[tool_name]["timeout"])
+        except asyncio.TimeoutError:
+            return _tool_timed_out(tool_name)
+        except Exception as e:
+            return _tool_failed(tool_name, e)
+
+    results = await asyncio.gather(*(_dispatch(*call) for call in parsed))
+    return [
+        {"tool_name": tool_name, "args": args, "result": result}
+        for (tool_name, args, _), result in zip(parsed, results)
+    ]
+
+
+# Tool definitions passed to the model, in OpenAI format
+RESEARCH_TOOL_DEFS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "arxiv_search_tool",
+            "description": "Search arXiv and return results with summary containing extracted PDF text",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "query": {
+                        "type": "string",
+                        "description": "The search query for arXiv"
+                    },
+                    "max_results": {
+                        "type": "integer",
+                        "description": "Maximum number of results to return",
+                        "default": 3
+                    },
+                    "id_list": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "arXiv ids or URLs to look up in one batch instead of searching (query is then ignored)"
+                    }
+                }
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "tavily_search_tool",
+            "description": "Perform a search using the Tavily API",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "query": {
+                        "type": "string",
+                        "description": "The search query"
+                    },
+                    "max_results": {
+                        "type": "integer",
+                        "description": "Number of results to return",
+                        "default": 10
+                    },
+                    "include_images": {
+                        "type": "boolean",
+                        "description": "Whether to include image results",
+                        "default": False
+                    }
+                },
+                "required": ["query"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "wikipedia_search_tool",
+            "description": "Search Wikipedia for foundational knowledge, background information, definitions, and historical context. ESSENTIAL for establishing basic understanding of any topic before diving into specific research.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "query": {
+                        "type": "string",
+                        "description": "Search query for Wikipedia - use broad terms to get comprehensive overview"
+                    },
+                    "sentences": {
+                        "type": "integer",
+                        "description": "Number of sentences to include in the summary (5-10 recommended for comprehensive overview)",
+                        "default": 8
+                    }
+                },
+                "required": ["query"]
+            }
+        }
+    }
+]
+
+
+def _research_messages(prompt: str) -> list:
     full_prompt = f"""
 You are an advanced research assistant with expertise in information retrieval and academic research methodology. Your mission is to gather comprehensive, accurate, and relevant information on any topic requested by the user.
 
@@ -50,6 +406,7 @@ You are an advanced research assistant with expertise in information retrieval a
      * Electrical Engineering and Systems Science
      * Economics
    - BEST FOR: Scientific evidence, theoretical frameworks, and technical details in supported fields
+   - When you already know several arXiv ids or URLs, pass them all in one call via `id_list` instead of searching for each
 
 3. **`wikipedia_search_tool`**: Encyclopedia resource
    - USE FOR: Background information, definitions, overviews, historical context
@@ -118,172 +475,130 @@ USER RESEARCH REQUEST:
 {prompt}
 """.strip()
 
-    messages = [{"role": "user", "content": full_prompt}]
-    
-    # Define tools in OpenAI format
-    tools = [
-        {
-            "type": "function",
-            "function": {
-                "name": "arxiv_search_tool",
-                "description": "Search arXiv and return results with summary containing extracted PDF text",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "query": {
-                            "type": "string",
-                            "description": "The search query for arXiv"
-                        },
-                        "max_results": {
-                            "type": "integer",
-                            "description": "Maximum number of results to return",
-                            "default": 3
-                        }
-                    },
-                    "required": ["query"]
-                }
-            }
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "tavily_search_tool",
-                "description": "Perform a search using the Tavily API",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "query": {
-                            "type": "string",
-                            "description": "The search query"
-                        },
-                        "max_results": {
-                            "type": "integer",
-                            "description": "Number of results to return",
-                            "default": 10
-                        },
-                        "include_images": {
-                            "type": "boolean",
-                            "description": "Whether to include image results",
-                            "default": False
-                        }
-                    },
-                    "required": ["query"]
-                }
-            }
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "wikipedia_search_tool",
-                "description": "Search Wikipedia for foundational knowledge, background information, definitions, and historical context. ESSENTIAL for establishing basic understanding of any topic before diving into specific research.",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "query": {
-                            "type": "string",
-                            "description": "Search query for Wikipedia - use broad terms to get comprehensive overview"
-                        },
-                        "sentences": {
-                            "type": "integer",
-                            "description": "Number of sentences to include in the summary (5-10 recommended for comprehensive overview)",
-                            "default": 8
-                        }
-                    },
-                    "required": ["query"]
-                }
-            }
-        }
-    ]
+    return [{"role": "user", "content": full_prompt}]
 
-    try:
-        resp = client.chat.completions.create(
-            model=os.getenv("AZURE_OPENAI_DEPLOYMENT", "sbd-o3-mini-0131"),
-            messages=messages,
-            tools=tools,
-            tool_choice="auto",
+
+def _prepare_tool_results(tool_results: list, prompt: str):
+    """
+    Drop duplicate results across tools, then rank the rest against the user
+    prompt and prune them to the top-k / character budget, before they are
+    rendered and passed downstream. Returns the results and notes for the HTML.
+    """
+    notes = []
+    tool_results, report = dedup_tool_results(tool_results)
+    if report["items_removed"]:
+        print(
+            f"Dedup: removed {report['items_removed']} of {report['items_in']} results "
+            f"({report['by_url']} same URL, {report['near_duplicate']} near-duplicate, "
+            f"{report['chars_removed']} chars)"
         )
+        notes.append(f"Removed {report['items_removed']} duplicate results ({report['chars_removed']} characters).")
 
-        content = resp.choices[0].message.content or ""
+    tool_results, report = rank_tool_results(tool_results, extract_original_prompt_from_context(prompt))
+    if report["items_kept"] < report["items_in"] or report["chars_kept"] < report["chars_in"]:
+        print(
+            f"Ranking: kept {report['items_kept']} of {report['items_in']} results, "
+            f"{report['chars_kept']} of {report['chars_in']} chars"
+        )
+        notes.append(
+            f"Kept the {report['items_kept']} most relevant of {report['items_in']} results "
+            f"({report['chars_in'] - report['chars_kept']} characters pruned)."
+        )
+    return tool_results, notes
+
+
+def _research_request(prompt: str) -> dict:
+    """Completion arguments for the research agent's tool-calling turn"""
+    return {
+        "agent": "research_agent",
+        "model": os.getenv("AZURE_OPENAI_DEPLOYMENT", "sbd-o3-mini-0131"),
+        "messages": _research_messages(prompt),
+        "tools": RESEARCH_TOOL_DEFS,
+        "tool_choice": "auto",
+    }
+
+
+def _requested_tool_calls(resp) -> list:
+    return getattr(resp.choices[0].message, "tool_calls", None) or []
+
+
+def _research_output(resp, tool_results: list, notes: list) -> str:
+    """The model's text followed by the rendered tool results"""
+    content = resp.choices[0].message.content or ""
+    if tool_results:
+        content += "\n\n" + _tool_results_html(tool_results, notes)
+    return content
+
+
+def _tool_results_html(tool_results: list, notes: list = None) -> str:
+    """Render tool results as the HTML appended to the research agent's output"""
+    tools_html = "<h2>Research Results</h2>"
+    for note in notes or []:
+        tools_html += f"<p><em>{note}</em></p>"
+    for tr in tool_results:
+        tools_html += f"<h3>{tr['tool_name'].replace('_', ' ').title()}</h3>"
+        tools_html += f"<p><strong>Query:</strong> {tr['args']}</p>"
+
+        # Format Tavily results in simple table format
+        if tr['tool_name'] == 'tavily_search_tool' and isinstance(tr['result'], list):
+            tools_html += "<table border='1' cellpadding='5' cellspacing='0' style='border-collapse: collapse; width: 100%;'>"
+            tools_html += "<tr><th>#</th><th>Title</th><th>Content</th><th>URL</th></tr>"
+            for i, result in enumerate(tr['result'][:20], 1):  # Show first 20 results
+                if isinstance(result, dict) and 'title' in result:
+                    title = result.get('title', 'No title')
+                    content_text = result.get('content', 'No content')[:200]
+                    if len(result.get('content', '')) > 200:
+                        content_text += '...'
+                    url = result.get('url', '#')
+                    tools_html += f"<tr><td>{i}</td><td>{title}</td><td>{content_text}</td><td><a href='{url}' target='_blank'>View Source</a></td></tr>"
+            tools_html += "</table>"
+        # Format arXiv results in simple table format
+        elif tr['tool_name'] == 'arxiv_search_tool' and isinstance(tr['result'], list):
+            tools_html += "<table border='1' cellpadding='5' cellspacing='0' style='border-collapse: collapse; width: 100%;'>"
+            tools_html += "<tr><th>#</th><th>Title</th><th>Authors</th><th>Published</th><th>Summary</th><th>URL</th><th>PDF</th></tr>"
+            for i, result in enumerate(tr['result'][:20], 1):  # Show first 20 results
+                if isinstance(result, dict) and 'title' in result:
+                    title = result.get('title', 'No title')
+                    authors = ', '.join(result.get('authors', []))[:100]
+                    if len(', '.join(result.get('authors', []))) > 100:
+                        authors += '...'
+                    published = result.get('published', 'N/A')
+                    summary = result.get('summary', 'No summary')[:200]
+                    if len(result.get('summary', '')) > 200:
+                        summary += '...'
+                    url = result.get('url', '#')
+                    pdf_url = result.get('link_pdf', '#')
+                    tools_html += f"<tr><td>{i}</td><td>{title}</td><td>{authors}</td><td>{published}</td><td>{summary}</td><td><a href='{url}' target='_blank'>View Paper</a></td><td><a href='{pdf_url}' target='_blank'>PDF</a></td></tr>"
+            tools_html += "</table>"
+        else:
+            tools_html += f"<pre>{str(tr['result'])[:1000]}{'...' if len(str(tr['result'])) > 1000 else ''}</pre>"
+        tools_html += "<br>"
+    return tools_html
 
-        # ---- Execute tool calls from the response
-        tool_results = []
-        
-        # Get tool calls from the response message
-        if hasattr(resp.choices[0].message, "tool_calls") and resp.choices[0].message.tool_calls:
-            for tc in resp.choices[0].message.tool_calls:
-                tool_name = tc.function.name
-                tool_args = tc.function.arguments
-                
-                try:
-                    # Parse arguments
-                    import json
-                    args_dict = json.loads(tool_args) if isinstance(tool_args, str) else tool_args
-                    
-                    # Execute the appropriate tool
-                    if tool_name == "arxiv_search_tool":
-                        result = arxiv_search_tool(**args_dict)
-                    elif tool_name == "tavily_search_tool":
-                        result = tavily_search_tool(**args_dict)
-                    elif tool_name == "wikipedia_search_tool":
-                        result = wikipedia_search_tool(**args_dict)
-                    else:
-                        result = f"Unknown tool: {tool_name}"
-                    
-                    tool_results.append({
-                        "tool_name": tool_name,
-                        "args": args_dict,
-                        "result": result
-                    })
-                    
-                except Exception as e:
-                    tool_results.append({
-                        "tool_name": tool_name,
-                        "args": tool_args,
-                        "result": f"Error executing {tool_name}: {str(e)}"
-                    })
-
-        # Add tool results to content
-        if tool_results:
-            tools_html = "<h2>Research Results</h2>"
-            for tr in tool_results:
-                tools_html += f"<h3>{tr['tool_name'].replace('_', ' ').title()}</h3>"
-                tools_html += f"<p><strong>Query:</strong> {tr['args']}</p>"
-                
-                # Format Tavily results in simple table format
-                if tr['tool_name'] == 'tavily_search_tool' and isinstance(tr['result'], list):
-                    tools_html += "<table border='1' cellpadding='5' cellspacing='0' style='border-collapse: collapse; width: 100%;'>"
-                    tools_html += "<tr><th>#</th><th>Title</th><th>Content</th><th>URL</th></tr>"
-                    for i, result in enumerate(tr['result'][:20], 1):  # Show first 20 results
-                        if isinstance(result, dict) and 'title' in result:
-                            title = result.get('title', 'No title')
-                            content_text = result.get('content', 'No content')[:200]
-                            if len(result.get('content', '')) > 200:
-                                content_text += '...'
-                            url = result.get('url', '#')
-                            tools_html += f"<tr><td>{i}</td><td>{title}</td><td>{content_text}</td><td><a href='{url}' target='_blank'>View Source</a></td></tr>"
-                    tools_html += "</table>"
-                # Format arXiv results in simple table format
-                elif tr['tool_name'] == 'arxiv_search_tool' and isinstance(tr['result'], list):
-                    tools_html += "<table border='1' cellpadding='5' cellspacing='0' style='border-collapse: collapse; width: 100%;'>"
-                    tools_html += "<tr><th>#</th><th>Title</th><th>Authors</th><th>Published</th><th>Summary</th><th>URL</th><th>PDF</th></tr>"
-                    for i, result in enumerate(tr['result'][:20], 1):  # Show first 20 results
-                        if isinstance(result, dict) and 'title' in result:
-                            title = result.get('title', 'No title')
-                            authors = ', '.join(result.get('authors', []))[:100]
-                            if len(', '.join(result.get('authors', []))) > 100:
-                                authors += '...'
-                            published = result.get('published', 'N/A')
-                            summary = result.get('summary', 'No summary')[:200]
-                            if len(result.get('summary', '')) > 200:
-                                summary += '...'
-                            url = result.get('url', '#')
-                            pdf_url = result.get('link_pdf', '#')
-                            tools_html += f"<tr><td>{i}</td><td>{title}</td><td>{authors}</td><td>{published}</td><td>{summary}</td><td><a href='{url}' target='_blank'>View Paper</a></td><td><a href='{pdf_url}' target='_blank'>PDF</a></td></tr>"
-                    tools_html += "</table>"
-                else:
-                    tools_html += f"<pre>{str(tr['result'])[:1000]}{'...' if len(str(tr['result'])) > 1000 else ''}</pre>"
-                tools_html += "<br>"
-            content += "\n\n" + tools_html
+
+# === Research Agent ===
+def research_agent(
+    prompt: str, model: str = "azure:gpt-4", return_messages: bool = False
+):
+    print("==================================")
+    print("Research Agent")
+    print("==================================")
+    
+    # Content safety check removed - only initial user prompt is filtered
+
+    request = _research_request(prompt)
+    messages = request["messages"]
+
+    try:
+        resp = _create_completion(**request)
+
+        # ---- Run the tool calls from the response concurrently
+        tool_results, notes = [], []
+        tool_calls = _requested_tool_calls(resp)
+        if tool_calls:
+            tool_results = execute_tool_calls(tool_calls)
+            tool_results, notes = _prepare_tool_results(tool_results, prompt)
+        content = _research_output(resp, tool_results, notes)
 
         print("SUCCESS Output:\n", content)
         return content, messages
@@ -293,21 +608,37 @@ USER RESEARCH REQUEST:
         return f"[Model Error: {str(e)}]", messages
 
 
-def writer_agent(
-    prompt: str,
-    model: str = "azure:gpt-4",
-    min_words_total: int = 2400,
-    min_words_per_section: int = 400,
-    max_completion_tokens: int = 15000,
-    retries: int = 1,
-    advanced_options: dict = None,
+async def research_agent_async(
+    prompt: str, model: str = "azure:gpt-4", return_messages: bool = False
 ):
+    """Asyncio version of research_agent"""
     print("==================================")
-    print("Writer Agent")
+    print("Research Agent")
     print("==================================")
-    
-    # Content safety check removed - only initial user prompt is filtered
 
+    request = _research_request(prompt)
+    messages = request["messages"]
+
+    try:
+        resp = await _create_completion_async(**request)
+
+        tool_results, notes = [], []
+        tool_calls = _requested_tool_calls(resp)
+        if tool_calls:
+            tool_results = await execute_tool_calls_async(tool_calls)
+            # Dedup and ranking are CPU-bound; keep them off the event loop
+            tool_results, notes = await asyncio.to_thread(_prepare_tool_results, tool_results, prompt)
+        content = _research_output(resp, tool_results, notes)
+
+        print("SUCCESS Output:\n", content)
+        return content, messages
+
+    except Exception as e:
+        print("ERROR:", e)
+        return f"[Model Error: {str(e)}]", messages
+
+
+def _writer_messages(prompt: str, advanced_options: dict = None) -> list:
     # Get report format from advanced options
     report_format = "academic"  # default
     if advanced_options and "reportFormat" in advanced_options:
@@ -494,17 +825,40 @@ Generate a comprehensive academic report that meets the highest standards of sch
 IMPORTANT: In your report, make sure to include a "User Prompt" section right after the title that displays the original research question: "{original_prompt}"
 """
     
-    messages = [
+    return [
         {"role": "system", "content": system_message},
         {"role": "user", "content": enhanced_prompt},
     ]
 
+
+def _writer_request(messages: list, max_completion_tokens: int) -> dict:
+    return {
+        "agent": "writer_agent",
+        "model": os.getenv("AZURE_OPENAI_DEPLOYMENT", "sbd-o3-mini-0131"),
+        "messages": messages,
+        "max_completion_tokens": max_completion_tokens,
+    }
+
+
+def writer_agent(
+    prompt: str,
+    model: str = "azure:gpt-4",
+    min_words_total: int = 2400,
+    min_words_per_section: int = 400,
+    max_completion_tokens: int = 15000,
+    retries: int = 1,
+    advanced_options: dict = None,
+):
+    print("==================================")
+    print("Writer Agent")
+    print("==================================")
+    
+    # Content safety check removed - only initial user prompt is filtered
+
+    messages = _writer_messages(prompt, advanced_options)
+
     def _call(messages_):
-        resp = client.chat.completions.create(
-            model=os.getenv("AZURE_OPENAI_DEPLOYMENT", "sbd-o3-mini-0131"),
-            messages=messages_,
-            max_completion_tokens=max_completion_tokens,
-        )
+        resp = _create_completion(**_writer_request(messages_, max_completion_tokens))
         return resp.choices[0].message.content or ""
 
     def _word_count(md_text: str) -> int:
@@ -519,6 +873,37 @@ IMPORTANT: In your report, make sure to include a "User Prompt" section right af
     return content, messages
 
 
+async def writer_agent_async(
+    prompt: str,
+    model: str = "azure:gpt-4",
+    min_words_total: int = 2400,
+    min_words_per_section: int = 400,
+    max_completion_tokens: int = 15000,
+    retries: int = 1,
+    advanced_options: dict = None,
+):
+    """Asyncio version of writer_agent"""
+    print("==================================")
+    print("Writer Agent")
+    print("==================================")
+
+    messages = _writer_messages(prompt, advanced_options)
+
+    resp = await _create_completion_async(**_writer_request(messages, max_completion_tokens))
+    content = resp.choices[0].message.content or ""
+
+    print("SUCCESS Output:\n", content)
+    return content, messages
+
+
+def _editor_request(messages: list) -> dict:
+    return {
+        "agent": "editor_agent",
+        "model": os.getenv("AZURE_OPENAI_DEPLOYMENT", "sbd-o3-mini-0131"),
+        "messages": messages,
+    }
+
+
 def editor_agent(
     prompt: str,
     model: str = "azure:gpt-4",
@@ -530,6 +915,35 @@ def editor_agent(
     
     # Content safety check removed - only initial user prompt is filtered
 
+    messages = _editor_messages(prompt)
+
+    response = _create_completion(**_editor_request(messages))
+
+    content = response.choices[0].message.content
+    print("SUCCESS Output:\n", content)
+    return content, messages
+
+
+async def editor_agent_async(
+    prompt: str,
+    model: str = "azure:gpt-4",
+    target_min_words: int = 2400,
+):
+    """Asyncio version of editor_agent"""
+    print("==================================")
+    print("Editor Agent")
+    print("==================================")
+
+    messages = _editor_messages(prompt)
+
+    response = await _create_completion_async(**_editor_request(messages))
+
+    content = response.choices[0].message.content
+    print("SUCCESS Output:\n", content)
+    return content, messages
+
+
+def _editor_messages(prompt: str) -> list:
     system_message = """
 You are a professional academic editor with expertise in improving scholarly writing across disciplines. Your task is to refine and elevate the quality of the academic text provided.
 
@@ -557,33 +971,38 @@ You are a professional academic editor with expertise in improving scholarly wri
 Return only the revised, polished text in Markdown format without explanatory comments about your edits.
 """.strip()
 
-    messages = [
+    return [
         {"role": "system", "content": system_message},
         {"role": "user", "content": prompt},
     ]
 
-    response = client.chat.completions.create(
-        model=os.getenv("AZURE_OPENAI_DEPLOYMENT", "sbd-o3-mini-0131"), 
-        messages=messages
-    )
-
-    content = response.choices[0].message.content
-    print("SUCCESS Output:\n", content)
-    return content, messages
-
 
 # === Parallel Writer Agent ===
 import concurrent.futures
+import contextvars
 from typing import Dict, List
 
+# Define report sections that can be written in parallel
+REPORT_SECTIONS = [
+    {"name": "abstract", "title": "Abstract", "description": "Brief summary (100-150 words) of the report's purpose, methods, and key findings"},
+    {"name": "introduction", "title": "Introduction", "description": "Present the topic, research question/problem, significance, and outline"},
+    {"name": "background", "title": "Background/Literature Review", "description": "Contextualize the topic within existing scholarship"},
+    {"name": "methodology", "title": "Methodology", "description": "Describe research methods, data collection, and analytical approaches"},
+    {"name": "findings", "title": "Key Findings/Results", "description": "Present the primary outcomes and evidence"},
+    {"name": "discussion", "title": "Discussion", "description": "Interpret findings, address implications, limitations, and connections"},
+    {"name": "conclusion", "title": "Conclusion", "description": "Synthesize main points and suggest directions for future research"}
+]
+
 def parallel_writer_agent(
     prompt: str,
     model: str = "azure:gpt-4",
-    max_workers: int = 4,
+    max_workers: int = None,
     advanced_options: dict = None
 ) -> tuple[str, list]:
     """
-    Parallel implementation that splits report generation into concurrent section tasks
+    Parallel implementation that splits report generation into concurrent section tasks.
+    How many sections are written at once is set by the process-wide fan-out
+    limiter (src/fanout.py); `max_workers` only caps it further for this call.
     """
     print("==================================")
     print("Parallel Writer Agent")
@@ -592,22 +1011,24 @@ def parallel_writer_agent(
     # Extract research data from prompt context
     research_data = extract_research_from_prompt(prompt)
     
-    # Define report sections that can be written in parallel
-    sections = [
-        {"name": "abstract", "title": "Abstract", "description": "Brief summary (100-150 words) of the report's purpose, methods, and key findings"},
-        {"name": "introduction", "title": "Introduction", "description": "Present the topic, research question/problem, significance, and outline"},
-        {"name": "background", "title": "Background/Literature Review", "description": "Contextualize the topic within existing scholarship"},
-        {"name": "methodology", "title": "Methodology", "description": "Describe research methods, data collection, and analytical approaches"},
-        {"name": "findings", "title": "Key Findings/Results", "description": "Present the primary outcomes and evidence"},
-        {"name": "discussion", "title": "Discussion", "description": "Interpret findings, address implications, limitations, and connections"},
-        {"name": "conclusion", "title": "Conclusion", "description": "Synthesize main points and suggest directions for future research"}
-    ]
-    
+    # Report sections that can be written in parallel
+    sections = REPORT_SECTIONS
+    shared, contexts, request = _section_inputs(prompt, research_data)
+    limiter = get_fanout_limiter()
+    print(f"Fan-out concurrency limit: {limiter.stats()['limit']}")
+
+    def _write(section: Dict) -> str:
+        with limiter.slot():
+            return write_section_parallel(
+                section, request, shared, model, advanced_options, section_research=contexts[section["name"]]
+            )
+
     # Create parallel tasks for each section
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        # Submit all section writing tasks
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(max_workers or len(sections), len(sections))) as executor:
+        # Submit all section writing tasks; each runs in a copy of this context so
+        # response-cache hits are reported to the calling workflow step
         future_to_section = {
-            executor.submit(write_section_parallel, section, prompt, research_data, model, advanced_options): section
+            executor.submit(contextvars.copy_context().run, _write, section): section
             for section in sections
         }
         
@@ -620,8 +1041,7 @@ def parallel_writer_agent(
                 section_results[section["name"]] = content
                 print(f"SUCCESS: Completed {section['title']} section")
             except Exception as e:
-                print(f"ERROR: Error writing {section['name']}: {e}")
-                section_results[section["name"]] = f"Error generating {section['title']}"
+                section_results[section["name"]] = _section_failed(section, e)
     
     # Assemble final report
     final_report = assemble_report_parallel(section_results, research_data, prompt)
@@ -629,88 +1049,156 @@ def parallel_writer_agent(
     print("SUCCESS Output:\n", final_report)
     return final_report, []
 
-def write_section_parallel(section: Dict, prompt: str, research_data: str, model: str, advanced_options: dict = None) -> str:
-    """Write a single section of the report in parallel"""
-    
+async def parallel_writer_agent_async(
+    prompt: str,
+    model: str = "azure:gpt-4",
+    max_workers: int = None,
+    advanced_options: dict = None
+) -> tuple[str, list]:
+    """Asyncio version of parallel_writer_agent, sharing the same fan-out limiter"""
+    print("==================================")
+    print("Parallel Writer Agent")
+    print("==================================")
+
+    research_data = extract_research_from_prompt(prompt)
+    # Passage splitting, BM25 and token counting are CPU-bound; keep them off the event loop
+    shared, contexts, request = await asyncio.to_thread(_section_inputs, prompt, research_data)
+    limiter = get_fanout_limiter()
+    print(f"Fan-out concurrency limit: {limiter.stats()['limit']}")
+    slots = asyncio.Semaphore(max_workers or len(REPORT_SECTIONS))
+
+    async def _write(section: Dict):
+        async with slots:
+            try:
+                async with limiter.slot_async():
+                    content = await write_section_parallel_async(
+                        section, request, shared, model, advanced_options, section_research=contexts[section["name"]]
+                    )
+                print(f"SUCCESS: Completed {section['title']} section")
+                return section["name"], content
+            except Exception as e:
+                return section["name"], _section_failed(section, e)
+
+    section_results = dict(await asyncio.gather(*(_write(section) for section in REPORT_SECTIONS)))
+
+    final_report = assemble_report_parallel(section_results, research_data, prompt)
+
+    print("SUCCESS Output:\n", final_report)
+    return final_report, []
+
+def _section_inputs(prompt: str, research_data: str) -> tuple[str, Dict[str, str], str]:
+    """The research all section writers share, the passages only one section needs, and the request line"""
+    shared, contexts, request, report = section_contexts(
+        research_data, REPORT_SECTIONS, prompt, extract_original_prompt_from_context(prompt)
+    )
+    saved = report["tokens_full"] - report["tokens_sent"]
+    if saved:
+        print(
+            f"Section context: {report['tokens_full']} -> {report['tokens_sent']} prompt tokens "
+            f"across {len(REPORT_SECTIONS)} sections ({saved} saved, {report['tokens_shared']} in the shared prefix)"
+        )
+    return shared, contexts, request
+
+def _section_request(section: Dict, prompt: str, research_data: str, advanced_options: dict = None,
+                     section_research: str = "") -> dict:
+    return {
+        "agent": "write_section_parallel",
+        "part": section["title"],
+        "model": os.getenv("AZURE_OPENAI_DEPLOYMENT", "sbd-gpt-4.1-mini"),
+        "messages": _section_messages(section, prompt, research_data, advanced_options, section_research),
+        "max_completion_tokens": 2000,
+    }
+
+def _section_text(section: Dict, response) -> str:
+    # cached_tokens is the part of the prompt the provider served from its prefix cache
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        cached = getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", None) or 0
+        print(f"Section {section['title']}: {usage.prompt_tokens} prompt tokens, {cached} cached")
+    return response.choices[0].message.content or ""
+
+def _section_failed(section: Dict, e: Exception) -> str:
+    print(f"ERROR: Error writing {section['name']}: {e}")
+    return f"Error generating {section['title']}"
+
+def write_section_parallel(section: Dict, prompt: str, research_data: str, model: str, advanced_options: dict = None,
+                           section_research: str = "") -> str:
+    """
+    Write a single section of the report in parallel. `research_data` is the
+    context shared by all sections, `section_research` what only this one needs.
+    """
+    response = _create_completion(**_section_request(section, prompt, research_data, advanced_options, section_research))
+    return _section_text(section, response)
+
+async def write_section_parallel_async(section: Dict, prompt: str, research_data: str, model: str,
+                                       advanced_options: dict = None, section_research: str = "") -> str:
+    """Asyncio version of write_section_parallel"""
+    response = await _create_completion_async(
+        **_section_request(section, prompt, research_data, advanced_options, section_research)
+    )
+    return _section_text(section, response)
+
+# Per report format: who writes, what kind of document, and the format's own requirements
+SECTION_STYLES = {
+    "executive": (
+        "business", "an executive summary",
+        ["Focus on business impact and strategic implications", "Use clear, executive-friendly language",
+         "Target 200-400 words for this section"],
+    ),
+    "technical": (
+        "technical", "a technical report",
+        ["Focus on technical specifications and detailed analysis", "Use precise technical language",
+         "Target 400-600 words for this section"],
+    ),
+    "newsletter": (
+        "content", "a newsletter article",
+        ["Focus on accessibility and engagement for general readers", "Use engaging, conversational language",
+         "Target 300-500 words for this section"],
+    ),
+    "academic": (
+        "academic", "an academic report",
+        ["Include proper citations [1], [2], etc. where appropriate", "Maintain academic tone and formal language",
+         "Target 300-500 words for this section"],
+    ),
+}
+
+def _section_messages(section: Dict, prompt: str, research_data: str, advanced_options: dict = None,
+                      section_research: str = "") -> list:
+    """
+    Messages for one section writer. Everything that is the same for all
+    sections of a report (writer role, request, shared research) comes first
+    and is byte-identical across the fan-out, so the provider can serve it
+    from its prompt cache; the section's own research and instructions come last.
+    """
     # Get report format from advanced options
     report_format = "academic"  # default
     if advanced_options and "reportFormat" in advanced_options:
         report_format = advanced_options["reportFormat"]
-    
-    # Format-specific system messages for sections
-    if report_format == "executive":
-        system_message = f"""
-        You are an expert business writer. Write ONLY the {section['title']} section of an executive summary.
-        
-        Section Requirements:
-        - {section['description']}
-        - Use the provided research data to support your content
-        - Focus on business impact and strategic implications
-        - Use clear, executive-friendly language
-        - Target 200-400 words for this section
-        - Output ONLY the section content, no headers or meta-commentary
-        
-        Research Data:
-        {research_data}
-        """
-    elif report_format == "technical":
-        system_message = f"""
-        You are an expert technical writer. Write ONLY the {section['title']} section of a technical report.
-        
-        Section Requirements:
-        - {section['description']}
-        - Use the provided research data to support your content
-        - Focus on technical specifications and detailed analysis
-        - Use precise technical language
-        - Target 400-600 words for this section
-        - Output ONLY the section content, no headers or meta-commentary
-        
-        Research Data:
-        {research_data}
-        """
-    elif report_format == "newsletter":
-        system_message = f"""
-        You are an expert content writer. Write ONLY the {section['title']} section of a newsletter article.
-        
-        Section Requirements:
-        - {section['description']}
-        - Use the provided research data to support your content
-        - Focus on accessibility and engagement for general readers
-        - Use engaging, conversational language
-        - Target 300-500 words for this section
-        - Output ONLY the section content, no headers or meta-commentary
-        
-        Research Data:
-        {research_data}
-        """
-    else:  # academic (default)
-        system_message = f"""
-        You are an expert academic writer. Write ONLY the {section['title']} section of an academic report.
+    writer, document, requirements = SECTION_STYLES.get(report_format, SECTION_STYLES["academic"])
+
+    system_message = f"""
+        You are an expert {writer} writer. You write {document} one section at a time, using the research data below.
         
-        Section Requirements:
-        - {section['description']}
-        - Use the provided research data to support your content
-        - Include proper citations [1], [2], etc. where appropriate
-        - Maintain academic tone and formal language
-        - Target 300-500 words for this section
-        - Output ONLY the section content, no headers or meta-commentary
+        Request: {prompt}
         
         Research Data:
         {research_data}
         """
+
+    extra = f"Additional research for this section:\n{section_research}\n\n" if section_research else ""
+    bullets = "\n".join(f"- {line}" for line in requirements)
+    user_message = f"""{extra}Write ONLY the {section['title']} section of {document}.
+
+Section Requirements:
+- {section['description']}
+- Use the provided research data to support your content
+{bullets}
+- Output ONLY the section content, no headers or meta-commentary"""
     
-    messages = [
+    return [
         {"role": "system", "content": system_message},
-        {"role": "user", "content": f"Write the {section['title']} section for: {prompt}"}
+        {"role": "user", "content": user_message}
     ]
-    
-    response = client.chat.completions.create(
-        model=os.getenv("AZURE_OPENAI_DEPLOYMENT", "sbd-gpt-4.1-mini"),
-        messages=messages,
-        max_completion_tokens=2000
-    )
-    
-    return response.choices[0].message.content or ""
 
 def assemble_report_parallel(section_results: Dict[str, str], research_data: str, prompt: str) -> str:
     """Assemble the parallel-written sections into a complete report"""
@@ -786,6 +1274,15 @@ def extract_original_prompt_from_context(prompt: str) -> str:
     return prompt.strip()[:100] + ('...' if len(prompt.strip()) > 100 else '')
 
 # === Analysis Agent ===
+def _analysis_request(messages: list, max_completion_tokens: int) -> dict:
+    return {
+        "agent": "analysis_agent",
+        "model": os.getenv("AZURE_OPENAI_DEPLOYMENT", "sbd-o3-mini-0131"),
+        "messages": messages,
+        "max_completion_tokens": max_completion_tokens,
+    }
+
+
 def analysis_agent(
     prompt: str,
     model: str = "azure:gpt-4",
@@ -801,6 +1298,45 @@ def analysis_agent(
     
     # Content safety check removed - only initial user prompt is filtered
 
+    messages = _analysis_messages(prompt)
+
+    try:
+        resp = _create_completion(**_analysis_request(messages, max_completion_tokens))
+
+        content = resp.choices[0].message.content or ""
+        print("SUCCESS Output:\n", content)
+        return content, messages
+
+    except Exception as e:
+        print("ERROR:", e)
+        return f"[Analysis Error: {str(e)}]", messages
+
+
+async def analysis_agent_async(
+    prompt: str,
+    model: str = "azure:gpt-4",
+    max_completion_tokens: int = 4000,
+) -> tuple[str, list]:
+    """Asyncio version of analysis_agent"""
+    print("==================================")
+    print("Analysis Agent")
+    print("==================================")
+
+    messages = _analysis_messages(prompt)
+
+    try:
+        resp = await _create_completion_async(**_analysis_request(messages, max_completion_tokens))
+
+        content = resp.choices[0].message.content or ""
+        print("SUCCESS Output:\n", content)
+        return content, messages
+
+    except Exception as e:
+        print("ERROR:", e)
+        return f"[Analysis Error: {str(e)}]", messages
+
+
+def _analysis_messages(prompt: str) -> list:
     system_message = """
 You are an expert research analyst specializing in synthesizing and organizing research findings. Your task is to analyze, synthesize, or organize research materials for specific analytical purposes.
 
@@ -829,22 +1365,7 @@ You are an expert research analyst specializing in synthesizing and organizing r
 Do not generate full report structures (Title, Abstract, Introduction, etc.). Focus only on the specific analytical task requested.
 """.strip()
 
-    messages = [
+    return [
         {"role": "system", "content": system_message},
         {"role": "user", "content": prompt},
     ]
-
-    try:
-        resp = client.chat.completions.create(
-            model=os.getenv("AZURE_OPENAI_DEPLOYMENT", "sbd-o3-mini-0131"),
-            messages=messages,
-            max_completion_tokens=max_completion_tokens,
-        )
-
-        content = resp.choices[0].message.content or ""
-        print("SUCCESS Output:\n", content)
-        return content, messages
-
-    except Exception as e:
-        print("ERROR:", e)
-        return f"[Analysis Error: {str(e)}]", messages
\ No newline at end of file
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import tempfile
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Parts of a request that change from run to run without changing its meaning
+_KEY_SCRUB = [re.compile(r"Today is \d{4}-\d{2}-\d{2}\.")]
+
+
+class CassetteMiss(LookupError):
+    """Replay mode found no recording for a request."""
+
+
+class CassetteStore:
+    """
+    Recordings of LLM and research-tool calls, one JSON file per distinct
+    request under `<path>/<kind>/`. In record mode calls go out as usual and
+    their responses (or errors) and durations are written here; in replay mode
+    they are served from here and nothing leaves the machine.
+    """
+
+    def __init__(self, mode: str, path: str = None, replay_latency: str = None):
+        self.mode = mode
+        self.path = path or os.getenv("CASSETTE_DIR", "./cassettes")
+        self.replay_latency = (replay_latency or os.getenv("CASSETTE_REPLAY_LATENCY", "none")).lower()
+        self._lock = threading.Lock()
+        self.counters = {"recorded": 0, "replayed": 0, "misses": 0}
+        os.makedirs(self.path, exist_ok=True)
+
+    def key(self, kind: str, request: Dict) -> str:
+        material = json.dumps(request, sort_keys=True, default=str)
+        for pattern in _KEY_SCRUB:
+            material = pattern.sub("", material)
+        return hashlib.sha256(f"{kind}\n{material}".encode("utf-8")).hexdigest()
+
+    def _file(self, kind: str, key: str) -> str:
+        return os.path.join(self.path, kind, f"{key}.json")
+
+    def load(self, kind: str, key: str) -> Dict:
+        try:
+            with open(self._file(kind, key), encoding="utf-8") as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            with self._lock:
+                self.counters["misses"] += 1
+            raise CassetteMiss(f"No recording for {kind} request {key[:12]} in {self.path}")
+        with self._lock:
+            self.counters["replayed"] += 1
+        return entry
+
+    def save(self, kind: str, key: str, entry: Dict) -> None:
+        directory = os.path.join(self.path, kind)
+        os.makedirs(directory, exist_ok=True)
+        entry = {"kind": kind, "recorded_at": datetime.utcnow().isoformat(), **entry}
+        # Write to a temp file and rename, so a concurrent replay never reads half a file
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f, indent=1, default=str)
+            os.replace(tmp, self._file(kind, key))
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        with self._lock:
+            self.counters["recorded"] += 1
+
+    def replay_delay(self, entry: Dict) -> float:
+        """Seconds to wait before serving a recording: none, the recorded duration, or a fixed value."""
+        if self.replay_latency in ("", "none", "0"):
+            return 0.0
+        if self.replay_latency == "recorded":
+            return float(entry.get("seconds", 0.0))
+        return float(self.replay_latency)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"mode": self.mode, "path": self.path, **self.counters}
+
+
+def _replayed(entry: Dict, decode: Callable) -> Any:
+    if "error" in entry:
+        raise RuntimeError(entry["error"])
+    return decode(entry["response"])
+
+
+def recorded_call(kind: str, request: Dict, fn: Callable[[], Any],
+                  encode: Callable = None, decode: Callable = None) -> Any:
+    """
+    Run `fn()` through the cassette store. `request` identifies the call,
+    `encode`/`decode` convert the response to and from JSON-compatible data.
+    """
+    store = get_cassette_store()
+    if store is None:
+        return fn()
+    key = store.key(kind, request)
+    if store.mode == "replay":
+        entry = store.load(kind, key)
+        delay = store.replay_delay(entry)
+        if delay:
+            time.sleep(delay)
+        return _replayed(entry, decode or (lambda d: d))
+
+    started = time.perf_counter()
+    try:
+        result = fn()
+    except Exception as e:
+        store.save(kind, key, {"request": request, "error": str(e), "seconds": time.perf_counter() - started})
+        raise
+    response = encode(result) if encode else result
+    store.save(kind, key, {"request": request, "response": response, "seconds": time.perf_counter() - started})
+    return result
+
+
+async def recorded_call_async(kind: str, request: Dict, fn: Callable[[], Any],
+                              encode: Callable = None, decode: Callable = None) -> Any:
+    """Coroutine version of `recorded_call`; `fn()` returns an awaitable."""
+    store = get_cassette_store()
+    if store is None:
+        return await fn()
+    key = store.key(kind, request)
+    if store.mode == "replay":
+        entry = await asyncio.to_thread(store.load, kind, key)
+        delay = store.replay_delay(entry)
+        if delay:
+            await asyncio.sleep(delay)
+        return _replayed(entry, decode or (lambda d: d))
+
+    started = time.perf_counter()
+    try:
+        result = await fn()
+    except Exception as e:
+        await asyncio.to_thread(
+            store.save, kind, key, {"request": request, "error": str(e), "seconds": time.perf_counter() - started}
+        )
+        raise
+    response = encode(result) if encode else result
+    await asyncio.to_thread(
+        store.save, kind, key, {"request": request, "response": response, "seconds": time.perf_counter() - started}
+    )
+    return result
+
+
+# Global instance
+cassette_store = None
+_cassette_store_lock = threading.Lock()
+
+
+def get_cassette_store() -> Optional[CassetteStore]:
+    """Get the global cassette store, or None unless CASSETTE_MODE is record or replay"""
+    global cassette_store
+    mode = os.getenv("CASSETTE_MODE", "off").lower()
+    if mode not in ("record", "replay"):
+        return None
+    with _cassette_store_lock:
+        if cassette_store is None or cassette_store.mode != mode:
+            cassette_store = CassetteStore(mode)
+    return cassette_store
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+import os
+import re
+from html.parser import HTMLParser
+from typing import Dict, List, Tuple
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+CONTEXT_COMPACTION = os.getenv("CONTEXT_COMPACTION", "true").lower() == "true"
+# Tokens the whole step prompt (user prompt, history, next task) should fit in
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "12000"))
+# The most recent steps are passed on verbatim
+CONTEXT_RECENT_STEPS = int(os.getenv("CONTEXT_RECENT_STEPS", "2"))
+# Every older step keeps at least this many tokens, however tight the budget
+CONTEXT_MIN_STEP_TOKENS = int(os.getenv("CONTEXT_MIN_STEP_TOKENS", "300"))
+# Share of a truncated step's allowance reserved for its source URLs
+_SOURCES_SHARE = 0.3
+
+_HTML_TAG_RE = re.compile(r"<(table|tr|td|p|h[1-6]|a|br|div|ul|li|strong|em)\b", re.IGNORECASE)
+_URL_RE = re.compile(r"https?://[^\s)\]'\"<>|]+")
+
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Token count with tiktoken when it is installed, otherwise ~4 characters per token."""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+class _CompactText(HTMLParser):
+    """Flattens HTML to plain text: one line per block or table row, cells joined with " | ", links kept as URLs."""
+
+    _BLOCKS = {"p", "div", "br", "table", "ul", "ol", "li", "h1", "h2", "h3", "h4", "h5", "h6"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self._href = None
+        self._link_text = ""
+        self._first_cell = True
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ("script", "style"):
+            self._skip += 1
+        elif tag == "tr":
+            self.parts.append("\n")
+            self._first_cell = True
+        elif tag in ("td", "th"):
+            if not self._first_cell:
+                self.parts.append(" | ")
+            self._first_cell = False
+        elif tag in self._BLOCKS:
+            self.parts.append("\n")
+        elif tag == "a":
+            href = dict(attrs).get("href")
+            self._href = href if href and href != "#" else None
+            self._link_text = ""
+
+    def handle_endtag(self, tag):
+        if tag in ("script", "style"):
+            self._skip = max(self._skip - 1, 0)
+        elif tag == "a" and self._href:
+            if self._href not in self._link_text:
+                self.parts.append(f" ({self._href})")
+            self._href = None
+        elif tag in self._BLOCKS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if self._skip:
+            return
+        if self._href is not None:
+            self._link_text += data
+        self.parts.append(data)
+
+    def text(self) -> str:
+        lines = (re.sub(r"[ \t]+", " ", line).strip() for line in "".join(self.parts).splitlines())
+        return "\n".join(line for line in lines if line)
+
+
+def html_to_text(text: str) -> str:
+    """Strip HTML (e.g. the research agent's result tables) down to compact text; plain text is returned as is."""
+    if not _HTML_TAG_RE.search(text):
+        return text
+    parser = _CompactText()
+    parser.feed(text)
+    parser.close()
+    return parser.text()
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Cut `text` to about `max_tokens`, keeping lines from the top. URLs
+    from the cut part are listed at the end (within a share of the allowance)
+    so later steps can still cite them.
+    """
+    total = count_tokens(text)
+    if total <= max_tokens:
+        return text
+    lines = text.splitlines()
+    # The omission marker and sources header count against the allowance too
+    marker_cost = count_tokens(f"\n[... {total} tokens omitted]")
+
+    urls = list(dict.fromkeys(_URL_RE.findall(text)))
+    sources: List[str] = []
+    sources_budget = int(max_tokens * _SOURCES_SHARE) - count_tokens("\nSources:") if urls else 0
+    used = 0
+    for url in urls:
+        cost = count_tokens(url) + 1
+        if used + cost > sources_budget:
+            break
+        sources.append(url)
+        used += cost
+    if sources:
+        used += count_tokens("\nSources:")
+
+    kept: List[str] = []
+    body_budget = max_tokens - used - marker_cost
+    used = 0
+    for line in lines:
+        cost = count_tokens(line) + 1
+        if used + cost > body_budget:
+            # Keep the part of a long line that still fits
+            room = body_budget - used
+            if room > 20:
+                piece = line[: len(line) * room // cost].rstrip()
+                while piece and count_tokens(piece) + 1 > room:
+                    piece = piece[: len(piece) * 9 // 10].rstrip()
+                kept.append(piece)
+            break
+        kept.append(line)
+        used += cost
+
+    kept_text = "\n".join(kept)
+    omitted = total - count_tokens(kept_text)
+    out = kept_text + f"\n[... {omitted} tokens omitted]"
+    sources = [url for url in sources if url not in kept_text]
+    if sources:
+        out += "\nSources:\n" + "\n".join(sources)
+    return out
+
+
+def compact_history(outputs: List[str], reserved_tokens: int, budget: int = None,
+                    recent_steps: int = None) -> Tuple[List[str], Dict]:
+    """
+    Fit the outputs of earlier steps into `budget` tokens, less `reserved_tokens`
+    for the rest of the prompt. The last `recent_steps` outputs are kept
+    verbatim; older ones have their HTML stripped and, if still too large, are
+    truncated to a share of what is left, proportional to their size.
+
+    Returns the outputs and a report with tokens before/after.
+    """
+    budget = CONTEXT_TOKEN_BUDGET if budget is None else budget
+    recent_steps = CONTEXT_RECENT_STEPS if recent_steps is None else recent_steps
+    before = [count_tokens(o) for o in outputs]
+    report = {"tokens_before": sum(before), "tokens_after": sum(before), "steps_compacted": 0}
+    if not CONTEXT_COMPACTION or len(outputs) <= recent_steps:
+        return outputs, report
+
+    cut = len(outputs) - recent_steps
+    older = [html_to_text(o) for o in outputs[:cut]]
+    recent = outputs[cut:]
+    older_tokens = [count_tokens(o) for o in older]
+
+    available = budget - reserved_tokens - sum(before[cut:])
+    total_older = sum(older_tokens)
+    if total_older > available:
+        for i, tokens in enumerate(older_tokens):
+            share = max(int(max(available, 0) * tokens / total_older), CONTEXT_MIN_STEP_TOKENS)
+            older[i] = truncate_to_tokens(older[i], share)
+
+    compacted = older + recent
+    report["tokens_after"] = sum(count_tokens(o) for o in compacted)
+    report["steps_compacted"] = sum(1 for a, b in zip(outputs[:cut], older) if a != b)
+    return compacted, report
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+FANOUT_CONCURRENCY_INITIAL = float(os.getenv("FANOUT_CONCURRENCY_INITIAL", "4"))
+FANOUT_CONCURRENCY_MIN = float(os.getenv("FANOUT_CONCURRENCY_MIN", "1"))
+FANOUT_CONCURRENCY_MAX = float(os.getenv("FANOUT_CONCURRENCY_MAX", "16"))
+# A call slower than this multiple of the running average latency does not raise the limit
+FANOUT_LATENCY_TOLERANCE = float(os.getenv("FANOUT_LATENCY_TOLERANCE", "2.0"))
+# Failed share of recent calls above which the limit is cut
+FANOUT_ERROR_RATE = float(os.getenv("FANOUT_ERROR_RATE", "0.2"))
+# Multiplicative decrease on overload
+FANOUT_BACKOFF = float(os.getenv("FANOUT_BACKOFF", "0.5"))
+
+_EWMA_ALPHA = 0.1
+
+
+class _Waiter:
+    """A caller queued for a slot; woken (with the slot already granted) in FIFO order."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop = None):
+        self.granted = False
+        self.loop = loop
+        self.future = loop.create_future() if loop else None
+        self.event = None if loop else threading.Event()
+
+    def wake(self):
+        self.granted = True
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class AdaptiveLimiter:
+    """
+    Process-wide concurrency limit for fan-out model calls (e.g. the parallel
+    section writers of every running task), adjusted AIMD-style: each healthy
+    call made while the limit was in use adds 1/limit, so the limit grows by
+    about one per round of calls; a 429 or timeout (reported by the LLM
+    gateway) or a rising error rate cuts it by FANOUT_BACKOFF, at most once
+    per average call latency so one burst of failures counts once. Calls much
+    slower than the running average hold the limit where it is.
+
+    Works for threads and coroutines alike; waiters are served in FIFO order.
+    """
+
+    def __init__(self, initial: float = None, min_limit: float = None, max_limit: float = None):
+        self.min_limit = max(1.0, FANOUT_CONCURRENCY_MIN if min_limit is None else min_limit)
+        self.max_limit = max(self.min_limit, FANOUT_CONCURRENCY_MAX if max_limit is None else max_limit)
+        initial = FANOUT_CONCURRENCY_INITIAL if initial is None else initial
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.in_flight = 0
+        self.latency = None  # EWMA, seconds
+        self.error_rate = 0.0  # EWMA
+        self._waiters = deque()
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+        self.counters = {"calls": 0, "waited": 0, "increases": 0, "decreases": 0, "overloads": 0, "errors": 0}
+
+    def _dispatch(self):
+        # Caller holds self._lock: hand free slots to queued callers
+        while self._waiters and self.in_flight < int(self.limit):
+            self.in_flight += 1
+            self._waiters.popleft().wake()
+
+    def _admit(self, waiter_factory):
+        # Caller holds self._lock; returns None when a slot was taken, else the queued waiter
+        self.counters["calls"] += 1
+        if not self._waiters and self.in_flight < int(self.limit):
+            self.in_flight += 1
+            return None
+        self.counters["waited"] += 1
+        waiter = waiter_factory()
+        self._waiters.append(waiter)
+        return waiter
+
+    def acquire(self):
+        with self._lock:
+            waiter = self._admit(_Waiter)
+        if waiter is not None:
+            waiter.event.wait()
+
+    async def acquire_async(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            waiter = self._admit(lambda: _Waiter(loop))
+        if waiter is None:
+            return
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter.granted:
+                    self.in_flight -= 1
+                    self._dispatch()
+                else:
+                    self._waiters.remove(waiter)
+            raise
+
+    def _decrease(self):
+        # Caller holds self._lock
+        now = time.monotonic()
+        if now - self._last_decrease < max(self.latency or 0.0, 1.0):
+            return
+        self._last_decrease = now
+        new_limit = max(self.min_limit, self.limit * FANOUT_BACKOFF)
+        if new_limit < self.limit:
+            self.limit = new_limit
+            self.counters["decreases"] += 1
+            print(f"Fan-out concurrency limit lowered to {int(self.limit)}")
+
+    def release(self, latency: float, ok: bool = True):
+        """Give back a slot, reporting how long the call took and whether it succeeded."""
+        with self._lock:
+            saturated = bool(self._waiters) or self.in_flight >= int(self.limit)
+            self.in_flight -= 1
+            self.error_rate += _EWMA_ALPHA * ((0.0 if ok else 1.0) - self.error_rate)
+            slow = self.latency is not None and latency > FANOUT_LATENCY_TOLERANCE * self.latency
+            self.latency = latency if self.latency is None else self.latency + _EWMA_ALPHA * (latency - self.latency)
+            if not ok:
+                self.counters["errors"] += 1
+                if self.error_rate > FANOUT_ERROR_RATE:
+                    self._decrease()
+            elif saturated and not slow and self.error_rate <= FANOUT_ERROR_RATE and self.limit < self.max_limit:
+                before = int(self.limit)
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+                if int(self.limit) > before:
+                    self.counters["increases"] += 1
+            self._dispatch()
+
+    def overloaded(self):
+        """The model service pushed back (429 or timeout): back off."""
+        with self._lock:
+            self.counters["overloads"] += 1
+            self._decrease()
+
+    @contextmanager
+    def slot(self):
+        """Hold a slot for one fan-out call."""
+        self.acquire()
+        started = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            self.release(time.perf_counter() - started, ok)
+
+    @asynccontextmanager
+    async def slot_async(self):
+        await self.acquire_async()
+        started = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            self.release(time.perf_counter() - started, ok)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                **self.counters,
+                "limit": int(self.limit),
+                "limit_exact": round(self.limit, 3),
+                "min_limit": int(self.min_limit),
+                "max_limit": int(self.max_limit),
+                "in_flight": self.in_flight,
+                "waiting": len(self._waiters),
+                "latency_seconds": round(self.latency, 3) if self.latency is not None else None,
+                "error_rate": round(self.error_rate, 3),
+            }
+
+
+# Global instance
+fanout_limiter = AdaptiveLimiter()
+
+
+def get_fanout_limiter() -> AdaptiveLimiter:
+    return fanout_limiter
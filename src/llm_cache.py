@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import time
+import asyncio
+import hashlib
+import sqlite3
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Agents whose model calls may be served from the cache
+DEFAULT_CACHED_AGENTS = "analysis_agent,editor_agent,writer_agent,write_section_parallel"
+# Responses cut short or filtered are never cached
+_CACHEABLE_FINISH_REASONS = {"stop", "tool_calls"}
+
+
+class LLMCache:
+    """
+    Exact-match cache of chat completion responses, backed by SQLite. Keys
+    cover the whole request (deployment, messages and all parameters), so a
+    hit is a response the model already gave for precisely that input.
+
+    Entries expire after `ttl` seconds; beyond `max_bytes` the least recently
+    used ones are evicted. Like TextCache, the file is safe to share between
+    threads and uvicorn worker processes.
+    """
+
+    def __init__(self, path: str = None, ttl: float = None, max_bytes: int = None, agents: str = None):
+        self.path = path or os.getenv("LLM_CACHE_PATH", "./.cache/llm_responses.db")
+        self.ttl = ttl if ttl is not None else float(os.getenv("LLM_CACHE_TTL", "86400"))
+        self.max_bytes = max_bytes or int(os.getenv("LLM_CACHE_MAX_MB", "256")) * 1024 * 1024
+        agents = agents if agents is not None else os.getenv("LLM_CACHE_AGENTS", DEFAULT_CACHED_AGENTS)
+        self.agents = {a.strip() for a in agents.split(",") if a.strip()}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "bypassed": 0, "tokens_saved": 0}
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._initialize_database()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _initialize_database(self):
+        """Create tables if they don't exist"""
+        conn = self._conn()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                agent TEXT NOT NULL,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses(last_access)")
+
+    def enabled_for(self, agent: Optional[str]) -> bool:
+        return "*" in self.agents or agent in self.agents
+
+    def count(self, **deltas):
+        """Add to this process's counters"""
+        with self._lock:
+            for name, delta in deltas.items():
+                self.counters[name] += delta
+
+    @staticmethod
+    def key(request: Dict) -> str:
+        return hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Return the cached response for `key` if it has not expired, or None."""
+        now = time.time()
+        conn = self._conn()
+        try:
+            row = conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and now - row[1] > self.ttl:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row is not None:
+                conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+        except sqlite3.Error as e:
+            print(f"LLM cache read failed: {e}")
+            row = None
+        if row is None:
+            self.count(misses=1)
+            return None
+        return {"response": json.loads(row[0]), "age": now - row[1]}
+
+    def put(self, key: str, agent: str, response: Dict):
+        """Store a response, evicting expired and then least recently used entries past the size limit."""
+        data = json.dumps(response, default=str)
+        size = len(data.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        conn = self._conn()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT OR REPLACE INTO responses(key, agent, response, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, agent or "", data, size, now, now),
+            )
+            conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                for old_key, old_size in conn.execute(
+                    "SELECT key, size FROM responses WHERE key != ? ORDER BY last_access ASC", (key,)
+                ).fetchall():
+                    conn.execute("DELETE FROM responses WHERE key = ?", (old_key,))
+                    total -= old_size
+                    if total <= self.max_bytes:
+                        break
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            print(f"LLM cache write failed: {e}")
+
+    def stats(self) -> Dict:
+        conn = self._conn()
+        entries, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        with self._lock:
+            counters = dict(self.counters)
+        return {
+            **counters,
+            "entries": entries,
+            "size_bytes": total,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+            "agents": sorted(self.agents),
+        }
+
+
+# Per workflow step: whether to bypass the cache, and the hits to report in its progress
+_scope: ContextVar[Optional[Dict]] = ContextVar("llm_cache_scope", default=None)
+
+
+@contextmanager
+def llm_cache_scope(fresh: bool = False):
+    """
+    Collect the cache hits of the model calls made inside the block (e.g. one
+    workflow step). With fresh=True those calls skip the cache lookup; their
+    responses still replace the cached ones.
+    """
+    scope = {"fresh": fresh, "hits": []}
+    token = _scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _scope.reset(token)
+
+
+def _cacheable(response: Dict) -> bool:
+    choices = response.get("choices") or []
+    return bool(choices) and all(c.get("finish_reason") in _CACHEABLE_FINISH_REASONS for c in choices)
+
+
+def _lookup(agent: Optional[str], request: Dict, fresh: bool):
+    """
+    (cache, key, entry) for a request. cache is None when caching is off for
+    this agent; entry is None on a miss or when fresh output was asked for
+    (the new response then replaces the cached one).
+    """
+    cache = get_llm_cache()
+    if cache is None or not cache.enabled_for(agent):
+        return None, None, None
+    key = cache.key(request)
+    scope = _scope.get()
+    if fresh or (scope and scope["fresh"]):
+        cache.count(bypassed=1)
+        return cache, key, None
+    return cache, key, cache.get(key)
+
+
+def _served(cache: LLMCache, agent: Optional[str], entry: Dict) -> Dict:
+    tokens = (entry["response"].get("usage") or {}).get("total_tokens") or 0
+    cache.count(hits=1, tokens_saved=tokens)
+    scope = _scope.get()
+    if scope is not None:
+        scope["hits"].append({"agent": agent, "tokens": tokens, "age_seconds": round(entry["age"], 1)})
+    print(f"LLM cache hit for {agent} ({tokens} tokens, {entry['age']:.0f}s old)")
+    return entry["response"]
+
+
+def cached_call(agent: Optional[str], request: Dict, fn: Callable[[], Any],
+                encode: Callable, decode: Callable, fresh: bool = False) -> Any:
+    """
+    Run `fn()` (a chat completion for `request`) through the response cache
+    when it is enabled for `agent`. `encode`/`decode` convert the response to
+    and from JSON-compatible data.
+    """
+    cache, key, entry = _lookup(agent, request, fresh)
+    if cache is None:
+        return fn()
+    if entry is not None:
+        return decode(_served(cache, agent, entry))
+    result = fn()
+    response = encode(result)
+    if _cacheable(response):
+        cache.put(key, agent, response)
+    return result
+
+
+async def cached_call_async(agent: Optional[str], request: Dict, fn: Callable[[], Any],
+                            encode: Callable, decode: Callable, fresh: bool = False) -> Any:
+    """Coroutine version of `cached_call`; `fn()` returns an awaitable."""
+    cache, key, entry = await asyncio.to_thread(_lookup, agent, request, fresh)
+    if cache is None:
+        return await fn()
+    if entry is not None:
+        return decode(_served(cache, agent, entry))
+    result = await fn()
+    response = encode(result)
+    if _cacheable(response):
+        await asyncio.to_thread(cache.put, key, agent, response)
+    return result
+
+
+def llm_cache_hits_summary(hits: List[Dict]) -> str:
+    """One line for a step's progress: how many model calls were served from the cache."""
+    agents = ", ".join(sorted({h["agent"] or "unknown" for h in hits}))
+    tokens = sum(h["tokens"] for h in hits)
+    return f"Served {len(hits)} model call(s) from the response cache ({agents}), {tokens} tokens saved."
+
+
+# Global instance
+llm_cache = None
+_llm_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> Optional[LLMCache]:
+    """Get the global LLM response cache, or None unless LLM_CACHE_ENABLED=true"""
+    global llm_cache
+    if os.getenv("LLM_CACHE_ENABLED", "false").lower() != "true":
+        return None
+    with _llm_cache_lock:
+        if llm_cache is None:
+            try:
+                llm_cache = LLMCache()
+            except Exception as e:
+                print(f"Failed to initialize LLM cache: {e}")
+                return None
+    return llm_cache
@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+from dotenv import load_dotenv
+
+import httpx
+import openai
+from openai import AzureOpenAI, AsyncAzureOpenAI
+
+from src.context_compaction import count_tokens
+from src.fanout import get_fanout_limiter
+
+# Load environment variables
+load_dotenv()
+
+AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT", "https://oai-sbd-genai-common-eastus2-dev.openai.azure.com/")
+AZURE_OPENAI_API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION", "2025-01-01-preview")
+# Connections kept open to the endpoint, shared by all agents
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "50"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "600"))
+# Default budgets per deployment; 0 means unlimited
+LLM_RPM = int(os.getenv("LLM_RPM", "0"))
+LLM_TPM = int(os.getenv("LLM_TPM", "0"))
+# Per-deployment budgets, e.g. "sbd-o3-mini-0131=500/200000,sbd-gpt-4.1-mini=1000/500000"
+LLM_RATE_LIMITS = os.getenv("LLM_RATE_LIMITS", "")
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+LLM_RETRY_BASE = float(os.getenv("LLM_RETRY_BASE", "1.0"))
+LLM_RETRY_MAX = float(os.getenv("LLM_RETRY_MAX", "60"))
+# Completion tokens assumed for TPM accounting when a request sets no max_tokens
+LLM_COMPLETION_ESTIMATE = int(os.getenv("LLM_COMPLETION_ESTIMATE", "1000"))
+
+_RETRY_STATUSES = {408, 409, 429}
+_WINDOW = 60.0
+
+
+def _parse_rate_limits(spec: str) -> Dict[str, tuple]:
+    limits = {}
+    for entry in spec.split(","):
+        if "=" not in entry:
+            continue
+        deployment, budget = entry.split("=", 1)
+        rpm, _, tpm = budget.partition("/")
+        limits[deployment.strip()] = (int(rpm or 0), int(tpm or 0))
+    return limits
+
+
+def _retry_after(e: Exception) -> Optional[float]:
+    """Seconds the service asked us to wait (retry-after-ms / Retry-After headers), if any"""
+    response = getattr(e, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if value:
+            try:
+                return float(value)
+            except ValueError:
+                return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+def _retryable(e: Exception) -> bool:
+    if isinstance(e, openai.APIConnectionError):  # includes timeouts
+        return True
+    status = getattr(e, "status_code", None)
+    return status in _RETRY_STATUSES or (status is not None and status >= 500)
+
+
+class DeploymentBudget:
+    """
+    Requests and tokens spent on one deployment over the last minute. A
+    request reserves its estimated tokens up front; the estimate is replaced
+    by the actual usage once the response arrives.
+    """
+
+    def __init__(self, rpm: int, tpm: int):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.window = deque()  # [timestamp, tokens]
+        self.tokens = 0
+        self.blocked_until = 0.0
+        self.counters = {
+            "requests": 0, "tokens": 0, "prompt_tokens": 0, "cached_tokens": 0,
+            "throttled": 0, "wait_seconds": 0.0, "retries": 0, "rate_limited": 0,
+        }
+
+    def _expire(self, now: float):
+        while self.window and now - self.window[0][0] >= _WINDOW:
+            self.tokens -= self.window.popleft()[1]
+
+    def reserve(self, tokens: int):
+        """(entry, 0) once the request fits in the budget, else (None, seconds to wait). Caller holds the lock."""
+        now = time.time()
+        if now < self.blocked_until:
+            return None, self.blocked_until - now
+        self._expire(now)
+        over_rpm = self.rpm and len(self.window) >= self.rpm
+        # A request larger than the whole budget still goes through once the window is empty
+        over_tpm = self.tpm and self.window and self.tokens + tokens > self.tpm
+        if over_rpm or over_tpm:
+            if over_rpm:
+                wait = self.window[0][0] + _WINDOW - now
+            else:
+                freed, wait = 0, 0.0
+                for stamp, spent in self.window:
+                    freed += spent
+                    wait = stamp + _WINDOW - now
+                    if self.tokens - freed + tokens <= self.tpm:
+                        break
+            return None, max(wait, 0.01)
+        entry = [now, tokens]
+        self.window.append(entry)
+        self.tokens += tokens
+        self.counters["requests"] += 1
+        return entry, 0.0
+
+    def settle(self, entry: list, tokens: int):
+        """Replace a reservation's estimate with the tokens actually used. Caller holds the lock."""
+        if any(e is entry for e in self.window):
+            self.tokens += tokens - entry[1]
+        entry[1] = tokens
+        self.counters["tokens"] += tokens
+
+
+class LLMGateway:
+    """
+    The one way agents reach Azure OpenAI. Owns the clients (one pooled HTTP
+    client for sync calls, one per event loop for async calls), keeps each
+    deployment within its requests-per-minute and tokens-per-minute budget,
+    and retries rate-limited and transient failures with jittered
+    exponential backoff, honoring the service's Retry-After.
+
+    A 429 pauses the whole deployment for the Retry-After period, so
+    concurrent callers (e.g. the parallel section writers) back off together
+    instead of each burning its own retries.
+    """
+
+    def __init__(self, client=None, async_client=None):
+        self._lock = threading.Lock()
+        self._budgets: Dict[str, DeploymentBudget] = {}
+        self._limits = _parse_rate_limits(LLM_RATE_LIMITS)
+        self._fixed_async_client = async_client
+        self._async = None  # (loop, client)
+        self.client = client or AzureOpenAI(
+            api_version=AZURE_OPENAI_API_VERSION,
+            azure_endpoint=AZURE_OPENAI_ENDPOINT,
+            api_key=os.getenv("AZURE_OPENAI_KEY"),
+            max_retries=0,  # retried here, with the deployment's budget in mind
+            timeout=LLM_TIMEOUT,
+            http_client=httpx.Client(
+                limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_CONNECTIONS),
+                timeout=LLM_TIMEOUT,
+            ),
+        )
+
+    def async_client(self):
+        """Pooled async client, one per event loop."""
+        if self._fixed_async_client is not None:
+            return self._fixed_async_client
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._async is None or self._async[0] is not loop:
+                client = AsyncAzureOpenAI(
+                    api_version=AZURE_OPENAI_API_VERSION,
+                    azure_endpoint=AZURE_OPENAI_ENDPOINT,
+                    api_key=os.getenv("AZURE_OPENAI_KEY"),
+                    max_retries=0,
+                    timeout=LLM_TIMEOUT,
+                    http_client=httpx.AsyncClient(
+                        limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_CONNECTIONS),
+                        timeout=LLM_TIMEOUT,
+                    ),
+                )
+                self._async = (loop, client)
+            return self._async[1]
+
+    def _budget(self, deployment: str) -> DeploymentBudget:
+        # Caller holds self._lock
+        budget = self._budgets.get(deployment)
+        if budget is None:
+            rpm, tpm = self._limits.get(deployment, (LLM_RPM, LLM_TPM))
+            budget = self._budgets[deployment] = DeploymentBudget(rpm, tpm)
+        return budget
+
+    @staticmethod
+    def _estimate(kwargs: Dict) -> int:
+        prompt = json.dumps([kwargs.get("messages"), kwargs.get("tools")], default=str)
+        completion = kwargs.get("max_completion_tokens") or kwargs.get("max_tokens") or LLM_COMPLETION_ESTIMATE
+        return count_tokens(prompt) + completion
+
+    def _reserve(self, deployment: str, tokens: int):
+        with self._lock:
+            budget = self._budget(deployment)
+            entry, wait = budget.reserve(tokens)
+            if wait:
+                budget.counters["throttled"] += 1
+                budget.counters["wait_seconds"] += wait
+            return entry, wait
+
+    def _settle(self, deployment: str, entry: list, usage):
+        tokens = getattr(usage, "total_tokens", None)
+        if tokens is None:
+            return
+        # Prompt tokens served from the provider's prefix cache
+        cached = getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", None) or 0
+        with self._lock:
+            budget = self._budget(deployment)
+            budget.settle(entry, tokens)
+            budget.counters["prompt_tokens"] += getattr(usage, "prompt_tokens", None) or 0
+            budget.counters["cached_tokens"] += cached
+
+    def _failed(self, deployment: str, entry: list, e: Exception, attempt: int) -> float:
+        """Seconds to wait before retrying after `e`; re-raises when it should not be retried."""
+        with self._lock:
+            # A failed request used no tokens
+            self._budget(deployment).settle(entry, 0)
+        if getattr(e, "status_code", None) in (408, 429) or isinstance(e, openai.APITimeoutError):
+            get_fanout_limiter().overloaded()
+        if attempt >= LLM_MAX_RETRIES or not _retryable(e):
+            raise e
+        retry_after = _retry_after(e)
+        backoff = random.uniform(0, min(LLM_RETRY_MAX, LLM_RETRY_BASE * 2 ** attempt))
+        with self._lock:
+            budget = self._budget(deployment)
+            budget.counters["retries"] += 1
+            if getattr(e, "status_code", None) == 429:
+                budget.counters["rate_limited"] += 1
+                if retry_after is not None:
+                    budget.blocked_until = max(budget.blocked_until, time.time() + retry_after)
+        wait = backoff if retry_after is None else retry_after + random.uniform(0, LLM_RETRY_BASE)
+        print(f"LLM call to {deployment} failed ({e}); retry {attempt + 1}/{LLM_MAX_RETRIES} in {wait:.1f}s")
+        return wait
+
+    def _metered(self, stream, deployment: str, entry: list):
+        for chunk in stream:
+            if getattr(chunk, "usage", None):
+                self._settle(deployment, entry, chunk.usage)
+            yield chunk
+
+    async def _metered_async(self, stream, deployment: str, entry: list):
+        async for chunk in stream:
+            if getattr(chunk, "usage", None):
+                self._settle(deployment, entry, chunk.usage)
+            yield chunk
+
+    def create(self, **kwargs):
+        """chat.completions.create within the deployment's budget, with retries. With stream=True, returns the chunk iterator."""
+        deployment = kwargs.get("model")
+        estimate = self._estimate(kwargs)
+        attempt = 0
+        while True:
+            entry, wait = self._reserve(deployment, estimate)
+            if wait:
+                time.sleep(wait)
+                continue
+            try:
+                resp = self.client.chat.completions.create(**kwargs)
+            except Exception as e:
+                time.sleep(self._failed(deployment, entry, e, attempt))
+                attempt += 1
+                continue
+            if kwargs.get("stream"):
+                return self._metered(resp, deployment, entry)
+            self._settle(deployment, entry, getattr(resp, "usage", None))
+            return resp
+
+    async def create_async(self, **kwargs):
+        deployment = kwargs.get("model")
+        estimate = self._estimate(kwargs)
+        attempt = 0
+        while True:
+            entry, wait = self._reserve(deployment, estimate)
+            if wait:
+                await asyncio.sleep(wait)
+                continue
+            try:
+                resp = await self.async_client().chat.completions.create(**kwargs)
+            except Exception as e:
+                await asyncio.sleep(self._failed(deployment, entry, e, attempt))
+                attempt += 1
+                continue
+            if kwargs.get("stream"):
+                return self._metered_async(resp, deployment, entry)
+            self._settle(deployment, entry, getattr(resp, "usage", None))
+            return resp
+
+    def stats(self) -> Dict:
+        with self._lock:
+            out = {}
+            for deployment, budget in self._budgets.items():
+                budget._expire(time.time())
+                out[deployment] = {
+                    **budget.counters,
+                    "wait_seconds": round(budget.counters["wait_seconds"], 3),
+                    "rpm_limit": budget.rpm,
+                    "tpm_limit": budget.tpm,
+                    "requests_last_minute": len(budget.window),
+                    "tokens_last_minute": budget.tokens,
+                }
+            return out
+
+
+# Global instance
+llm_gateway = None
+_llm_gateway_lock = threading.Lock()
+
+
+def get_llm_gateway() -> LLMGateway:
+    """Get the global LLM gateway"""
+    global llm_gateway
+    with _llm_gateway_lock:
+        if llm_gateway is None:
+            llm_gateway = LLMGateway()
+    return llm_gateway
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import threading
+from typing import Optional
+
+
+def current_rss_mb() -> Optional[float]:
+    """Resident set size of this process in MB, or None if it can't be read."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+
+        # Not the current RSS, but the best available without /proc
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except (ImportError, OSError):
+        return None
+
+
+class PeakRssMonitor:
+    """
+    Samples the process RSS on a background thread while the block runs and
+    records the peak, e.g. for one research step:
+
+        with PeakRssMonitor() as mon:
+            ...
+        print(mon.peak_mb)
+
+    With `interval=None` no thread is started and only the start and end
+    readings are taken, which suits code running on an event loop.
+    """
+
+    def __init__(self, interval: Optional[float] = 0.05):
+        self.interval = interval
+        self.start_mb: Optional[float] = None
+        self.end_mb: Optional[float] = None
+        self.peak_mb: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        rss = current_rss_mb()
+        if rss is not None and (self.peak_mb is None or rss > self.peak_mb):
+            self.peak_mb = rss
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self.start_mb = current_rss_mb()
+        self._sample()
+        if self.interval is not None:
+            self._thread = threading.Thread(target=self._run, name="rss-monitor", daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._sample()
+        self.end_mb = current_rss_mb()
+
+    def as_dict(self) -> dict:
+        def _round(v):
+            return round(v, 1) if v is not None else None
+
+        return {"start_mb": _round(self.start_mb), "peak_mb": _round(self.peak_mb), "end_mb": _round(self.end_mb)}
@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+
+from src.text_cache import arxiv_id
+from src.relevance import tokenize
+
+# Load environment variables
+load_dotenv()
+
+
+class PaperIndex:
+    """
+    Local full-text index of arXiv papers we have already fetched and
+    extracted, backed by SQLite FTS5. Lets arxiv_search_tool answer repeat
+    topics without going to the network.
+
+    Freshness policy: a paper fetched more than `max_age_days` ago is not
+    served (and is refetched the next time a search returns it); a query seen
+    less than `query_ttl_hours` ago is answered from the papers it returned
+    last time without asking the arXiv API again.
+    """
+
+    def __init__(self, path: str = None, max_age_days: float = None, query_ttl_hours: float = None):
+        self.path = path or os.getenv("PAPER_INDEX_PATH", "./.cache/papers.db")
+        if max_age_days is None:
+            max_age_days = float(os.getenv("PAPER_INDEX_MAX_AGE_DAYS", "30"))
+        if query_ttl_hours is None:
+            query_ttl_hours = float(os.getenv("PAPER_INDEX_QUERY_TTL_HOURS", "24"))
+        self.max_age = max_age_days * 86400
+        self.query_ttl = query_ttl_hours * 3600
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.counters = {"queries_local": 0, "queries_partial": 0, "queries_network": 0, "papers_served": 0, "papers_added": 0}
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._initialize_database()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _initialize_database(self):
+        """Create tables if they don't exist"""
+        conn = self._conn()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS papers (
+                id INTEGER PRIMARY KEY,
+                arxiv_id TEXT NOT NULL UNIQUE,
+                title TEXT NOT NULL,
+                authors TEXT NOT NULL,
+                published TEXT NOT NULL,
+                url TEXT NOT NULL,
+                link_pdf TEXT,
+                fetched_at REAL NOT NULL
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_papers_fetched_at ON papers(fetched_at)")
+        # rowid matches papers.id
+        conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS papers_fts USING fts5("
+            "title, authors, abstract, text, tokenize='porter unicode61')"
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS queries (
+                query TEXT PRIMARY KEY,
+                arxiv_ids TEXT NOT NULL,
+                requested INTEGER NOT NULL,
+                exhausted INTEGER NOT NULL,
+                fetched_at REAL NOT NULL
+            )
+            """
+        )
+
+    def count(self, **deltas):
+        """Add to this process's counters"""
+        with self._lock:
+            for name, delta in deltas.items():
+                self.counters[name] += delta
+
+    def _papers(self, conn: sqlite3.Connection, where: str, params: tuple) -> Dict[str, Dict]:
+        rows = conn.execute(
+            "SELECT p.arxiv_id, p.title, p.authors, p.published, p.url, p.link_pdf, f.abstract, f.text "
+            f"FROM papers p JOIN papers_fts f ON f.rowid = p.id WHERE {where}",
+            params,
+        ).fetchall()
+        return {
+            row[0]: {
+                "title": row[1],
+                "authors": json.loads(row[2]),
+                "published": row[3],
+                "url": row[4],
+                "summary": row[7] or row[6],
+                "link_pdf": row[5],
+            }
+            for row in rows
+        }
+
+    def lookup_query(self, query: str, max_results: int) -> Optional[List[Dict]]:
+        """
+        Papers a fresh earlier search for the same (normalized) query returned,
+        if they cover `max_results` and are all still fresh; otherwise None.
+        """
+        try:
+            conn = self._conn()
+            row = conn.execute(
+                "SELECT arxiv_ids, requested, exhausted, fetched_at FROM queries WHERE query = ?", (query,)
+            ).fetchone()
+            if row is None or time.time() - row[3] > self.query_ttl:
+                return None
+            ids = json.loads(row[0])
+            if row[1] < max_results and not row[2]:
+                return None
+            ids = ids[:max_results]
+            placeholders = ",".join("?" * len(ids))
+            found = self._papers(
+                conn, f"p.arxiv_id IN ({placeholders}) AND p.fetched_at >= ?", (*ids, time.time() - self.max_age)
+            ) if ids else {}
+        except sqlite3.Error as e:
+            print(f"Paper index read failed: {e}")
+            return None
+        if len(found) < len(ids):
+            return None
+        self.count(queries_local=1, papers_served=len(ids))
+        return [found[i] for i in ids]
+
+    def papers(self, ids: List[str]) -> Dict[str, Dict]:
+        """Fresh indexed papers among the arXiv `ids`, keyed by id."""
+        if not ids:
+            return {}
+        try:
+            return self._papers(
+                self._conn(),
+                f"p.arxiv_id IN ({','.join('?' * len(ids))}) AND p.fetched_at >= ?",
+                (*ids, time.time() - self.max_age),
+            )
+        except sqlite3.Error as e:
+            print(f"Paper index read failed: {e}")
+            return {}
+
+    def search(self, query: str, limit: int) -> List[Dict]:
+        """Fresh papers containing every term of `query`, best BM25 match first."""
+        terms = tokenize(query)
+        if not terms or limit <= 0:
+            return []
+        match = " AND ".join(f'"{t}"' for t in terms)
+        try:
+            conn = self._conn()
+            ranked = conn.execute(
+                "SELECT p.arxiv_id FROM papers_fts f JOIN papers p ON p.id = f.rowid "
+                "WHERE papers_fts MATCH ? AND p.fetched_at >= ? "
+                "ORDER BY bm25(papers_fts, 10.0, 2.0, 5.0, 1.0) LIMIT ?",
+                (match, time.time() - self.max_age, limit),
+            ).fetchall()
+            ids = [r[0] for r in ranked]
+            found = self._papers(conn, f"p.arxiv_id IN ({','.join('?' * len(ids))})", tuple(ids)) if ids else {}
+        except sqlite3.Error as e:
+            print(f"Paper index search failed: {e}")
+            return []
+        return [found[i] for i in ids if i in found]
+
+    def add(self, item: Dict, abstract: str) -> bool:
+        """Index an arXiv result whose `summary` holds its extracted text; returns False if it has no arXiv id."""
+        parsed = arxiv_id(item.get("url")) or arxiv_id(item.get("link_pdf"))
+        if not parsed:
+            return False
+        now = time.time()
+        authors = item.get("authors") or []
+        conn = self._conn()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            old = conn.execute("SELECT id FROM papers WHERE arxiv_id = ?", (parsed[0],)).fetchone()
+            if old:
+                conn.execute("DELETE FROM papers_fts WHERE rowid = ?", (old[0],))
+                conn.execute("DELETE FROM papers WHERE id = ?", (old[0],))
+            cur = conn.execute(
+                "INSERT INTO papers(arxiv_id, title, authors, published, url, link_pdf, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (parsed[0], item.get("title") or "", json.dumps(authors), item.get("published") or "",
+                 item.get("url") or "", item.get("link_pdf"), now),
+            )
+            conn.execute(
+                "INSERT INTO papers_fts(rowid, title, authors, abstract, text) VALUES (?, ?, ?, ?, ?)",
+                (cur.lastrowid, item.get("title") or "", " ".join(authors), abstract or "", item.get("summary") or ""),
+            )
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            print(f"Paper index write failed: {e}")
+            return False
+        self.count(papers_added=1)
+        return True
+
+    def remember_query(self, query: str, items: List[Dict], requested: int, exhausted: bool):
+        """Record which papers a network search returned, for `lookup_query`."""
+        ids = [parsed[0] for parsed in (arxiv_id(item.get("url")) for item in items) if parsed]
+        conn = self._conn()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT OR REPLACE INTO queries(query, arxiv_ids, requested, exhausted, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                (query, json.dumps(ids), requested, int(exhausted), time.time()),
+            )
+            # Drop what the freshness policy would no longer serve anyway
+            stale = time.time() - self.max_age
+            conn.execute("DELETE FROM papers_fts WHERE rowid IN (SELECT id FROM papers WHERE fetched_at < ?)", (stale,))
+            conn.execute("DELETE FROM papers WHERE fetched_at < ?", (stale,))
+            conn.execute("DELETE FROM queries WHERE fetched_at < ?", (time.time() - self.query_ttl,))
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            print(f"Paper index write failed: {e}")
+
+    def stats(self) -> Dict:
+        conn = self._conn()
+        papers = conn.execute("SELECT COUNT(*) FROM papers").fetchone()[0]
+        queries = conn.execute("SELECT COUNT(*) FROM queries").fetchone()[0]
+        with self._lock:
+            counters = dict(self.counters)
+        return {
+            **counters,
+            "papers": papers,
+            "queries": queries,
+            "max_age_days": self.max_age / 86400,
+            "query_ttl_hours": self.query_ttl / 3600,
+        }
+
+
+# Global instance
+paper_index = None
+_paper_index_lock = threading.Lock()
+
+
+def get_paper_index() -> Optional[PaperIndex]:
+    """Get the global paper index, or None when disabled via PAPER_INDEX_ENABLED=false"""
+    global paper_index
+    if os.getenv("PAPER_INDEX_ENABLED", "true").lower() != "true":
+        return None
+    with _paper_index_lock:
+        if paper_index is None:
+            try:
+                paper_index = PaperIndex()
+            except Exception as e:
+                print(f"Failed to initialize paper index: {e}")
+                return None
+    return paper_index
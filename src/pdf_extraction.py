@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+import os
+import threading
+import multiprocessing
+from typing import List, Optional
+from dotenv import load_dotenv
+
+from src.pdf_text import pdf_bytes_to_text
+
+# Load environment variables
+load_dotenv()
+
+
+def _address_space() -> Optional[int]:
+    """This process's virtual memory size in bytes, where /proc reports it (Linux)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmSize:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def _init_worker(max_memory_mb: int):
+    """
+    Load the extraction libraries, then cap the worker's address space so a
+    pathological PDF fails inside the worker, not the API. Address space also
+    counts mapped libraries and reserved-but-untouched memory, so the cap is
+    `max_memory_mb` on top of what the loaded worker already maps.
+    """
+    try:
+        import fitz  # noqa: F401  (PyMuPDF)
+    except ImportError:
+        pass
+    if max_memory_mb <= 0:
+        return
+    baseline = _address_space()
+    if baseline is None:
+        return
+    try:
+        import resource
+
+        limit = baseline + max_memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, ValueError, OSError):
+        pass
+
+
+def _extract_job(pdf_source, max_pages: Optional[int], max_chars: Optional[int]) -> str:
+    return pdf_bytes_to_text(pdf_source, max_pages=max_pages, max_chars=max_chars)
+
+
+def _worker_main(conn, max_memory_mb: int):
+    """Run jobs sent over `conn` until the parent closes it; each reply is ("ok", result) or ("error", exception)."""
+    _init_worker(max_memory_mb)
+    while True:
+        try:
+            fn, args = conn.recv()
+        except (EOFError, OSError):
+            return
+        try:
+            reply = ("ok", fn(*args))
+        except Exception as e:
+            reply = ("error", e)
+        try:
+            conn.send(reply)
+        except Exception:
+            # e.g. an exception that cannot be pickled
+            conn.send(("error", RuntimeError(f"{type(reply[1]).__name__}: {reply[1]}")))
+
+
+class _Worker:
+    """One extraction process and the pipe to it; it runs one job at a time."""
+
+    def __init__(self, ctx, max_memory_mb: int):
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child, max_memory_mb), daemon=True)
+        self.process.start()
+        child.close()
+
+    def kill(self):
+        try:
+            self.conn.close()
+        except OSError:
+            pass
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(5)
+            if self.process.is_alive():
+                self.process.kill()
+        self.process.join(5)
+
+
+class PdfExtractionService:
+    """
+    Runs PDF text extraction in worker processes, so CPU-bound parsing does
+    not hold the GIL of the API process. Each worker has its own pipe and runs
+    one job at a time: a job that hangs past its timeout or crashes its worker
+    gets that worker killed and replaced, and only that job fails; jobs
+    running in the other workers are not affected.
+    """
+
+    def __init__(self, max_workers: int = None, timeout: float = None, max_memory_mb: int = None):
+        self.max_workers = max_workers or int(os.getenv("PDF_EXTRACT_WORKERS", "0")) or os.cpu_count() or 1
+        self.timeout = timeout or float(os.getenv("PDF_EXTRACT_TIMEOUT", "60"))
+        self.max_memory_mb = max_memory_mb if max_memory_mb is not None else int(
+            os.getenv("PDF_EXTRACT_MAX_MEMORY_MB", "1024")
+        )
+        # "spawn" keeps workers independent of the parent's threads and works on Windows too
+        self._ctx = multiprocessing.get_context("spawn")
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_workers)
+        self._idle: List[_Worker] = []
+        self._closed = False
+
+    def _checkout(self) -> _Worker:
+        # Caller holds a slot; workers are started on first use
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("PDF extraction service is shut down")
+            while self._idle:
+                worker = self._idle.pop()
+                if worker.process.is_alive():
+                    return worker
+                worker.kill()
+        return _Worker(self._ctx, self.max_memory_mb)
+
+    def _checkin(self, worker: _Worker):
+        with self._lock:
+            if not self._closed:
+                self._idle.append(worker)
+                return
+        worker.kill()
+
+    def _call(self, fn, args: tuple, timeout: float):
+        """Run `fn(*args)` in a worker, killing the worker if it overruns `timeout` or dies."""
+        with self._slots:
+            worker = self._checkout()
+            try:
+                worker.conn.send((fn, args))
+                finished = worker.conn.poll(timeout)
+                if finished:
+                    status, result = worker.conn.recv()
+            except (EOFError, OSError):
+                worker.kill()
+                raise RuntimeError("PDF extraction worker crashed")
+            except BaseException:
+                worker.kill()
+                raise
+            if not finished:
+                worker.kill()
+                raise TimeoutError(f"PDF extraction timed out after {timeout:.0f}s")
+            self._checkin(worker)
+        if status == "error":
+            raise result
+        return result
+
+    def extract(
+        self,
+        pdf_source,
+        max_pages: Optional[int] = None,
+        max_chars: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ) -> str:
+        """
+        Extract text in a worker process. `pdf_source` is the PDF bytes or, preferably,
+        a path to the PDF on disk so only the path crosses the process boundary.
+
+        Raises:
+            TimeoutError: the job did not finish within `timeout` seconds.
+            RuntimeError: the worker crashed.
+            Whatever the extraction itself raised in the worker.
+        """
+        return self._call(_extract_job, (pdf_source, max_pages, max_chars), timeout or self.timeout)
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.kill()
+
+
+# Global instance
+extraction_service = None
+_extraction_service_lock = threading.Lock()
+
+
+def get_extraction_service() -> Optional[PdfExtractionService]:
+    """Get the global extraction service, or None unless USE_PDF_PROCESS_POOL=true"""
+    global extraction_service
+    if os.getenv("USE_PDF_PROCESS_POOL", "false").lower() != "true":
+        return None
+    with _extraction_service_lock:
+        if extraction_service is None:
+            try:
+                extraction_service = PdfExtractionService()
+            except Exception as e:
+                print(f"Failed to start PDF extraction pool: {e}")
+                return None
+    return extraction_service
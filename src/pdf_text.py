@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+import re
+from io import BytesIO
+from typing import Optional
+
+# Text extraction only: this module is what PDF extraction worker processes
+# import, so it must stay free of network clients and other heavy imports.
+
+
+def clean_text(s: str) -> str:
+    s = re.sub(r"-\n", "", s)  # "transfor-\nmers" -> "transformers"
+    s = re.sub(r"\r\n|\r", "\n", s)  # normalize line breaks
+    s = re.sub(r"[ \t]+", " ", s)  # collapse spaces
+    s = re.sub(r"\n{3,}", "\n\n", s)  # no more than 1 blank line in a row
+    return s.strip()
+
+
+def extract_text_pymupdf(
+    pdf_source, max_pages: Optional[int] = None, max_chars: Optional[int] = None
+) -> str:
+    """
+    Page-by-page PyMuPDF extraction that stops once `max_chars` cleaned chars are collected.
+    `pdf_source` is either the PDF bytes or a path to the PDF on disk.
+    """
+    import fitz  # PyMuPDF
+
+    out = []
+    collected = 0
+    if isinstance(pdf_source, str):
+        doc = fitz.open(pdf_source, filetype="pdf")
+    else:
+        doc = fitz.open(stream=pdf_source, filetype="pdf")
+    with doc:
+        n = len(doc)
+        limit = n if max_pages is None else min(max_pages, n)
+        for i in range(limit):
+            page_text = doc.load_page(i).get_text("text")
+            out.append(page_text)
+            if max_chars is not None:
+                collected += len(clean_text(page_text))
+                if collected >= max_chars:
+                    break
+    return "\n".join(out)
+
+
+def extract_text_pdfminer(
+    pdf_source, max_pages: Optional[int] = None, max_chars: Optional[int] = None
+) -> str:
+    """
+    Page-by-page pdfminer.six extraction honouring the same page and char limits.
+    `pdf_source` is either the PDF bytes or a path, which is memory-mapped.
+    """
+    if isinstance(pdf_source, str):
+        import mmap
+
+        with open(pdf_source, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return _pdfminer_pages_to_text(mm, max_pages, max_chars)
+    with BytesIO(pdf_source) as fp:
+        return _pdfminer_pages_to_text(fp, max_pages, max_chars)
+
+
+def _pdfminer_pages_to_text(fp, max_pages: Optional[int], max_chars: Optional[int]) -> str:
+    from io import StringIO
+    from pdfminer.converter import TextConverter
+    from pdfminer.layout import LAParams
+    from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+    from pdfminer.pdfpage import PDFPage
+
+    rsrcmgr = PDFResourceManager()
+    out = []
+    collected = 0
+    # get_pages parses lazily, so pages past the budget are never touched
+    for page in PDFPage.get_pages(fp, maxpages=max_pages or 0):
+        buf = StringIO()
+        device = TextConverter(rsrcmgr, buf, laparams=LAParams())
+        try:
+            PDFPageInterpreter(rsrcmgr, device).process_page(page)
+        finally:
+            device.close()
+        page_text = buf.getvalue()
+        out.append(page_text)
+        if max_chars is not None:
+            collected += len(clean_text(page_text))
+            if collected >= max_chars:
+                break
+    return "\n".join(out)
+
+
+def pdf_bytes_to_text(
+    pdf_bytes, max_pages: Optional[int] = None, max_chars: Optional[int] = None
+) -> str:
+    """`pdf_bytes` may also be a path to a PDF on disk (see SpooledPdf.source())."""
+    # 1) PyMuPDF
+    try:
+        return extract_text_pymupdf(pdf_bytes, max_pages=max_pages, max_chars=max_chars)
+    except Exception:
+        pass
+
+    # 2) pdfminer.six
+    try:
+        return extract_text_pdfminer(pdf_bytes, max_pages=max_pages, max_chars=max_chars)
+    except Exception as e:
+        raise RuntimeError(f"PDF text extraction failed: {e}")
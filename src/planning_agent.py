@@ -1,7 +1,6 @@
 # -*- coding: utf-8 -*-
 import json
 import re
-import os
 from typing import List
 from datetime import datetime
 from src.agents import (
@@ -9,16 +8,14 @@ from src.agents import (
     writer_agent,
     editor_agent,
     parallel_writer_agent,
+    research_agent_async,
+    writer_agent_async,
+    editor_agent_async,
+    parallel_writer_agent_async,
+    analysis_agent_async,
 )
-
-# Configure Azure OpenAI client
-from openai import AzureOpenAI
-
-client = AzureOpenAI(
-    api_version="2025-01-01-preview",
-    azure_endpoint="https://oai-sbd-genai-common-eastus2-dev.openai.azure.com/",
-    api_key=os.getenv("AZURE_OPENAI_KEY")
-)
+from src.context_compaction import compact_history, count_tokens
+from src.workflow_dag import linear_dependencies
 
 
 def clean_json_block(raw: str) -> str:
@@ -47,7 +44,7 @@ def planner_agent(topic: str, model: str = "azure:gpt-4") -> List[str]:
     # Define the exact 6-step workflow structure
     steps = [
         "Research agent: Use Tavily to perform a broad web search and collect top relevant items (title, authors, year, venue/source, URL, DOI if available).",
-        "Research agent: For each collected item, search on arXiv to find matching preprints/versions and record arXiv URLs (if they exist).",
+        "Research agent: Search arXiv for preprints on the research topic and record their arXiv URLs.",
         "Analysis agent: Organize and synthesize the results from Tavily and arXiv, categorizing items by their relevance to the research topic and identifying key themes.",
         "Analysis agent: Rank the collected sources by authority, impact, and recency, highlighting seminal works and high-impact research.",
         "Editor agent: Review, refine, and improve the analysis for clarity and comprehensiveness, ensuring all research findings are accurately represented.",
@@ -57,56 +54,126 @@ def planner_agent(topic: str, model: str = "azure:gpt-4") -> List[str]:
     return steps
 
 
-def executor_agent_step(step_title: str, history: list, prompt: str, advanced_options: dict = None):
-    """
-    Executes a step of the executor agent.
-    Returns:
-        - step_title (str)
-        - agent_name (str)
-        - output (str)
-    """
-    
+# For each step of planner_agent's plan, the steps whose output it needs: the
+# web and arXiv searches are independent, both analyses only need the
+# research, the editor reviews both analyses and the writer works from the
+# edited analysis (each step also sees everything its dependencies saw).
+PLAN_DEPENDENCIES = [[], [], [0, 1], [0, 1], [2, 3], [4]]
+
+
+def plan_dependencies(steps: List[str]) -> List[List[int]]:
+    """Dependency graph of a plan; a plan other than planner_agent's runs step by step"""
+    if len(steps) == len(PLAN_DEPENDENCIES):
+        return [list(deps) for deps in PLAN_DEPENDENCIES]
+    return linear_dependencies(len(steps))
 
+
+def _history_label(i: int, desc: str, agent: str) -> str:
+    if "draft" in desc.lower() or agent == "writer_agent":
+        return f"Draft (Step {i + 1})"
+    elif "feedback" in desc.lower() or agent == "editor_agent":
+        return f"Feedback (Step {i + 1})"
+    elif "research" in desc.lower() or agent == "research_agent":
+        return f"Research (Step {i + 1})"
+    else:
+        return f"Other (Step {i + 1}) by {agent}"
+
+
+def _render_enriched_task(step_title: str, labels: list, outputs: list, prompt: str) -> str:
     # Construir contexto enriquecido estructurado
     context = f"User Prompt:\n{prompt}\n\nHistory so far:\n"
-    for i, (desc, agent, output) in enumerate(history):
-        if "draft" in desc.lower() or agent == "writer_agent":
-            context += f"\nDraft (Step {i + 1}):\n{output.strip()}\n"
-        elif "feedback" in desc.lower() or agent == "editor_agent":
-            context += f"\nFeedback (Step {i + 1}):\n{output.strip()}\n"
-        elif "research" in desc.lower() or agent == "research_agent":
-            context += f"\nResearch (Step {i + 1}):\n{output.strip()}\n"
-        else:
-            context += f"\nOther (Step {i + 1}) by {agent}:\n{output.strip()}\n"
+    for label, output in zip(labels, outputs):
+        context += f"\n{label}:\n{output}\n"
 
-    enriched_task = f"""{context}
+    return f"""{context}
 
 Your next task:
 {step_title}
 """
 
-    # Select agent based on step
+
+def _build_enriched_task(step_title: str, history: list, prompt: str) -> str:
+    """
+    Build the prompt for the next step from the user prompt and the earlier
+    steps' outputs, compacting older outputs to stay within the context token budget.
+    """
+    labels = [_history_label(i, desc, agent) for i, (desc, agent, _) in enumerate(history)]
+    outputs = [output.strip() for _, _, output in history]
+    reserved = count_tokens(_render_enriched_task(step_title, labels, [""] * len(outputs), prompt))
+    compacted, report = compact_history(outputs, reserved)
+    task = _render_enriched_task(step_title, labels, compacted, prompt)
+    if report["steps_compacted"]:
+        saved = report["tokens_before"] - report["tokens_after"]
+        print(
+            f"Context: step {len(history) + 1} history {report['tokens_before']} -> {report['tokens_after']} tokens "
+            f"({saved} saved, {report['steps_compacted']} older steps compacted)"
+        )
+    return task
+
+
+def _select_agent(step_title: str, history: list) -> str:
+    """Pick the agent for a step from keywords in its title"""
     step_lower = step_title.lower()
     if "research" in step_lower:
-        content, _ = research_agent(prompt=enriched_task)
-        print("Research Agent Output:", content)
-        return step_title, "research_agent", content
+        return "research_agent"
     elif "analysis agent" in step_lower or "analyze" in step_lower or "synthesize" in step_lower or "organize" in step_lower or "filter" in step_lower or "rank" in step_lower:
-        from src.agents import analysis_agent
-        content, _ = analysis_agent(prompt=enriched_task)
-        print("Analysis Agent Output:", content)
-        return step_title, "analysis_agent", content
+        return "analysis_agent"
     elif "draft" in step_lower or "write" in step_lower:
         # Check if this should use parallel processing
         if "parallel" in step_lower or "concurrent" in step_lower or len(history) > 2:
             # Use parallel writer for complex topics or when explicitly requested
-            content, _ = parallel_writer_agent(prompt=enriched_task, advanced_options=advanced_options)
-            return step_title, "parallel_writer_agent", content
+            return "parallel_writer_agent"
         else:
-            content, _ = writer_agent(prompt=enriched_task, advanced_options=advanced_options)
-            return step_title, "writer_agent", content
+            return "writer_agent"
     elif "revise" in step_lower or "edit" in step_lower or "feedback" in step_lower:
-        content, _ = editor_agent(prompt=enriched_task)
-        return step_title, "editor_agent", content
+        return "editor_agent"
     else:
         raise ValueError(f"Unknown step type: {step_title}")
+
+
+def executor_agent_step(step_title: str, history: list, prompt: str, advanced_options: dict = None):
+    """
+    Executes a step of the executor agent.
+    Returns:
+        - step_title (str)
+        - agent_name (str)
+        - output (str)
+    """
+    enriched_task = _build_enriched_task(step_title, history, prompt)
+
+    # Select agent based on step
+    agent_name = _select_agent(step_title, history)
+    if agent_name == "research_agent":
+        content, _ = research_agent(prompt=enriched_task)
+        print("Research Agent Output:", content)
+    elif agent_name == "analysis_agent":
+        from src.agents import analysis_agent
+        content, _ = analysis_agent(prompt=enriched_task)
+        print("Analysis Agent Output:", content)
+    elif agent_name == "parallel_writer_agent":
+        content, _ = parallel_writer_agent(prompt=enriched_task, advanced_options=advanced_options)
+    elif agent_name == "writer_agent":
+        content, _ = writer_agent(prompt=enriched_task, advanced_options=advanced_options)
+    else:
+        content, _ = editor_agent(prompt=enriched_task)
+    return step_title, agent_name, content
+
+
+async def executor_agent_step_async(step_title: str, history: list, prompt: str, advanced_options: dict = None):
+    """Asyncio version of executor_agent_step, for the workflow running on the server's event loop"""
+    enriched_task = _build_enriched_task(step_title, history, prompt)
+
+    agent_name = _select_agent(step_title, history)
+    if agent_name == "research_agent":
+        content, _ = await research_agent_async(prompt=enriched_task)
+        print("Research Agent Output:", content)
+    elif agent_name == "analysis_agent":
+        content, _ = await analysis_agent_async(prompt=enriched_task)
+        print("Analysis Agent Output:", content)
+    elif agent_name == "parallel_writer_agent":
+        content, _ = await parallel_writer_agent_async(prompt=enriched_task, advanced_options=advanced_options)
+    elif agent_name == "writer_agent":
+        content, _ = await writer_agent_async(prompt=enriched_task, advanced_options=advanced_options)
+    else:
+        content, _ = await editor_agent_async(prompt=enriched_task)
+    return step_title, agent_name, content
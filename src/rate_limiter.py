@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+import os
+import asyncio
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+
+class RateLimitTimeout(TimeoutError):
+    pass
+
+
+class _BucketWaits:
+    """Blocking and asyncio waits on top of a non-blocking `_try_take`."""
+
+    def acquire(self, key: str, rate: float, capacity: float = 1.0, timeout: Optional[float] = None) -> float:
+        """
+        Block until a token for `key` is available.
+
+        Args:
+            rate: tokens added per second.
+            capacity: maximum burst size.
+            timeout: give up after this many seconds (None waits forever).
+
+        Returns:
+            Seconds spent waiting.
+        """
+        started = time.monotonic()
+        while True:
+            wait = self._try_take(key, rate, capacity)
+            if wait <= 0:
+                return time.monotonic() - started
+            if timeout is not None and time.monotonic() - started + wait > timeout:
+                raise RateLimitTimeout(f"Rate limit for {key} not available within {timeout}s")
+            time.sleep(wait)
+
+    async def acquire_async(
+        self, key: str, rate: float, capacity: float = 1.0, timeout: Optional[float] = None
+    ) -> float:
+        """Same as `acquire`, but yields to the event loop while waiting."""
+        started = time.monotonic()
+        while True:
+            # The SQLite store may wait on its lock, so never take from the event loop
+            wait = await asyncio.to_thread(self._try_take, key, rate, capacity)
+            if wait <= 0:
+                return time.monotonic() - started
+            if timeout is not None and time.monotonic() - started + wait > timeout:
+                raise RateLimitTimeout(f"Rate limit for {key} not available within {timeout}s")
+            await asyncio.sleep(wait)
+
+
+class TokenBucketLimiter(_BucketWaits):
+    """
+    Token buckets stored in a local SQLite file, so every thread and every
+    uvicorn worker on the host draws from the same budget. Buckets are refilled
+    lazily from wall-clock time on each acquire.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or os.getenv("RATE_LIMIT_DB_PATH", "./.cache/rate_limits.db")
+        self._local = threading.local()
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn().execute(
+            """
+            CREATE TABLE IF NOT EXISTS buckets (
+                key TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _try_take(self, key: str, rate: float, capacity: float) -> float:
+        """Take one token if available. Returns 0 on success, else seconds until one is."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = conn.execute("SELECT tokens, updated_at FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens = capacity if row is None else min(capacity, row[0] + max(0.0, now - row[1]) * rate)
+            if tokens >= 1.0:
+                tokens -= 1.0
+                wait = 0.0
+            else:
+                wait = (1.0 - tokens) / rate
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets(key, tokens, updated_at) VALUES (?, ?, ?)",
+                (key, tokens, now),
+            )
+            conn.execute("COMMIT")
+            return wait
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
+class _LocalTokenBucketLimiter(_BucketWaits):
+    """In-process fallback used when the SQLite store can't be opened."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+
+    def _try_take(self, key: str, rate: float, capacity: float) -> float:
+        with self._lock:
+            now = time.monotonic()
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if tokens >= 1.0:
+                self._buckets[key] = (tokens - 1.0, now)
+                return 0.0
+            self._buckets[key] = (tokens, now)
+            return (1.0 - tokens) / rate
+
+
+# Global instance
+rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """Get the global shared rate limiter (falls back to a per-process one)"""
+    global rate_limiter
+    with _rate_limiter_lock:
+        if rate_limiter is None:
+            try:
+                rate_limiter = TokenBucketLimiter()
+            except Exception as e:
+                print(f"Failed to open shared rate limiter, using per-process buckets: {e}")
+                rate_limiter = _LocalTokenBucketLimiter()
+    return rate_limiter
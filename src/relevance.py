@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+import os
+import re
+import math
+import threading
+from collections import Counter
+from typing import Dict, List, Tuple
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+RANK_RESULTS = os.getenv("RANK_RESULTS", "true").lower() == "true"
+RESULT_TOP_K = int(os.getenv("RESULT_TOP_K", "8"))
+RESULT_CHAR_BUDGET = int(os.getenv("RESULT_CHAR_BUDGET", "30000"))
+# A result that would overflow the budget is cut down instead, if at least this much fits
+_MIN_TRUNCATED_CHARS = 300
+_ELLIPSIS = "..."
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    """a about above after again against all am an and any are as at be because been before being
+    below between both but by can could did do does doing down during each few for from further had
+    has have having he her here hers him his how i if in into is it its itself just me more most my
+    no nor not now of off on once only or other our ours out over own same she should so some such
+    than that the their theirs them then there these they this those through to too under until up
+    very was we were what when where which while who whom why will with would you your yours""".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall(text.lower()) if len(t) > 1 and t not in _STOPWORDS]
+
+
+class BM25:
+    """Okapi BM25 over an in-memory list of documents."""
+
+    def __init__(self, documents: List[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.docs = [Counter(tokenize(d)) for d in documents]
+        self.lengths = [sum(d.values()) for d in self.docs]
+        self.avgdl = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        df = Counter(term for d in self.docs for term in d)
+        n = len(self.docs)
+        self.idf = {term: math.log(1 + (n - f + 0.5) / (f + 0.5)) for term, f in df.items()}
+
+    def scores(self, query: str) -> List[float]:
+        terms = set(tokenize(query))
+        out = []
+        for doc, length in zip(self.docs, self.lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / self.avgdl) if self.avgdl else self.k1
+            score = 0.0
+            for term in terms:
+                tf = doc.get(term)
+                if tf:
+                    score += self.idf[term] * tf * (self.k1 + 1) / (tf + norm)
+            out.append(score)
+        return out
+
+
+def _result_document(item: Dict) -> str:
+    title = item.get("title") or ""
+    authors = " ".join(item.get("authors") or [])
+    # Title twice: it is the densest description of what the source is about
+    return f"{title} {title} {authors} {item.get('content') or ''} {item.get('summary') or ''}"
+
+
+def _result_chars(item: Dict) -> int:
+    return sum(len(str(v)) for v in item.values())
+
+
+def _truncate(item: Dict, max_chars: int) -> Dict:
+    """Shorten the longest text field so the whole item fits in `max_chars`."""
+    field = max(("content", "summary"), key=lambda f: len(item.get(f) or ""))
+    overflow = _result_chars(item) - max_chars
+    if overflow <= 0:
+        return item
+    # Room for the ellipsis marking the cut
+    excess = overflow + len(_ELLIPSIS)
+    text = item.get(field) or ""
+    if excess >= len(text):
+        return item
+    return {**item, field: text[: len(text) - excess].rstrip() + _ELLIPSIS}
+
+
+# Totals since process start, for /cache_stats
+_stats_lock = threading.Lock()
+_stats = {"items_in": 0, "items_kept": 0, "chars_in": 0, "chars_kept": 0}
+
+
+def rank_tool_results(tool_results: List[Dict], prompt: str, top_k: int = None, char_budget: int = None) -> Tuple[List[Dict], Dict]:
+    """
+    Score every result of a research step against the user prompt plus the
+    tool call's own query with BM25, sort each tool's results by score, keep
+    the top `top_k` per call, then admit results in overall score order
+    until `char_budget` characters are used.
+
+    Error entries, image entries and non-list results pass through untouched.
+    Returns the pruned tool results and a report.
+    """
+    top_k = RESULT_TOP_K if top_k is None else top_k
+    char_budget = RESULT_CHAR_BUDGET if char_budget is None else char_budget
+    report = {"items_in": 0, "items_kept": 0, "chars_in": 0, "chars_kept": 0}
+    if not RANK_RESULTS:
+        return tool_results, report
+
+    candidates = []  # (tool index, item index, item)
+    for t, tr in enumerate(tool_results):
+        if isinstance(tr.get("result"), list):
+            for i, item in enumerate(tr["result"]):
+                if isinstance(item, dict) and "error" not in item and "image_url" not in item:
+                    candidates.append((t, i, item))
+    if not candidates:
+        return tool_results, report
+
+    bm25 = BM25([_result_document(item) for _, _, item in candidates])
+    scores_by_query = {}
+    scored = []  # (score, tool index, item index, item)
+    for n, (t, i, item) in enumerate(candidates):
+        args = tool_results[t].get("args")
+        query = f"{prompt} {args.get('query', '') if isinstance(args, dict) else ''}"
+        if query not in scores_by_query:
+            scores_by_query[query] = bm25.scores(query)
+        scored.append((scores_by_query[query][n], t, i, item))
+
+    # Top-k per tool call
+    per_tool: Dict[int, List[tuple]] = {}
+    for entry in sorted(scored, key=lambda s: (-s[0], s[1], s[2])):
+        per_tool.setdefault(entry[1], []).append(entry)
+    shortlisted = [e for entries in per_tool.values() for e in entries[:top_k]]
+
+    # Character budget across all tools, best first
+    kept: Dict[Tuple[int, int], Dict] = {}
+    remaining = char_budget
+    for score, t, i, item in sorted(shortlisted, key=lambda s: (-s[0], s[1], s[2])):
+        size = _result_chars(item)
+        if size > remaining:
+            if remaining < _MIN_TRUNCATED_CHARS:
+                continue
+            item = _truncate(item, remaining)
+            size = _result_chars(item)
+            if size > remaining:
+                continue
+        kept[(t, i)] = item
+        remaining -= size
+
+    report["items_in"] = len(candidates)
+    report["items_kept"] = len(kept)
+    report["chars_in"] = sum(_result_chars(item) for _, _, item in candidates)
+    report["chars_kept"] = char_budget - remaining
+    with _stats_lock:
+        for name in _stats:
+            _stats[name] += report[name]
+
+    ranked = []
+    for t, tr in enumerate(tool_results):
+        if isinstance(tr.get("result"), list):
+            order = [(t, i) for _, tt, i, _ in sorted(scored, key=lambda s: (-s[0], s[2])) if tt == t]
+            passthrough = [
+                item for i, item in enumerate(tr["result"])
+                if not (isinstance(item, dict) and "error" not in item and "image_url" not in item)
+            ]
+            tr = {**tr, "result": [kept[key] for key in order if key in kept] + passthrough}
+        ranked.append(tr)
+    return ranked, report
+
+
+def ranking_stats() -> Dict:
+    with _stats_lock:
+        return dict(_stats)
@@ -92,12 +92,9 @@ def _safe_filename(name: str) -> str:
     return name
 
 
-def clean_text(s: str) -> str:
-    s = re.sub(r"-\n", "", s)  # "transfor-\nmers" -> "transformers"
-    s = re.sub(r"\r\n|\r", "\n", s)  # normalize line breaks
-    s = re.sub(r"[ \t]+", " ", s)  # collapse spaces
-    s = re.sub(r"\n{3,}", "\n\n", s)  # no more than 1 blank line in a row
-    return s.strip()
+# Text extraction lives in src/pdf_text.py so extraction worker processes can
+# load it without this module's network clients
+from src.pdf_text import clean_text, extract_text_pdfminer, extract_text_pymupdf, pdf_bytes_to_text
 
 
 def fetch_pdf_bytes(pdf_url: str, timeout: int = 90) -> bytes:
@@ -106,31 +103,101 @@ def fetch_pdf_bytes(pdf_url: str, timeout: int = 90) -> bytes:
     return r.content
 
 
-def pdf_bytes_to_text(pdf_bytes: bytes, max_pages: Optional[int] = None) -> str:
-    # 1) PyMuPDF
-    try:
-        import fitz  # PyMuPDF
+# ----- Streaming downloads -----
+class PdfTooLargeError(ValueError):
+    pass
 
-        out = []
-        with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
-            n = len(doc)
-            limit = n if max_pages is None else min(max_pages, n)
-            for i in range(limit):
-                out.append(doc.load_page(i).get_text("text"))
-        return "\n".join(out)
-    except Exception:
-        pass
-
-    # 2) pdfminer.six
-    try:
-        from pdfminer.high_level import extract_text_to_fp
 
-        buf_in = BytesIO(pdf_bytes)
-        buf_out = BytesIO()
-        extract_text_to_fp(buf_in, buf_out)
-        return buf_out.getvalue().decode("utf-8", errors="ignore")
-    except Exception as e:
-        raise RuntimeError(f"PDF text extraction failed: {e}")
+class SpooledPdf:
+    """
+    Download buffer for a PDF. Small files stay in memory; once `spool_bytes` is
+    exceeded the data rolls over to a named temp file, so extraction can open
+    it by path (PyMuPDF) or memory-map it (pdfminer) instead of holding bytes.
+    """
+
+    def __init__(self, spool_bytes: Optional[int] = None):
+        self.spool_bytes = spool_bytes or int(os.getenv("ARXIV_PDF_SPOOL_KB", "1024")) * 1024
+        self.size = 0
+        self.path: Optional[str] = None
+        self._mem: Optional[BytesIO] = BytesIO()
+        self._file = None
+
+    def write(self, chunk: bytes) -> None:
+        self.size += len(chunk)
+        if self._mem is not None and self.size > self.spool_bytes:
+            self._file = tempfile.NamedTemporaryFile(prefix="arxiv-", suffix=".pdf", delete=False)
+            self.path = self._file.name
+            self._file.write(self._mem.getbuffer())
+            self._mem = None
+        (self._file or self._mem).write(chunk)
+
+    def finish(self) -> None:
+        """Flush and release the write handle; the data stays readable via `source()`."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def source(self):
+        """The PDF as a path on disk, or as bytes if it never left memory."""
+        return self.path if self.path else self._mem.getvalue()
+
+    def close(self) -> None:
+        self.finish()
+        self._mem = None
+        if self.path:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            self.path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _pdf_max_bytes(max_bytes: Optional[int]) -> int:
+    return max_bytes or int(os.getenv("ARXIV_PDF_MAX_MB", "50")) * 1024 * 1024
+
+
+def _pdf_buffer(headers, max_bytes: int) -> SpooledPdf:
+    """A buffer for a PDF download, once its announced size has been checked against `max_bytes`."""
+    length = int(headers.get("Content-Length") or 0)
+    if length > max_bytes:
+        raise PdfTooLargeError(f"PDF is {length} bytes, limit is {max_bytes}")
+    return SpooledPdf()
+
+
+def _buffer_chunk(buf: SpooledPdf, chunk: bytes, max_bytes: int) -> None:
+    buf.write(chunk)
+    if buf.size > max_bytes:
+        raise PdfTooLargeError(f"PDF exceeds {max_bytes} bytes")
+
+
+def fetch_pdf_to_buffer(
+    pdf_url: str, timeout: int = 90, max_bytes: Optional[int] = None
+) -> SpooledPdf:
+    """
+    Stream a PDF into a SpooledPdf, aborting as soon as it is known to exceed
+    `max_bytes` (from Content-Length, or while reading). The caller must close it.
+    """
+    max_bytes = _pdf_max_bytes(max_bytes)
+    r = session.get(pdf_url, timeout=timeout, allow_redirects=True, stream=True)
+    try:
+        r.raise_for_status()
+        buf = _pdf_buffer(r.headers, max_bytes)
+        try:
+            for chunk in r.iter_content(chunk_size=64 * 1024):
+                _buffer_chunk(buf, chunk, max_bytes)
+            buf.finish()
+        except Exception:
+            buf.close()
+            raise
+        return buf
+    finally:
+        r.close()
 
 
 def maybe_save_pdf(pdf_bytes: bytes, dest_dir: str, filename: str) -> str:
@@ -145,104 +212,509 @@ def maybe_save_pdf(pdf_bytes: bytes, dest_dir: str, filename: str) -> str:
 from typing import List, Dict
 import time, requests, xml.etree.ElementTree as ET
 from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from src.text_cache import arxiv_cache_key, arxiv_id, get_text_cache
+from src.paper_index import get_paper_index
+from src.pdf_extraction import get_extraction_service
+from src.rate_limiter import get_rate_limiter
+from urllib.parse import urlparse
 
 # session = _build_session()
 # ensure_pdf_url(), clean_text(), fetch_pdf_bytes(), pdf_bytes_to_text(), maybe_save_pdf()
 
 
+def _arxiv_bucket(url: str) -> Optional[tuple]:
+    """(bucket key, requests per second) for the arXiv host behind `url`, or None."""
+    host = urlparse(url).netloc.lower()
+    if host == "export.arxiv.org":
+        # arXiv API terms: no more than one request every three seconds
+        return "arxiv-api", float(os.getenv("ARXIV_API_RATE", "0.34"))
+    if host.endswith("arxiv.org"):
+        return "arxiv-pdf", float(os.getenv("ARXIV_PDF_RATE", "1.0"))
+    return None
+
+
+def _wait_for_arxiv(url: str) -> None:
+    """
+    Wait on the shared token bucket for the arXiv host behind `url`. The buckets
+    live in a local SQLite file, so all threads and uvicorn workers share them.
+    """
+    bucket = _arxiv_bucket(url)
+    if bucket:
+        get_rate_limiter().acquire(bucket[0], rate=bucket[1])
+
+
+ARXIV_API_URL = "https://export.arxiv.org/api/query"
+# Results (or ids) per API request; larger searches and id lists are paged
+ARXIV_PAGE_SIZE = int(os.getenv("ARXIV_PAGE_SIZE", "50"))
+
+_ATOM = "{http://www.w3.org/2005/Atom}"
+_OPENSEARCH = "{http://a9.com/-/spec/opensearch/1.1/}"
+
+
+def _arxiv_api_url(query: str, max_results: int, start: int = 0, id_list: Optional[List[str]] = None) -> str:
+    params = []
+    if query:
+        params.append(f"search_query=all:{requests.utils.quote(query)}")
+    if id_list:
+        params.append(f"id_list={','.join(id_list)}")
+    params.append(f"start={start}&max_results={max_results}")
+    return f"{ARXIV_API_URL}?{'&'.join(params)}"
+
+
+def _arxiv_pages(query: str, max_results: int, id_list: Optional[List[str]] = None):
+    """
+    Yield (url, page size, is search) for each API request a query needs:
+    searches are paged with `start`, id lists are sent in chunks.
+    """
+    if id_list:
+        for i in range(0, len(id_list), ARXIV_PAGE_SIZE):
+            chunk = id_list[i : i + ARXIV_PAGE_SIZE]
+            yield _arxiv_api_url("", len(chunk), id_list=chunk), len(chunk), False
+        return
+    for start in range(0, max_results, ARXIV_PAGE_SIZE):
+        size = min(ARXIV_PAGE_SIZE, max_results - start)
+        yield _arxiv_api_url(query, size, start=start), size, True
+
+
+def _arxiv_ids(id_list) -> List[str]:
+    """Bare arXiv ids (no version) from a list, or comma-separated string, of ids or arXiv URLs."""
+    if isinstance(id_list, str):
+        id_list = id_list.split(",")
+    ids = []
+    for raw in id_list or []:
+        raw = str(raw).strip()
+        parsed = arxiv_id(raw if "arxiv.org" in raw.lower() else f"arxiv.org/abs/{raw}")
+        if parsed and parsed[0] not in ids:
+            ids.append(parsed[0])
+    return ids
+
+
+def _paper_id(item: Dict) -> Optional[str]:
+    parsed = arxiv_id(item.get("url"))
+    return parsed[0] if parsed else item.get("url")
+
+
+def _parse_arxiv_entry(entry: ET.Element) -> Dict:
+    """Turn one Atom <entry> into a result dict (summary = original abstract)."""
+    ns = {"atom": "http://www.w3.org/2005/Atom"}
+    title = (
+        entry.findtext("atom:title", default="", namespaces=ns) or ""
+    ).strip()
+    published = (
+        entry.findtext("atom:published", default="", namespaces=ns) or ""
+    )[:10]
+    url_abs = entry.findtext("atom:id", default="", namespaces=ns) or ""
+    # original abstract
+    abstract_summary = (
+        entry.findtext("atom:summary", default="", namespaces=ns) or ""
+    ).strip()
+
+    # The API reports bad requests (e.g. a malformed id) as a feed entry
+    if "/api/errors" in url_abs:
+        return {"error": f"arXiv API error: {abstract_summary or title}"}
+
+    authors = []
+    for a in entry.findall("atom:author", ns):
+        nm = a.findtext("atom:name", default="", namespaces=ns)
+        if nm:
+            authors.append(nm)
+
+    link_pdf = None
+    for link in entry.findall("atom:link", ns):
+        if link.attrib.get("title") == "pdf":
+            link_pdf = link.attrib.get("href")
+            break
+    if not link_pdf and url_abs:
+        link_pdf = ensure_pdf_url(url_abs)
+
+    return {
+        "title": title,
+        "authors": authors,
+        "published": published,
+        "url": url_abs,
+        "summary": abstract_summary,
+        "link_pdf": link_pdf,
+    }
+
+
+class ArxivFeedParser:
+    """
+    Incremental arXiv Atom parser: feed it bytes as they arrive and it returns
+    each <entry> as soon as it is complete, then drops it from the tree, so a
+    large page never has to be held (or parsed) in one piece.
+    """
+
+    def __init__(self):
+        self._parser = ET.XMLPullParser(events=("end",))
+        self.total: Optional[int] = None  # opensearch:totalResults
+        self.entries = 0
+
+    def feed(self, data: bytes) -> List[Dict]:
+        self._parser.feed(data)
+        return self._drain()
+
+    def close(self) -> List[Dict]:
+        self._parser.close()
+        return self._drain()
+
+    def _drain(self) -> List[Dict]:
+        out = []
+        for _, elem in self._parser.read_events():
+            if elem.tag == f"{_ATOM}entry":
+                out.append(_parse_arxiv_entry(elem))
+                self.entries += 1
+                elem.clear()
+            elif elem.tag == f"{_OPENSEARCH}totalResults":
+                self.total = int((elem.text or "0").strip() or 0)
+        return out
+
+
+def _last_page(parser: ArxivFeedParser, got: int, size: int) -> bool:
+    return parser.entries < size or (parser.total is not None and got >= parser.total)
+
+
+def _keep_partial_feed(out: List[Dict], error: Exception) -> None:
+    """A page of a search failed: keep the pages already read, or re-raise if there are none."""
+    if not out:
+        raise error
+    print(f"arXiv API page failed, keeping {len(out)} results: {error}")
+
+
+def _skip_id_chunk(failures: List[Exception], error: Exception) -> None:
+    """A chunk of an id list failed; the other chunks don't depend on it, so carry on without it."""
+    print(f"arXiv API id chunk failed, skipping it: {error}")
+    failures.append(error)
+
+
+def _raise_if_every_chunk_failed(failures: List[Exception], pages: int) -> None:
+    if failures and len(failures) == pages:
+        raise failures[0]
+
+
+def _fetch_arxiv_feed(query: str, max_results: int, id_list: Optional[List[str]] = None) -> List[Dict]:
+    """
+    Run an arXiv API query page by page, parsing each response while it
+    streams in. If a later search page fails, the pages already read are
+    returned; a failed id-list chunk is skipped and the other chunks are
+    still fetched.
+    """
+    out: List[Dict] = []
+    failures: List[Exception] = []
+    pages = 0
+    for url, size, is_search in _arxiv_pages(query, max_results, id_list):
+        pages += 1
+        parser = ArxivFeedParser()
+        try:
+            _wait_for_arxiv(url)
+            r = session.get(url, timeout=60, stream=True)
+            try:
+                r.raise_for_status()
+                for chunk in r.iter_content(chunk_size=64 * 1024):
+                    out.extend(parser.feed(chunk))
+                out.extend(parser.close())
+            finally:
+                r.close()
+        except requests.exceptions.RequestException as e:
+            if not is_search:
+                _skip_id_chunk(failures, e)
+                continue
+            _keep_partial_feed(out, e)
+            break
+        if is_search and _last_page(parser, len(out), size):
+            break
+    _raise_if_every_chunk_failed(failures, pages)
+    return out
+
+
+def _pdf_cache_key(item: Dict, max_pages: int, max_chars: Optional[int]) -> Optional[str]:
+    key = arxiv_cache_key(item.get("url"), item.get("link_pdf"))
+    return f"{key}|pages={max_pages}|chars={max_chars}" if key else None
+
+
+def _apply_pdf_text(item: Dict, text: str, save_full_text: bool, text_chars: int) -> None:
+    if text:
+        item["summary"] = text if save_full_text else text[:text_chars]
+
+
+def _extract_pdf_text(
+    pdf: SpooledPdf, max_pages: int, max_chars: Optional[int], cache_key: Optional[str] = None
+) -> str:
+    """Extract and clean text from a downloaded PDF, cache it, and release the buffer."""
+    with pdf:
+        started = time.perf_counter()
+        extraction_service = get_extraction_service()
+        if extraction_service is not None:
+            text = extraction_service.extract(pdf.source(), max_pages=max_pages, max_chars=max_chars)
+        else:
+            text = pdf_bytes_to_text(pdf.source(), max_pages=max_pages, max_chars=max_chars)
+        text = clean_text(text) if text else ""
+        cache = get_text_cache()
+        if cache is not None and text and cache_key:
+            cache.put(
+                cache_key,
+                text,
+                pdf_bytes=pdf.size,
+                extract_seconds=time.perf_counter() - started,
+            )
+        return text
+
+
+def _serve_cached_pdf_text(
+    cache, item: Dict, max_pages: int, max_chars: Optional[int], save_full_text: bool, text_chars: int
+) -> tuple:
+    """Fill in `item` from the text cache if its PDF text is there. Returns (served, cache key)."""
+    key = _pdf_cache_key(item, max_pages, max_chars)
+    if not key:
+        return False, None
+    cached = cache.get(key)
+    if cached is None:
+        return False, key
+    _apply_pdf_text(item, cached, save_full_text, text_chars)
+    return True, key
+
+
+def _fetch_and_extract_pdfs(
+    items: List[Dict],
+    extract: bool,
+    max_pages: int,
+    text_chars: int,
+    save_full_text: bool,
+    fetch_workers: int,
+    extract_workers: int,
+) -> None:
+    """
+    Download PDFs with a bounded pool of fetchers and hand each one to a pool of
+    extractors as soon as it arrives. Results are written back into `items`
+    in place, so the caller's ordering is preserved. Text already in the
+    on-disk cache is served from there without touching the network.
+    """
+    cache = get_text_cache() if extract else None
+    max_chars = None if save_full_text else text_chars
+    cache_keys: Dict[int, str] = {}
+
+    def _fetch(link_pdf: str) -> SpooledPdf:
+        _wait_for_arxiv(link_pdf)
+        return fetch_pdf_to_buffer(link_pdf, timeout=90)
+
+    pending = []
+    for idx, item in enumerate(items):
+        if not item.get("link_pdf"):
+            continue
+        if cache is not None:
+            served, key = _serve_cached_pdf_text(cache, item, max_pages, max_chars, save_full_text, text_chars)
+            if served:
+                continue
+            if key:
+                cache_keys[idx] = key
+        pending.append(idx)
+
+    with ThreadPoolExecutor(
+        max_workers=fetch_workers, thread_name_prefix="arxiv-fetch"
+    ) as fetch_pool, ThreadPoolExecutor(
+        max_workers=extract_workers, thread_name_prefix="arxiv-extract"
+    ) as extract_pool:
+        fetch_futures = {
+            fetch_pool.submit(_fetch, items[idx]["link_pdf"]): idx for idx in pending
+        }
+
+        extract_futures = {}
+        for fut in as_completed(fetch_futures):
+            idx = fetch_futures[fut]
+            try:
+                pdf = fut.result()
+            except Exception as e:
+                items[idx]["pdf_error"] = f"PDF fetch failed: {e}"
+                continue
+            if extract and pdf.size:
+                future = extract_pool.submit(
+                    _extract_pdf_text, pdf, max_pages, max_chars, cache_keys.get(idx)
+                )
+                extract_futures[future] = idx
+            else:
+                pdf.close()
+
+        for fut in as_completed(extract_futures):
+            idx = extract_futures[fut]
+            try:
+                _apply_pdf_text(items[idx], fut.result(), save_full_text, text_chars)
+            except Exception as e:
+                items[idx]["text_error"] = f"Text extraction failed: {e}"
+
+
+def _index_lookup(query: str, max_results: int, ids: Optional[List[str]] = None) -> tuple:
+    """
+    Papers for `query` (or for the arXiv `ids`) from the local paper index, and
+    whether they cover the whole request (so the arXiv API need not be asked at all).
+    """
+    index = get_paper_index()
+    if index is None:
+        return [], False
+    if ids:
+        found = index.papers(ids)
+        papers = [found[i] for i in ids if i in found]
+        if len(papers) == len(ids):
+            index.count(queries_local=1, papers_served=len(papers))
+            return papers, True
+        return papers, False
+    papers = index.lookup_query(normalize_query(query), max_results)
+    if papers is not None:
+        return papers, True
+    papers = index.search(query, max_results)
+    if len(papers) >= max_results:
+        index.count(queries_local=1, papers_served=len(papers))
+        return papers, True
+    return papers, False
+
+
+def _arxiv_request(query: str, max_results: int, id_list) -> tuple:
+    """
+    Validate a search or id_list lookup. Returns (query, max_results, ids, error):
+    ids is None for searches; for lookups query is dropped and max_results is the id count.
+    """
+    if id_list:
+        ids = _arxiv_ids(id_list)
+        if not ids:
+            return query, max_results, None, "id_list contains no valid arXiv ids"
+        return "", len(ids), ids, None
+    if not (query or "").strip():
+        return query, max_results, None, "arxiv_search_tool needs a query or an id_list"
+    return query, max_results, None, None
+
+
+def _in_id_order(items: List[Dict], ids: Optional[List[str]]) -> List[Dict]:
+    if not ids:
+        return items
+    position = {i: n for n, i in enumerate(ids)}
+    return sorted(items, key=lambda item: position.get(_paper_id(item), len(ids)))
+
+
+def _index_shortfall(local: List[Dict], fetched: List[Dict], max_results: int) -> tuple:
+    """Fill up `local` with fetched results it doesn't already have; returns (all results, new results)."""
+    have = {_paper_id(item) for item in local}
+    new = [item for item in fetched if _paper_id(item) not in have]
+    new = new[: max(max_results - len(local), 0)]
+    return local + new, new
+
+
+def _index_store(query: str, out: List[Dict], local: List[Dict], new: List[Dict],
+                 abstracts: List[str], max_results: int, exhausted: bool) -> None:
+    """Index the newly fetched papers whose text was extracted, and remember what the query returned."""
+    index = get_paper_index()
+    if index is None:
+        return
+    indexed = len(local)
+    for item, abstract in zip(new, abstracts):
+        if "pdf_error" in item or "text_error" in item or item.get("summary") == abstract:
+            continue
+        if index.add(item, abstract):
+            indexed += 1
+    index.count(
+        queries_partial=1 if local else 0,
+        queries_network=0 if local else 1,
+        papers_served=len(local),
+    )
+    # Only answer this query locally next time if every paper it returned is indexed
+    if query and indexed == len(out):
+        index.remember_query(normalize_query(query), out, max_results, exhausted)
+    if local:
+        print(f"arXiv: {len(local)} papers for '{query or 'id_list'}' from the local index, {len(new)} fetched")
+
+
+def _arxiv_prepare(query: str, max_results: int, id_list) -> tuple:
+    """
+    Validate a request and look it up in the local paper index. Returns
+    (request, result): `result` is the answer when the network isn't needed
+    (an error, or the index has everything), else None and `request` says
+    what to fetch.
+    """
+    query, max_results, ids, error = _arxiv_request(query, max_results, id_list)
+    if error:
+        return None, [{"error": error}]
+
+    local, complete = _index_lookup(query, max_results, ids)
+    if complete:
+        print(f"arXiv: {len(local)} papers for '{query or 'id_list'}' served from the local index")
+        return None, local
+    missing = [i for i in ids if i not in {_paper_id(item) for item in local}] if ids else None
+    return {"query": query, "max_results": max_results, "ids": ids, "missing": missing, "local": local}, None
+
+
+def _arxiv_fetch_failed(request: Dict, e: Exception) -> List[Dict]:
+    if request["local"]:
+        print(f"arXiv API request failed, serving {len(request['local'])} papers from the local index: {e}")
+        return request["local"]
+    return [{"error": f"arXiv API request failed: {e}"}]
+
+
+def _arxiv_new_papers(request: Dict, fetched: List[Dict]) -> tuple:
+    """(all results, newly fetched results, their abstracts before PDF text replaces them)"""
+    out, new = _index_shortfall(request["local"], fetched, request["max_results"])
+    return out, new, [item.get("summary") for item in new]
+
+
+def _arxiv_finish(request: Dict, fetched: List[Dict], out: List[Dict], new: List[Dict], abstracts: List[str]) -> List[Dict]:
+    _index_store(
+        request["query"], out, request["local"], new, abstracts, request["max_results"],
+        exhausted=len(fetched) < request["max_results"],
+    )
+    return _in_id_order(out, request["ids"])
+
+
+# ===== INTERNAL FLAGS =====
+_INCLUDE_PDF = True
+_EXTRACT_TEXT = True
+_MAX_PAGES = 6
+_TEXT_CHARS = 5000
+_SAVE_FULL_TEXT = False
+_FETCH_WORKERS = 4
+_EXTRACT_WORKERS = 2
+# ==========================
+
+
+def _pdf_options() -> Dict:
+    return {
+        "extract": _EXTRACT_TEXT,
+        "max_pages": _MAX_PAGES,
+        "text_chars": _TEXT_CHARS,
+        "save_full_text": _SAVE_FULL_TEXT,
+        "fetch_workers": _FETCH_WORKERS,
+        "extract_workers": _EXTRACT_WORKERS,
+    }
+
+
 def arxiv_search_tool(
-    query: str,
+    query: str = "",
     max_results: int = 20,
+    id_list: Optional[List[str]] = None,
 ) -> List[Dict]:
     """
     Search arXiv and return results with `summary` overwritten
     to contain the extracted PDF text (full_text if possible).
+
+    With `id_list` (arXiv ids or URLs) the papers are looked up directly,
+    ARXIV_PAGE_SIZE ids per request, and returned in that order; `query`
+    and `max_results` are then ignored.
+
+    Papers already in the local paper index are served from there; the
+    network is only used for the shortfall.
     """
-    # ===== INTERNAL FLAGS =====
-    _INCLUDE_PDF = True
-    _EXTRACT_TEXT = True
-    _MAX_PAGES = 6
-    _TEXT_CHARS = 5000
-    _SAVE_FULL_TEXT = False
-    _SLEEP_SECONDS = 1.0
-    # ==========================
-
-    api_url = (
-        "https://export.arxiv.org/api/query"
-        f"?search_query=all:{requests.utils.quote(query)}&start=0&max_results={max_results}"
-    )
+    request, result = _arxiv_prepare(query, max_results, id_list)
+    if result is not None:
+        return result
 
-    out: List[Dict] = []
     try:
-        resp = session.get(api_url, timeout=60)
-        resp.raise_for_status()
+        fetched = _fetch_arxiv_feed(request["query"], request["max_results"], id_list=request["missing"])
     except requests.exceptions.RequestException as e:
-        return [{"error": f"arXiv API request failed: {e}"}]
-
-    try:
-        root = ET.fromstring(resp.content)
-        ns = {"atom": "http://www.w3.org/2005/Atom"}
-
-        for entry in root.findall("atom:entry", ns):
-            title = (
-                entry.findtext("atom:title", default="", namespaces=ns) or ""
-            ).strip()
-            published = (
-                entry.findtext("atom:published", default="", namespaces=ns) or ""
-            )[:10]
-            url_abs = entry.findtext("atom:id", default="", namespaces=ns) or ""
-            # original abstract
-            abstract_summary = (
-                entry.findtext("atom:summary", default="", namespaces=ns) or ""
-            ).strip()
-
-            authors = []
-            for a in entry.findall("atom:author", ns):
-                nm = a.findtext("atom:name", default="", namespaces=ns)
-                if nm:
-                    authors.append(nm)
-
-            link_pdf = None
-            for link in entry.findall("atom:link", ns):
-                if link.attrib.get("title") == "pdf":
-                    link_pdf = link.attrib.get("href")
-                    break
-            if not link_pdf and url_abs:
-                link_pdf = ensure_pdf_url(url_abs)
-
-            item = {
-                "title": title,
-                "authors": authors,
-                "published": published,
-                "url": url_abs,
-                "summary": abstract_summary,
-                "link_pdf": link_pdf,
-            }
-
-            pdf_bytes = None
-            if (_INCLUDE_PDF or _EXTRACT_TEXT) and link_pdf:
-                try:
-                    pdf_bytes = fetch_pdf_bytes(link_pdf, timeout=90)
-                    time.sleep(_SLEEP_SECONDS)
-                except Exception as e:
-                    item["pdf_error"] = f"PDF fetch failed: {e}"
-
-            if _EXTRACT_TEXT and pdf_bytes:
-                try:
-                    text = pdf_bytes_to_text(pdf_bytes, max_pages=_MAX_PAGES)
-                    text = clean_text(text) if text else ""
-                    if text:
-                        if _SAVE_FULL_TEXT:
-                            item["summary"] = text
-                        else:
-                            item["summary"] = text[:_TEXT_CHARS]
-                except Exception as e:
-                    item["text_error"] = f"Text extraction failed: {e}"
-
-            out.append(item)
-        return out
+        return _arxiv_fetch_failed(request, e)
     except ET.ParseError as e:
         return [{"error": f"arXiv API XML parse failed: {e}"}]
+
+    try:
+        out, new, abstracts = _arxiv_new_papers(request, fetched)
+        if _INCLUDE_PDF or _EXTRACT_TEXT:
+            _fetch_and_extract_pdfs(new, **_pdf_options())
+        return _arxiv_finish(request, fetched, out, new, abstracts)
     except Exception as e:
         return [{"error": f"Unexpected error: {e}"}]
 
@@ -258,8 +730,12 @@ arxiv_tool_def = {
             "properties": {
                 "query": {"type": "string", "description": "Search keywords."},
                 "max_results": {"type": "integer", "default": 20},
+                "id_list": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "arXiv ids or URLs to look up in one batch instead of searching.",
+                },
             },
-            "required": ["query"],
         },
     },
 }
@@ -269,12 +745,128 @@ arxiv_tool_def = {
 
 
 import os
+import threading
+from datetime import datetime
 from dotenv import load_dotenv
 from tavily import TavilyClient
+from src.ttl_cache import TTLCache
 
 load_dotenv()  # Loads environment variables from a .env file
 
 
+def normalize_query(query: str) -> str:
+    """Case- and whitespace-insensitive form of a search query, used for cache keys."""
+    return " ".join(str(query).lower().split())
+
+
+# ----- Tavily client & result cache -----
+_tavily_client = None
+_tavily_client_lock = threading.Lock()
+_tavily_cache = TTLCache(
+    ttl=float(os.getenv("TAVILY_CACHE_TTL", "3600")),
+    max_entries=int(os.getenv("TAVILY_CACHE_MAX_ENTRIES", "512")),
+)
+_tavily_stats_lock = threading.Lock()
+_tavily_stats = {"hits": 0, "misses": 0, "served_from_larger": 0}
+# Queries about what is happening now only reuse results this recent
+TAVILY_FRESH_MAX_AGE = float(os.getenv("TAVILY_FRESH_MAX_AGE", "300"))
+_TIME_SENSITIVE = re.compile(
+    r"\b(latest|today|tonight|yesterday|breaking|news|current|currently|recent|recently|now|live|"
+    r"this (week|month|year)|upcoming)\b"
+)
+
+
+def _get_tavily_client(api_key: str) -> TavilyClient:
+    """One long-lived client per process instead of a new one per search."""
+    global _tavily_client
+    with _tavily_client_lock:
+        if _tavily_client is None:
+            _tavily_client = TavilyClient(api_key, api_base_url=os.getenv("DLAI_TAVILY_BASE_URL"))
+        return _tavily_client
+
+
+def _tavily_api_key() -> str:
+    api_key = os.getenv("TAVILY_API_KEY")
+    if not api_key:
+        raise ValueError("TAVILY_API_KEY not found in environment variables.")
+    return api_key
+
+
+def _tavily_max_age(query_key: str) -> Optional[float]:
+    """Staleness window for a normalized query: TAVILY_FRESH_MAX_AGE if it asks about current events, else the cache TTL."""
+    if _TIME_SENSITIVE.search(query_key) or str(datetime.now().year) in query_key:
+        return TAVILY_FRESH_MAX_AGE
+    return None
+
+
+def _cached_tavily_response(query_key: str, max_results: int, include_images: bool) -> Optional[Dict]:
+    """
+    Find a cached response that covers this request: one fetched with at least
+    `max_results` results (or that came back short, i.e. exhausted), with
+    images if they were asked for, and recent enough for the query.
+    """
+    max_age = _tavily_max_age(query_key)
+    candidates = [(query_key, include_images)]
+    if not include_images:
+        candidates.append((query_key, True))
+    for key in candidates:
+        entry = _tavily_cache.get(key, max_age=max_age)
+        if entry is None:
+            continue
+        exhausted = len(entry["results"]) < entry["requested"]
+        if entry["requested"] >= max_results or exhausted:
+            with _tavily_stats_lock:
+                _tavily_stats["hits"] += 1
+                if entry["requested"] > max_results or key[1] != include_images:
+                    _tavily_stats["served_from_larger"] += 1
+            return entry
+    with _tavily_stats_lock:
+        _tavily_stats["misses"] += 1
+    return None
+
+
+def _store_tavily_response(query_key: str, response: Dict, requested: int, include_images: bool) -> Dict:
+    entry = _tavily_entry(response, requested, include_images)
+    _tavily_cache.set((query_key, include_images), entry)
+    return entry
+
+
+def _tavily_entry(response: Dict, requested: int, include_images: bool) -> Dict:
+    return {
+        "requested": requested,
+        "results": [
+            {
+                "title": r.get("title", ""),
+                "content": r.get("content", ""),
+                "url": r.get("url", ""),
+            }
+            for r in response.get("results", [])
+        ],
+        "images": list(response.get("images", [])) if include_images else [],
+    }
+
+
+def _tavily_results(entry: Dict, max_results: int, include_images: bool) -> List[Dict]:
+    results = [dict(r) for r in entry["results"][:max_results]]
+
+    if include_images:
+        for img_url in entry["images"]:
+            results.append({"image_url": img_url})
+
+    return results
+
+
+def _tavily_request_size(max_results: int) -> int:
+    # Fetch a little more than asked so smaller follow-up requests hit the cache
+    return max(max_results, int(os.getenv("TAVILY_PREFETCH_RESULTS", "20")))
+
+
+def tavily_cache_stats() -> Dict:
+    with _tavily_stats_lock:
+        stats = dict(_tavily_stats)
+    return {**stats, "cache": _tavily_cache.stats()}
+
+
 def tavily_search_tool(
     query: str, max_results: int = 20, include_images: bool = False
 ) -> list[dict]:
@@ -289,32 +881,19 @@ def tavily_search_tool(
     Returns:
         List[dict]: A list of dictionaries with keys like 'title', 'content', and 'url'.
     """
-    api_key = os.getenv("TAVILY_API_KEY")
-    if not api_key:
-        raise ValueError("TAVILY_API_KEY not found in environment variables.")
-
-    client = TavilyClient(api_key, api_base_url=os.getenv("DLAI_TAVILY_BASE_URL"))
+    api_key = _tavily_api_key()
 
+    query_key = normalize_query(query)
     try:
-        response = client.search(
-            query=query, max_results=max_results, include_images=include_images
-        )
-
-        results = []
-        for r in response.get("results", []):
-            results.append(
-                {
-                    "title": r.get("title", ""),
-                    "content": r.get("content", ""),
-                    "url": r.get("url", ""),
-                }
+        entry = _cached_tavily_response(query_key, max_results, include_images)
+        if entry is None:
+            requested = _tavily_request_size(max_results)
+            response = _get_tavily_client(api_key).search(
+                query=query, max_results=requested, include_images=include_images
             )
+            entry = _store_tavily_response(query_key, response, requested, include_images)
 
-        if include_images:
-            for img_url in response.get("images", []):
-                results.append({"image_url": img_url})
-
-        return results
+        return _tavily_results(entry, max_results, include_images)
 
     except Exception as e:
         return [{"error": str(e)}]  # For LLM-friendly agents
@@ -351,7 +930,79 @@ tavily_tool_def = {
 ## Wikipedia search tool
 
 from typing import List, Dict
-import wikipedia
+
+_WIKIPEDIA_API_URL = os.getenv("WIKIPEDIA_API_URL", "https://en.wikipedia.org/w/api.php")
+# Entries are keyed both by ("query", normalized query) -> title and by ("title", title) -> result
+_wikipedia_cache = TTLCache(
+    ttl=float(os.getenv("WIKIPEDIA_CACHE_TTL", "86400")),
+    max_entries=int(os.getenv("WIKIPEDIA_CACHE_MAX_ENTRIES", "1024")),
+)
+
+
+def _wikipedia_params(query: str, sentences: int) -> Dict:
+    """
+    Query parameters that resolve the top search hit and return its title,
+    plain-text intro and URL in a single MediaWiki API request
+    (search generator + extracts + info).
+    """
+    return {
+        "action": "query",
+        "format": "json",
+        "formatversion": "2",
+        "generator": "search",
+        "gsrsearch": query,
+        "gsrnamespace": "0",
+        "gsrlimit": "3",
+        "prop": "extracts|info|pageprops",
+        "exintro": "1",
+        "explaintext": "1",
+        "exsentences": str(sentences),
+        "exlimit": "3",
+        "inprop": "url",
+        "ppprop": "disambiguation",
+        "redirects": "1",
+    }
+
+
+def _parse_wikipedia_response(data: Dict, query: str) -> Dict:
+    """Pick the best hit, skipping disambiguation pages in favour of the next one."""
+    pages = data.get("query", {}).get("pages", [])
+    pages = sorted(pages, key=lambda pg: pg.get("index", 0))
+    articles = [pg for pg in pages if "disambiguation" not in pg.get("pageprops", {})]
+    if not articles:
+        raise LookupError(f'No Wikipedia article found for "{query}"')
+    page = articles[0]
+    return {
+        "title": page.get("title", ""),
+        "summary": (page.get("extract") or "").strip(),
+        "url": page.get("fullurl", ""),
+    }
+
+
+def _wikipedia_result(resp, query: str) -> Dict:
+    """Check and parse an API response (from requests or httpx)"""
+    resp.raise_for_status()
+    return _parse_wikipedia_response(resp.json(), query)
+
+
+def _wikipedia_lookup(query: str, sentences: int) -> Dict:
+    resp = session.get(_WIKIPEDIA_API_URL, params=_wikipedia_params(query, sentences), timeout=30)
+    return _wikipedia_result(resp, query)
+
+
+def _wikipedia_cache_get(query: str, sentences: int) -> Optional[Dict]:
+    title = _wikipedia_cache.get(("query", normalize_query(query), sentences))
+    return _wikipedia_cache.get(("title", title, sentences)) if title else None
+
+
+def _wikipedia_cache_set(query: str, sentences: int, result: Dict) -> None:
+    _wikipedia_cache.set(("title", result["title"], sentences), result)
+    _wikipedia_cache.set(("query", normalize_query(query), sentences), result["title"])
+
+
+def _clamp_sentences(sentences: int) -> int:
+    # The extracts API returns at most 10 sentences
+    return max(1, min(int(sentences), 10))
 
 
 def wikipedia_search_tool(query: str, sentences: int = 5) -> List[Dict]:
@@ -366,15 +1017,21 @@ def wikipedia_search_tool(query: str, sentences: int = 5) -> List[Dict]:
         List[Dict]: A list with a single dictionary containing title, summary, and URL.
     """
     try:
-        page_title = wikipedia.search(query)[0]
-        page = wikipedia.page(page_title)
-        summary = wikipedia.summary(page_title, sentences=sentences)
+        sentences = _clamp_sentences(sentences)
+        result = _wikipedia_cache_get(query, sentences)
+        if result is None:
+            result = _wikipedia_lookup(query, sentences)
+            _wikipedia_cache_set(query, sentences, result)
 
-        return [{"title": page.title, "summary": summary, "url": page.url}]
+        return [dict(result)]
     except Exception as e:
         return [{"error": str(e)}]
 
 
+def wikipedia_cache_stats() -> Dict:
+    return _wikipedia_cache.stats()
+
+
 # Tool definition
 wikipedia_tool_def = {
     "type": "function",
@@ -400,9 +1057,311 @@ wikipedia_tool_def = {
 }
 
 
+## Tool wrappers
+# Identical tool calls that are in flight at the same time (e.g. two users, or
+# two steps of one plan, asking Wikipedia the same thing) share one outbound call.
+# Below that, each call can be recorded to or replayed from the cassette store.
+
+import functools
+import inspect
+import json
+from src.single_flight import SingleFlight
+from src.cassette import recorded_call, recorded_call_async
+
+TOOL_SINGLE_FLIGHT = os.getenv("TOOL_SINGLE_FLIGHT", "true").lower() == "true"
+tool_flights = SingleFlight()
+
+
+def _tool_request(fn, kwargs: Dict) -> Dict:
+    bound = inspect.signature(fn).bind(**kwargs)
+    bound.apply_defaults()
+    return dict(bound.arguments)
+
+
+def _single_flight_key(tool_name: str, fn, kwargs: Dict) -> str:
+    """Tool name plus its arguments with defaults filled in and the query normalized."""
+    args = _tool_request(fn, kwargs)
+    if isinstance(args.get("query"), str):
+        args["query"] = normalize_query(args["query"])
+    return f"{tool_name}:{json.dumps(args, sort_keys=True, default=str)}"
+
+
+def _recorded(tool_name: str, fn):
+    """Route a tool through the cassette store when CASSETTE_MODE is record or replay."""
+
+    @functools.wraps(fn)
+    def wrapper(**kwargs):
+        return recorded_call(tool_name, _tool_request(fn, kwargs), lambda: fn(**kwargs))
+
+    return wrapper
+
+
+def _recorded_async(tool_name: str, fn):
+    @functools.wraps(fn)
+    async def wrapper(**kwargs):
+        return await recorded_call_async(tool_name, _tool_request(fn, kwargs), lambda: fn(**kwargs))
+
+    return wrapper
+
+
+def _single_flight(tool_name: str, fn):
+    if not TOOL_SINGLE_FLIGHT:
+        return fn
+
+    @functools.wraps(fn)
+    def wrapper(**kwargs):
+        try:
+            key = _single_flight_key(tool_name, fn, kwargs)
+        except TypeError:
+            return fn(**kwargs)  # bad arguments; let the tool raise its own error
+        return tool_flights.do(tool_name, key, fn, **kwargs)
+
+    return wrapper
+
+
+def _single_flight_async(tool_name: str, fn):
+    if not TOOL_SINGLE_FLIGHT:
+        return fn
+
+    @functools.wraps(fn)
+    async def wrapper(**kwargs):
+        try:
+            key = _single_flight_key(tool_name, fn, kwargs)
+        except TypeError:
+            return await fn(**kwargs)
+        return await tool_flights.do_async(tool_name, key, fn, **kwargs)
+
+    return wrapper
+
+
+def single_flight_stats() -> Dict:
+    return tool_flights.stats()
+
+
 # Tool mapping
 tool_mapping = {
-    "tavily_search_tool": tavily_search_tool,
-    "arxiv_search_tool": arxiv_search_tool,
-    "wikipedia_search_tool": wikipedia_search_tool,
+    "tavily_search_tool": _single_flight("tavily_search_tool", _recorded("tavily_search_tool", tavily_search_tool)),
+    "arxiv_search_tool": _single_flight("arxiv_search_tool", _recorded("arxiv_search_tool", arxiv_search_tool)),
+    "wikipedia_search_tool": _single_flight("wikipedia_search_tool", _recorded("wikipedia_search_tool", wikipedia_search_tool)),
+}
+
+
+## Async tools
+# Coroutine versions of the three tools for the asyncio workflow orchestrator.
+# Request building, parsing, caching and rate limiting are the helpers the sync
+# tools above use; each async tool differs from its sync one only in the I/O calls.
+
+import asyncio
+import weakref
+import httpx
+
+# httpx.AsyncClient connections belong to one event loop, so there is a client per loop
+_async_http = weakref.WeakKeyDictionary()
+_async_http_lock = threading.Lock()
+_async_tavily_client = None
+
+
+def _get_async_http() -> httpx.AsyncClient:
+    """Pooled async HTTP client of the running event loop; close_async_http() closes it."""
+    loop = asyncio.get_running_loop()
+    with _async_http_lock:
+        client = _async_http.get(loop)
+        if client is None:
+            # A loop closed without close_async_http() can't close its client any more; let it go
+            for old in [old for old in _async_http if old.is_closed()]:
+                del _async_http[old]
+            client = _async_http[loop] = httpx.AsyncClient(
+                headers={k: v for k, v in session.headers.items() if k != "Connection"},
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+                transport=httpx.AsyncHTTPTransport(retries=3),
+                follow_redirects=True,
+            )
+    return client
+
+
+async def close_async_http() -> None:
+    """Close the running event loop's HTTP client; call it before the loop shuts down."""
+    with _async_http_lock:
+        client = _async_http.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+async def _wait_for_arxiv_async(url: str) -> None:
+    bucket = _arxiv_bucket(url)
+    if bucket:
+        await get_rate_limiter().acquire_async(bucket[0], rate=bucket[1])
+
+
+async def _fetch_arxiv_feed_async(query: str, max_results: int, id_list: Optional[List[str]] = None) -> List[Dict]:
+    """Async counterpart of _fetch_arxiv_feed."""
+    out: List[Dict] = []
+    failures: List[Exception] = []
+    pages = 0
+    for url, size, is_search in _arxiv_pages(query, max_results, id_list):
+        pages += 1
+        parser = ArxivFeedParser()
+        try:
+            await _wait_for_arxiv_async(url)
+            async with _get_async_http().stream("GET", url, timeout=60) as r:
+                r.raise_for_status()
+                async for chunk in r.aiter_bytes(64 * 1024):
+                    out.extend(parser.feed(chunk))
+            out.extend(parser.close())
+        except httpx.HTTPError as e:
+            if not is_search:
+                _skip_id_chunk(failures, e)
+                continue
+            _keep_partial_feed(out, e)
+            break
+        if is_search and _last_page(parser, len(out), size):
+            break
+    _raise_if_every_chunk_failed(failures, pages)
+    return out
+
+
+async def fetch_pdf_to_buffer_async(
+    pdf_url: str, timeout: int = 90, max_bytes: Optional[int] = None
+) -> SpooledPdf:
+    """Async counterpart of fetch_pdf_to_buffer, with the same size cap."""
+    max_bytes = _pdf_max_bytes(max_bytes)
+    async with _get_async_http().stream("GET", pdf_url, timeout=timeout) as r:
+        r.raise_for_status()
+        buf = _pdf_buffer(r.headers, max_bytes)
+        try:
+            async for chunk in r.aiter_bytes(64 * 1024):
+                _buffer_chunk(buf, chunk, max_bytes)
+            buf.finish()
+        except BaseException:
+            buf.close()
+            raise
+        return buf
+
+
+async def _fetch_and_extract_pdfs_async(
+    items: List[Dict],
+    extract: bool,
+    max_pages: int,
+    text_chars: int,
+    save_full_text: bool,
+    fetch_workers: int,
+    extract_workers: int,
+) -> None:
+    """Async counterpart of _fetch_and_extract_pdfs; extraction runs off the event loop."""
+    cache = get_text_cache() if extract else None
+    max_chars = None if save_full_text else text_chars
+    fetch_slots = asyncio.Semaphore(fetch_workers)
+    extract_slots = asyncio.Semaphore(extract_workers)
+
+    async def _one(item: Dict) -> None:
+        key = None
+        if cache is not None:
+            served, key = await asyncio.to_thread(
+                _serve_cached_pdf_text, cache, item, max_pages, max_chars, save_full_text, text_chars
+            )
+            if served:
+                return
+
+        async with fetch_slots:
+            try:
+                await _wait_for_arxiv_async(item["link_pdf"])
+                pdf = await fetch_pdf_to_buffer_async(item["link_pdf"], timeout=90)
+            except Exception as e:
+                item["pdf_error"] = f"PDF fetch failed: {e}"
+                return
+
+        if not (extract and pdf.size):
+            pdf.close()
+            return
+        async with extract_slots:
+            try:
+                text = await asyncio.to_thread(_extract_pdf_text, pdf, max_pages, max_chars, key)
+            except Exception as e:
+                item["text_error"] = f"Text extraction failed: {e}"
+                return
+        _apply_pdf_text(item, text, save_full_text, text_chars)
+
+    await asyncio.gather(*(_one(item) for item in items if item.get("link_pdf")))
+
+
+async def arxiv_search_tool_async(
+    query: str = "",
+    max_results: int = 20,
+    id_list: Optional[List[str]] = None,
+) -> List[Dict]:
+    """Async version of arxiv_search_tool."""
+    # The paper index is SQLite; keep its reads and writes off the event loop
+    request, result = await asyncio.to_thread(_arxiv_prepare, query, max_results, id_list)
+    if result is not None:
+        return result
+
+    try:
+        fetched = await _fetch_arxiv_feed_async(request["query"], request["max_results"], id_list=request["missing"])
+    except httpx.HTTPError as e:
+        return _arxiv_fetch_failed(request, e)
+    except ET.ParseError as e:
+        return [{"error": f"arXiv API XML parse failed: {e}"}]
+
+    try:
+        out, new, abstracts = _arxiv_new_papers(request, fetched)
+        if _INCLUDE_PDF or _EXTRACT_TEXT:
+            await _fetch_and_extract_pdfs_async(new, **_pdf_options())
+        return await asyncio.to_thread(_arxiv_finish, request, fetched, out, new, abstracts)
+    except Exception as e:
+        return [{"error": f"Unexpected error: {e}"}]
+
+
+def _get_async_tavily_client(api_key: str):
+    global _async_tavily_client
+    from tavily import AsyncTavilyClient
+
+    with _tavily_client_lock:
+        if _async_tavily_client is None:
+            _async_tavily_client = AsyncTavilyClient(api_key, api_base_url=os.getenv("DLAI_TAVILY_BASE_URL"))
+        return _async_tavily_client
+
+
+async def tavily_search_tool_async(
+    query: str, max_results: int = 20, include_images: bool = False
+) -> list[dict]:
+    """Async version of tavily_search_tool, sharing its result cache."""
+    api_key = _tavily_api_key()
+
+    query_key = normalize_query(query)
+    try:
+        entry = _cached_tavily_response(query_key, max_results, include_images)
+        if entry is None:
+            requested = _tavily_request_size(max_results)
+            response = await _get_async_tavily_client(api_key).search(
+                query=query, max_results=requested, include_images=include_images
+            )
+            entry = _store_tavily_response(query_key, response, requested, include_images)
+
+        return _tavily_results(entry, max_results, include_images)
+
+    except Exception as e:
+        return [{"error": str(e)}]  # For LLM-friendly agents
+
+
+async def wikipedia_search_tool_async(query: str, sentences: int = 5) -> List[Dict]:
+    """Async version of wikipedia_search_tool, sharing its cache."""
+    try:
+        sentences = _clamp_sentences(sentences)
+        result = _wikipedia_cache_get(query, sentences)
+        if result is None:
+            resp = await _get_async_http().get(
+                _WIKIPEDIA_API_URL, params=_wikipedia_params(query, sentences), timeout=30
+            )
+            result = _wikipedia_result(resp, query)
+            _wikipedia_cache_set(query, sentences, result)
+
+        return [dict(result)]
+    except Exception as e:
+        return [{"error": str(e)}]
+
+
+async_tool_mapping = {
+    "tavily_search_tool": _single_flight_async("tavily_search_tool", _recorded_async("tavily_search_tool", tavily_search_tool_async)),
+    "arxiv_search_tool": _single_flight_async("arxiv_search_tool", _recorded_async("arxiv_search_tool", arxiv_search_tool_async)),
+    "wikipedia_search_tool": _single_flight_async("wikipedia_search_tool", _recorded_async("wikipedia_search_tool", wikipedia_search_tool_async)),
 }
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+import os
+import re
+import hashlib
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from dotenv import load_dotenv
+
+from src.text_cache import arxiv_id
+
+# Load environment variables
+load_dotenv()
+
+DEDUP_RESULTS = os.getenv("DEDUP_RESULTS", "true").lower() == "true"
+# Max differing bits between two 64-bit SimHashes for snippets to count as the same text.
+# Search snippets are short, so one changed word moves more bits than in long documents;
+# unrelated snippets still differ in ~32 bits.
+SIMHASH_MAX_DISTANCE = int(os.getenv("DEDUP_SIMHASH_DISTANCE", "6"))
+# Snippets shorter than this many words are only deduplicated by URL
+SIMHASH_MIN_WORDS = 12
+# Only the first this many words of a text are hashed
+SIMHASH_MAX_WORDS = 1000
+
+# When the same work comes back from several tools, keep the copy from the
+# most primary source (lower wins)
+TOOL_PRIORITY = {"arxiv_search_tool": 0, "wikipedia_search_tool": 1, "tavily_search_tool": 2}
+
+_TRACKING_PARAMS = re.compile(r"^(utm_\w+|fbclid|gclid|dclid|msclkid|mc_cid|mc_eid|ref|ref_src|source|share|cmpid)$", re.I)
+_HOST_PREFIXES = ("www.", "m.", "amp.", "mobile.")
+_WORD_RE = re.compile(r"\w+")
+
+# SimHash bit counting: each of the 64 hash bits gets its own 16-bit lane in
+# one big integer, so adding a feature's spread-out hash bumps all 64 counters
+# at once. Features per text stay below 2 * SIMHASH_MAX_WORDS, so lanes never overflow.
+_LANE_BITS = 16
+_LANE_MASK = (1 << _LANE_BITS) - 1
+# Lanes for the 8 bits of every byte value
+_BYTE_LANES = [sum(1 << (bit * _LANE_BITS) for bit in range(8) if b >> bit & 1) for b in range(256)]
+
+
+def canonicalize_url(url: str) -> Optional[str]:
+    """
+    Normalize a URL so that trivially different links to the same page compare
+    equal: scheme, www./m. prefixes, tracking parameters, fragments, trailing
+    slashes and query-parameter order are ignored. Any arXiv abs/pdf link,
+    versioned or not, becomes "arxiv:<id>".
+    """
+    if not url or not isinstance(url, str):
+        return None
+    url = url.strip()
+    parsed = arxiv_id(url) if "arxiv.org" in url.lower() else None
+    if parsed:
+        return f"arxiv:{parsed[0]}"
+
+    parts = urlsplit(url if "://" in url else f"https://{url}")
+    host = (parts.hostname or "").lower()
+    for prefix in _HOST_PREFIXES:
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    path = re.sub(r"/+", "/", parts.path or "/")
+    path = re.sub(r"/(index\.html?|amp)?$", "", path) or "/"
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query) if not _TRACKING_PARAMS.match(k)))
+    return urlunsplit(("https", host, path, query, ""))
+
+
+def _spread(h: int) -> int:
+    """Bit i of a 64-bit hash, moved to the bottom of lane i."""
+    return (
+        _BYTE_LANES[h & 0xFF]
+        | _BYTE_LANES[h >> 8 & 0xFF] << 8 * _LANE_BITS
+        | _BYTE_LANES[h >> 16 & 0xFF] << 16 * _LANE_BITS
+        | _BYTE_LANES[h >> 24 & 0xFF] << 24 * _LANE_BITS
+        | _BYTE_LANES[h >> 32 & 0xFF] << 32 * _LANE_BITS
+        | _BYTE_LANES[h >> 40 & 0xFF] << 40 * _LANE_BITS
+        | _BYTE_LANES[h >> 48 & 0xFF] << 48 * _LANE_BITS
+        | _BYTE_LANES[h >> 56] << 56 * _LANE_BITS
+    )
+
+
+def simhash(text: str) -> Optional[int]:
+    """64-bit SimHash over words and word pairs, or None if the text is too short to compare."""
+    words = _WORD_RE.findall(text.lower())[:SIMHASH_MAX_WORDS]
+    if len(words) < SIMHASH_MIN_WORDS:
+        return None
+    features = Counter(words)
+    features.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+    # Per bit: how many features have it set
+    ones = 0
+    for feature, count in features.items():
+        h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+        ones += _spread(h) * count
+    # A bit is set when more features have it set than not
+    total = sum(features.values())
+    return sum(1 << bit for bit in range(64) if 2 * (ones >> bit * _LANE_BITS & _LANE_MASK) > total)
+
+
+def _result_text(item: Dict) -> str:
+    # Compare bodies, not titles: syndicated copies often retitle the same article
+    return (item.get("content") or item.get("summary") or "")[:4000]
+
+
+def _result_chars(item: Dict) -> int:
+    return sum(len(str(v)) for v in item.values())
+
+
+# Totals since process start, for /cache_stats
+_stats_lock = threading.Lock()
+_stats = {"items_in": 0, "items_removed": 0, "chars_removed": 0}
+
+
+def dedup_tool_results(tool_results: List[Dict]) -> Tuple[List[Dict], Dict]:
+    """
+    Remove duplicate results across all of a research step's tool calls.
+    Two results are duplicates if their canonical URLs match or their text
+    SimHashes are within SIMHASH_MAX_DISTANCE bits. Each tool's result list keeps
+    its order; error entries, image entries and non-list results pass through.
+
+    Returns the filtered tool results and a report of what was removed.
+    """
+    report = {"items_in": 0, "items_removed": 0, "by_url": 0, "near_duplicate": 0, "chars_removed": 0}
+    if not DEDUP_RESULTS:
+        return tool_results, report
+
+    # Visit results from the most primary source first; they claim URLs and texts
+    candidates = []
+    for t, tr in enumerate(tool_results):
+        if not isinstance(tr.get("result"), list):
+            continue
+        for i, item in enumerate(tr["result"]):
+            if isinstance(item, dict) and "error" not in item and (item.get("url") or item.get("link_pdf")):
+                candidates.append((TOOL_PRIORITY.get(tr["tool_name"], len(TOOL_PRIORITY)), t, i, item))
+    candidates.sort(key=lambda c: c[:3])
+
+    seen_urls = set()
+    seen_hashes: List[int] = []
+    removed = set()
+    for _, t, i, item in candidates:
+        report["items_in"] += 1
+        urls = {u for u in (canonicalize_url(item.get("url")), canonicalize_url(item.get("link_pdf"))) if u}
+        reason = None
+        if urls & seen_urls:
+            reason = "by_url"
+        else:
+            fingerprint = simhash(_result_text(item))
+            if fingerprint is not None:
+                if any(bin(fingerprint ^ other).count("1") <= SIMHASH_MAX_DISTANCE for other in seen_hashes):
+                    reason = "near_duplicate"
+                else:
+                    seen_hashes.append(fingerprint)
+        if reason:
+            removed.add((t, i))
+            report["items_removed"] += 1
+            report[reason] += 1
+            report["chars_removed"] += _result_chars(item)
+        else:
+            seen_urls |= urls
+
+    with _stats_lock:
+        for name in _stats:
+            _stats[name] += report[name]
+
+    if not removed:
+        return tool_results, report
+    deduped = []
+    for t, tr in enumerate(tool_results):
+        if isinstance(tr.get("result"), list):
+            tr = {**tr, "result": [item for i, item in enumerate(tr["result"]) if (t, i) not in removed]}
+        deduped.append(tr)
+    return deduped, report
+
+
+def dedup_stats() -> Dict:
+    with _stats_lock:
+        return dict(_stats)
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+import os
+import threading
+from collections import Counter
+from typing import Dict, List, Tuple
+from dotenv import load_dotenv
+
+from src.relevance import BM25
+from src.context_compaction import count_tokens, html_to_text
+
+# Load environment variables
+load_dotenv()
+
+SECTION_RETRIEVAL = os.getenv("SECTION_RETRIEVAL", "true").lower() == "true"
+# Tokens of research passages each section writer gets
+SECTION_CONTEXT_TOKENS = int(os.getenv("SECTION_CONTEXT_TOKENS", "4000"))
+# Approximate size of one passage
+SECTION_PASSAGE_TOKENS = int(os.getenv("SECTION_PASSAGE_TOKENS", "200"))
+
+# Totals since process start, for /cache_stats
+_stats_lock = threading.Lock()
+_stats = {"reports": 0, "sections": 0, "tokens_full": 0, "tokens_sent": 0}
+
+
+def _pieces(line: str, target_tokens: int) -> List[str]:
+    """Split a line too long for one passage at word boundaries."""
+    max_chars = target_tokens * 4
+    if len(line) <= max_chars * 1.5:
+        return [line]
+    pieces, current = [], ""
+    for word in line.split(" "):
+        if current and len(current) + len(word) + 1 > max_chars:
+            pieces.append(current)
+            current = word
+        else:
+            current = f"{current} {word}" if current else word
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_passages(text: str, target_tokens: int = None) -> List[str]:
+    """Cut research text (HTML is flattened first) into passages of about `target_tokens`, on line boundaries."""
+    target_tokens = target_tokens or SECTION_PASSAGE_TOKENS
+    passages, current, current_tokens = [], [], 0
+    for line in html_to_text(text).splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        for piece in _pieces(line, target_tokens):
+            cost = count_tokens(piece)
+            if current and current_tokens + cost > target_tokens:
+                passages.append("\n".join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += cost
+    if current:
+        passages.append("\n".join(current))
+    return passages
+
+
+def _select(scores: List[float], sizes: List[int], budget: int) -> List[int]:
+    """Indexes of the best-scoring passages that fit in `budget` tokens, in document order."""
+    chosen, used = [], 0
+    ranked = [i for i in sorted(range(len(scores)), key=lambda i: (-scores[i], i)) if scores[i] > 0]
+    # Nothing matched at all: fall back to the start of the research
+    for i in ranked or range(len(scores)):
+        if used + sizes[i] > budget:
+            continue
+        chosen.append(i)
+        used += sizes[i]
+    return sorted(chosen)
+
+
+def section_contexts(research_data: str, sections: List[Dict], request: str, query: str,
+                     budget: int = None) -> Tuple[str, Dict[str, str], str, Dict]:
+    """
+    Pick the research each report section needs: split `research_data` into
+    passages, score them with BM25 against the section's title and
+    description plus `query` (the user prompt), and keep the best ones within
+    `budget` tokens per section, in their original order.
+
+    Passages picked for two or more sections form the shared context, which
+    every section writer gets as the same leading prompt prefix (so the
+    provider's prompt cache can serve it after the first call); the rest are
+    returned per section. The section writers' request line, `request`,
+    usually embeds the research as well; it is replaced by `query`.
+
+    Returns the shared context, {section name: section-only context}, the
+    request to send, and a report with the prompt tokens the section writers
+    would have received and those actually sent.
+    """
+    budget = SECTION_CONTEXT_TOKENS if budget is None else budget
+    research_tokens = count_tokens(research_data)
+    request_tokens = research_tokens if request == research_data else count_tokens(request)
+    full = (research_tokens + request_tokens) * len(sections)
+    query_tokens = count_tokens(query)
+    report = {
+        "tokens_full": full,
+        "tokens_sent": (research_tokens + query_tokens) * len(sections),
+        "tokens_shared": research_tokens,
+    }
+    if not SECTION_RETRIEVAL or research_tokens <= budget:
+        return research_data, {s["name"]: "" for s in sections}, query, report
+
+    passages = split_passages(research_data)
+    sizes = [count_tokens(p) for p in passages]
+    bm25 = BM25(passages)
+    chosen = {
+        section["name"]: _select(bm25.scores(f"{section['title']} {section['description']} {query}"), sizes, budget)
+        for section in sections
+    }
+    picks = Counter(i for indexes in chosen.values() for i in indexes)
+    shared = [i for i in sorted(picks) if picks[i] > 1]
+    shared_text = "\n\n".join(passages[i] for i in shared)
+    contexts = {
+        name: "\n\n".join(passages[i] for i in indexes if picks[i] == 1)
+        for name, indexes in chosen.items()
+    }
+
+    report["tokens_shared"] = count_tokens(shared_text)
+    report["tokens_sent"] = (
+        (report["tokens_shared"] + query_tokens) * len(sections) + sum(count_tokens(c) for c in contexts.values())
+    )
+    with _stats_lock:
+        _stats["reports"] += 1
+        _stats["sections"] += len(sections)
+        _stats["tokens_full"] += report["tokens_full"]
+        _stats["tokens_sent"] += report["tokens_sent"]
+    return shared_text, contexts, query, report
+
+
+def section_context_stats() -> Dict:
+    with _stats_lock:
+        stats = dict(_stats)
+    saved = stats["tokens_full"] - stats["tokens_sent"]
+    stats["tokens_saved"] = saved
+    stats["tokens_saved_per_report"] = round(saved / stats["reports"]) if stats["reports"] else 0
+    return stats
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import copy
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+
+class _Call:
+    def __init__(self, task: asyncio.Future = None):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.task = task
+        self.followers = 0
+
+
+class SingleFlight:
+    """
+    Collapses concurrent identical calls into one. The first caller for a key
+    runs the function; callers arriving while it is in flight wait for it and
+    get a copy of its result, or the same exception. When anyone shared the
+    call, the first caller gets a copy too, so no caller can change another's
+    result. Nothing is cached once the call completes.
+
+    Thread-based callers use `do`, coroutines use `do_async`; the two keep
+    separate sets of in-flight calls.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._tasks: Dict[Hashable, _Call] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, name: str, coalesced: bool):
+        # Caller holds self._lock
+        stats = self._stats.setdefault(name, {"calls": 0, "executed": 0, "coalesced": 0})
+        stats["calls"] += 1
+        stats["coalesced" if coalesced else "executed"] += 1
+
+    def do(self, name: str, key: Hashable, fn: Callable, *args, **kwargs) -> Any:
+        """Run `fn(*args, **kwargs)` unless an identical call (same `key`) is already running."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.followers += 1
+            self._count(name, coalesced=not leader)
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        # No followers can join any more; if there are some they copy the shared result
+        return copy.deepcopy(call.result) if call.followers else call.result
+
+    async def do_async(self, name: str, key: Hashable, fn: Callable, *args, **kwargs) -> Any:
+        """Coroutine version of `do`; `fn` is an async function."""
+        key = (id(asyncio.get_running_loop()), key)
+        with self._lock:
+            call = self._tasks.get(key)
+            leader = call is None
+            if leader:
+                call = self._tasks[key] = _Call(asyncio.ensure_future(fn(*args, **kwargs)))
+                # Runs before any caller resumes, so followers is final by then
+                call.task.add_done_callback(lambda _: self._forget(key))
+            else:
+                call.followers += 1
+            self._count(name, coalesced=not leader)
+
+        # Shielded so one caller timing out doesn't cancel the call for the others
+        result = await asyncio.shield(call.task)
+        return copy.deepcopy(result) if call.followers else result
+
+    def _forget(self, key: Hashable):
+        with self._lock:
+            self._tasks.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            per_tool = {name: dict(s) for name, s in self._stats.items()}
+            in_flight = len(self._calls) + len(self._tasks)
+        return {
+            "calls": sum(s["calls"] for s in per_tool.values()),
+            "coalesced": sum(s["coalesced"] for s in per_tool.values()),
+            "in_flight": in_flight,
+            "by_tool": per_tool,
+        }
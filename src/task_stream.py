@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+import asyncio
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Dict, Optional
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+STREAM_COMPLETIONS = os.getenv("STREAM_COMPLETIONS", "true").lower() == "true"
+# Agents whose completions are streamed to /task_stream clients
+STREAM_AGENTS = {
+    a.strip()
+    for a in os.getenv("STREAM_AGENTS", "writer_agent,editor_agent,write_section_parallel").split(",")
+    if a.strip()
+}
+# How long a finished task's events stay available to late subscribers
+STREAM_RETENTION = float(os.getenv("STREAM_RETENTION", "300"))
+# Seconds between keep-alive pings on an idle stream
+STREAM_HEARTBEAT = float(os.getenv("STREAM_HEARTBEAT", "15"))
+
+
+class TaskStreams:
+    """
+    In-process fan-out of live model output, per task. Workflows publish
+    events from any thread or event loop; each subscriber gets the backlog
+    first and then new events as they arrive, until the task's "done" event.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._streams: Dict[str, Dict] = {}
+
+    def _stream(self, task_id: str) -> Dict:
+        # Caller holds self._lock
+        stream = self._streams.get(task_id)
+        if stream is None:
+            stream = self._streams[task_id] = {"events": [], "subscribers": set(), "closed_at": None}
+        return stream
+
+    def _purge(self):
+        # Caller holds self._lock
+        cutoff = time.time() - STREAM_RETENTION
+        for task_id in [t for t, s in self._streams.items() if s["closed_at"] and s["closed_at"] < cutoff]:
+            del self._streams[task_id]
+
+    def publish(self, task_id: str, event: Dict):
+        with self._lock:
+            stream = self._stream(task_id)
+            events = stream["events"]
+            last = events[-1] if events else None
+            if (
+                event["type"] == "delta" and last and last["type"] == "delta"
+                and last["step"] == event["step"] and last["part"] == event["part"]
+            ):
+                # Keep the backlog compact; live subscribers still get every delta
+                events[-1] = {**last, "text": last["text"] + event["text"]}
+            else:
+                events.append(event)
+            if event["type"] == "done":
+                stream["closed_at"] = time.time()
+                self._purge()
+            subscribers = list(stream["subscribers"])
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+            except RuntimeError:
+                pass  # subscriber's loop has closed
+
+    def known(self, task_id: str) -> bool:
+        with self._lock:
+            return task_id in self._streams
+
+    async def subscribe(self, task_id: str) -> AsyncIterator[Optional[Dict]]:
+        """Yield the task's events (None as a keep-alive when idle) until its "done" event."""
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        with self._lock:
+            stream = self._stream(task_id)
+            backlog = list(stream["events"])
+            stream["subscribers"].add((loop, queue))
+        try:
+            for event in backlog:
+                yield event
+                if event["type"] == "done":
+                    return
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=STREAM_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                yield event
+                if event["type"] == "done":
+                    return
+        finally:
+            with self._lock:
+                stream["subscribers"].discard((loop, queue))
+
+
+class StreamSink:
+    """Where one workflow step's streamed output goes."""
+
+    def __init__(self, streams: TaskStreams, task_id: str, step: int):
+        self.streams = streams
+        self.task_id = task_id
+        self.step = step
+
+    def delta(self, agent: str, part: str, text: str):
+        if text:
+            self.streams.publish(
+                self.task_id, {"type": "delta", "step": self.step, "agent": agent, "part": part, "text": text}
+            )
+
+    def part_done(self, agent: str, part: str):
+        self.streams.publish(self.task_id, {"type": "part_done", "step": self.step, "agent": agent, "part": part})
+
+
+_sink: ContextVar[Optional[StreamSink]] = ContextVar("task_stream_sink", default=None)
+
+
+@contextmanager
+def task_stream_scope(task_id: str, step: int, title: str = ""):
+    """Stream the output of the model calls made inside the block (one workflow step) to the task's subscribers."""
+    streams = get_task_streams()
+    streams.publish(task_id, {"type": "step", "step": step, "title": title})
+    token = _sink.set(StreamSink(streams, task_id, step))
+    try:
+        yield
+    finally:
+        _sink.reset(token)
+
+
+def stream_sink(agent: Optional[str]) -> Optional[StreamSink]:
+    """The current step's sink if `agent`'s completions should be streamed, else None."""
+    if not STREAM_COMPLETIONS or agent not in STREAM_AGENTS:
+        return None
+    return _sink.get()
+
+
+def close_task_stream(task_id: str, status: str):
+    get_task_streams().publish(task_id, {"type": "done", "status": status})
+
+
+# Global instance
+task_streams = TaskStreams()
+
+
+def get_task_streams() -> TaskStreams:
+    return task_streams
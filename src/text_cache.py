@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Optional, Dict, Tuple
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+_ARXIV_ID_RE = re.compile(
+    r"arxiv\.org/(?:abs|pdf)/([a-z\-]+(?:\.[A-Z]{2})?/\d{7}|\d{4}\.\d{4,5})(v\d+)?",
+    re.IGNORECASE,
+)
+
+
+def arxiv_id(url: Optional[str]) -> Optional[Tuple[str, str]]:
+    """Parse an arXiv abs/pdf URL into (id, version), e.g. ("2101.00001", "v2"); version may be ""."""
+    m = _ARXIV_ID_RE.search(url or "")
+    if not m:
+        return None
+    return m.group(1).lower(), m.group(2) or ""
+
+
+def arxiv_cache_key(url_abs: Optional[str], link_pdf: Optional[str] = None) -> Optional[str]:
+    """
+    Build a cache key from an arXiv id and version (e.g. "arxiv:2101.00001v2").
+    Falls back to the PDF URL when no arXiv id can be parsed.
+    """
+    for url in (url_abs, link_pdf):
+        parsed = arxiv_id(url)
+        if parsed:
+            return f"arxiv:{parsed[0]}{parsed[1]}"
+    if link_pdf:
+        return f"url:{link_pdf.strip().replace('http://', 'https://')}"
+    return None
+
+
+class TextCache:
+    """
+    On-disk LRU cache for cleaned PDF text, backed by SQLite.
+
+    SQLite's file locking makes the store safe to share between threads and
+    between uvicorn worker processes; each thread gets its own connection.
+    """
+
+    def __init__(self, path: str = None, max_bytes: int = None):
+        self.path = path or os.getenv("ARXIV_TEXT_CACHE_PATH", "./.cache/arxiv_text.db")
+        self.max_bytes = max_bytes or int(os.getenv("ARXIV_TEXT_CACHE_MAX_MB", "512")) * 1024 * 1024
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._initialize_database()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _initialize_database(self):
+        """Create tables if they don't exist"""
+        conn = self._conn()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                text TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                pdf_bytes INTEGER NOT NULL DEFAULT 0,
+                extract_seconds REAL NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_last_access ON entries(last_access)")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS stats (
+                name TEXT PRIMARY KEY,
+                value REAL NOT NULL DEFAULT 0
+            )
+            """
+        )
+
+    def _bump(self, conn: sqlite3.Connection, **deltas):
+        for name, delta in deltas.items():
+            conn.execute(
+                "INSERT INTO stats(name, value) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                (name, delta),
+            )
+
+    def get(self, key: str) -> Optional[str]:
+        """Return cached text for `key` and mark it as recently used, or None."""
+        conn = self._conn()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT text, pdf_bytes, extract_seconds FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self._bump(conn, misses=1)
+            else:
+                conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+                self._bump(conn, hits=1, bytes_saved=row[1], seconds_saved=row[2])
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            print(f"Text cache read failed: {e}")
+            row = None
+
+        with self._lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return row[0] if row else None
+
+    def put(self, key: str, text: str, pdf_bytes: int = 0, extract_seconds: float = 0.0):
+        """Store text under `key`, evicting least recently used entries past the size limit."""
+        size = len(text.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        conn = self._conn()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT OR REPLACE INTO entries(key, text, size, pdf_bytes, extract_seconds, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, text, size, pdf_bytes, extract_seconds, now, now),
+            )
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total > self.max_bytes:
+                for old_key, old_size in conn.execute(
+                    "SELECT key, size FROM entries WHERE key != ? ORDER BY last_access ASC", (key,)
+                ).fetchall():
+                    conn.execute("DELETE FROM entries WHERE key = ?", (old_key,))
+                    self._bump(conn, evictions=1)
+                    total -= old_size
+                    if total <= self.max_bytes:
+                        break
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            print(f"Text cache write failed: {e}")
+
+    def stats(self) -> Dict:
+        """Hit/miss counters for this process plus totals shared by all processes."""
+        conn = self._conn()
+        shared = dict(conn.execute("SELECT name, value FROM stats").fetchall())
+        entries, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        with self._lock:
+            local = {"hits": self.hits, "misses": self.misses}
+        return {
+            "process": local,
+            "shared": {
+                "hits": int(shared.get("hits", 0)),
+                "misses": int(shared.get("misses", 0)),
+                "evictions": int(shared.get("evictions", 0)),
+                "pdf_bytes_saved": int(shared.get("bytes_saved", 0)),
+                "extract_seconds_saved": round(shared.get("seconds_saved", 0.0), 3),
+            },
+            "entries": entries,
+            "size_bytes": total,
+            "max_bytes": self.max_bytes,
+        }
+
+
+# Global instance
+text_cache = None
+_text_cache_lock = threading.Lock()
+
+
+def get_text_cache() -> Optional[TextCache]:
+    """Get the global text cache, or None when disabled via ARXIV_TEXT_CACHE_ENABLED=false"""
+    global text_cache
+    if os.getenv("ARXIV_TEXT_CACHE_ENABLED", "true").lower() != "true":
+        return None
+    with _text_cache_lock:
+        if text_cache is None:
+            try:
+                text_cache = TextCache()
+            except Exception as e:
+                print(f"Failed to initialize text cache: {e}")
+                return None
+    return text_cache
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class TTLCache:
+    """
+    Thread-safe in-process cache with a per-entry age limit and LRU eviction.
+    Callers can pass a tighter `max_age` on lookup to apply their own
+    staleness window without evicting the entry for everyone else.
+    """
+
+    def __init__(self, ttl: float, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.counters: Dict[str, int] = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+
+    def get(self, key: Hashable, max_age: Optional[float] = None) -> Optional[Any]:
+        limit = self.ttl if max_age is None else min(max_age, self.ttl)
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.counters["misses"] += 1
+                return None
+            stored_at, value = item
+            age = time.time() - stored_at
+            if age > limit:
+                if age > self.ttl:
+                    del self._data[key]
+                self.counters["expired"] += 1
+                return None
+            self._data.move_to_end(key)
+            self.counters["hits"] += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.time(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.counters["evictions"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.counters, "entries": len(self._data), "ttl_seconds": self.ttl}
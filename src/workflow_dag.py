@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Awaitable, Callable, List, Set
+
+
+def linear_dependencies(n: int) -> List[List[int]]:
+    """Each step waits for the one before it"""
+    return [[i - 1] if i else [] for i in range(n)]
+
+
+def ancestors(dependencies: List[List[int]], index: int) -> List[int]:
+    """Every step `index` depends on, directly or not, in plan order"""
+    seen: Set[int] = set()
+    stack = list(dependencies[index])
+    while stack:
+        i = stack.pop()
+        if i not in seen:
+            seen.add(i)
+            stack.extend(dependencies[i])
+    return sorted(seen)
+
+
+def _ready(dependencies: List[List[int]], pending: Set[int], done: Set[int]) -> List[int]:
+    return [i for i in sorted(pending) if all(d in done for d in dependencies[i])]
+
+
+def _validate(dependencies: List[List[int]]):
+    n = len(dependencies)
+    for i, deps in enumerate(dependencies):
+        for d in deps:
+            if not 0 <= d < n or d == i:
+                raise ValueError(f"Step {i + 1} has an invalid dependency: {d + 1}")
+    done: Set[int] = set()
+    pending = set(range(n))
+    while pending:
+        ready = _ready(dependencies, pending, done)
+        if not ready:
+            raise ValueError(f"Dependency cycle among steps {sorted(i + 1 for i in pending)}")
+        done.update(ready)
+        pending.difference_update(ready)
+
+
+def run_dag(dependencies: List[List[int]], run_step: Callable[[int], None]):
+    """
+    Run `run_step(i)` for every step, each as soon as all the steps it
+    depends on have finished; independent steps run concurrently in worker
+    threads (each in a copy of the caller's context). If a step fails no new
+    steps are started, the running ones are allowed to finish, and the first
+    error is raised.
+    """
+    _validate(dependencies)
+    pending = set(range(len(dependencies)))
+    done: Set[int] = set()
+    running = {}
+    error = None
+    with ThreadPoolExecutor(max_workers=max(len(dependencies), 1), thread_name_prefix="workflow-step") as pool:
+        while pending or running:
+            if error is None:
+                for i in _ready(dependencies, pending, done):
+                    running[pool.submit(contextvars.copy_context().run, run_step, i)] = i
+                    pending.discard(i)
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                i = running.pop(future)
+                try:
+                    future.result()
+                    done.add(i)
+                except Exception as e:
+                    error = error or e
+    if error is not None:
+        raise error
+
+
+async def run_dag_async(dependencies: List[List[int]], run_step: Callable[[int], Awaitable[None]]):
+    """Asyncio version of run_dag: independent steps run as concurrent tasks on the current loop."""
+    _validate(dependencies)
+    pending = set(range(len(dependencies)))
+    done: Set[int] = set()
+    running = {}
+    error = None
+    while pending or running:
+        if error is None:
+            for i in _ready(dependencies, pending, done):
+                running[asyncio.ensure_future(run_step(i))] = i
+                pending.discard(i)
+        if not running:
+            break
+        finished, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+        for task in finished:
+            i = running.pop(task)
+            try:
+                task.result()
+                done.add(i)
+            except Exception as e:
+                error = error or e
+    if error is not None:
+        raise error
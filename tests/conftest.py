@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Make `src` and `main` importable when pytest is run from anywhere
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(scope="session")
+def main_app(tmp_path_factory):
+    """The `main` module, imported against a throwaway SQLite database."""
+    overrides = {
+        "USE_COSMOS_DB": "false",
+        "DATABASE_URL": f"sqlite:///{tmp_path_factory.mktemp('db') / 'tasks.db'}",
+    }
+    saved = {name: os.environ.get(name) for name in overrides}
+    cwd = os.getcwd()
+    os.environ.update(overrides)
+    os.chdir(ROOT)  # main.py mounts ./static and ./templates
+    try:
+        import main
+    finally:
+        os.chdir(cwd)
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+    return main
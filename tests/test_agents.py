@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import src.agents as agents
+import src.task_stream as ts
+
+
+def _tool_call(name, **args):
+    return SimpleNamespace(function=SimpleNamespace(name=name, arguments=json.dumps(args)))
+
+
+@pytest.fixture
+def stub_tools(monkeypatch):
+    """Replace the research tools with stubs: sleep `delay` seconds, then echo the query."""
+    release = threading.Event()
+
+    def tool(name):
+        def run(query, delay=0.0):
+            release.wait(delay)
+            return [{"tool": name, "query": query}]
+
+        return run
+
+    def async_tool(name):
+        async def run(query, delay=0.0):
+            await asyncio.sleep(delay)
+            return [{"tool": name, "query": query}]
+
+        return run
+
+    for name in agents.TOOL_LIMITS:
+        monkeypatch.setitem(agents.tool_mapping, name, tool(name))
+        monkeypatch.setitem(agents.async_tool_mapping, name, async_tool(name))
+    yield
+    release.set()
+
+
+def test_results_keep_the_call_order(stub_tools):
+    results = agents.execute_tool_calls([
+        _tool_call("wikipedia_search_tool", query="slow", delay=0.2),
+        _tool_call("tavily_search_tool", query="fast"),
+        _tool_call("no_such_tool", query="x"),
+        SimpleNamespace(function=SimpleNamespace(name="arxiv_search_tool", arguments="{not json")),
+    ])
+    assert [r["tool_name"] for r in results] == [
+        "wikipedia_search_tool", "tavily_search_tool", "no_such_tool", "arxiv_search_tool",
+    ]
+    assert results[0]["result"] == [{"tool": "wikipedia_search_tool", "query": "slow"}]
+    assert results[1]["args"] == {"query": "fast"}
+    assert results[2]["result"] == "Unknown tool: no_such_tool"
+    assert results[3]["result"].startswith("Error executing arxiv_search_tool")
+
+
+def test_a_slow_tool_times_out_while_the_others_return(stub_tools, monkeypatch):
+    monkeypatch.setitem(agents.TOOL_LIMITS["tavily_search_tool"], "timeout", 0.2)
+    started = time.monotonic()
+    results = agents.execute_tool_calls([
+        _tool_call("tavily_search_tool", query="hangs", delay=30),
+        _tool_call("wikipedia_search_tool", query="quick"),
+    ])
+    assert time.monotonic() - started < 5
+    assert results[0]["result"] == "Error executing tavily_search_tool: timed out after 0.2s"
+    assert results[1]["result"] == [{"tool": "wikipedia_search_tool", "query": "quick"}]
+
+
+def test_tool_errors_become_results(stub_tools, monkeypatch):
+    def fail(query):
+        raise ValueError("bad query")
+
+    monkeypatch.setitem(agents.tool_mapping, "wikipedia_search_tool", fail)
+    results = agents.execute_tool_calls([_tool_call("wikipedia_search_tool", query="x")])
+    assert results[0]["result"] == "Error executing wikipedia_search_tool: bad query"
+
+
+def test_per_tool_concurrency_cap(monkeypatch):
+    monkeypatch.setitem(agents._tool_semaphores, "arxiv_search_tool", threading.BoundedSemaphore(2))
+    lock = threading.Lock()
+    running, peak = [0], [0]
+
+    def tool(query):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+        return query
+
+    monkeypatch.setitem(agents.tool_mapping, "arxiv_search_tool", tool)
+    results = agents.execute_tool_calls([_tool_call("arxiv_search_tool", query=str(i)) for i in range(6)])
+    assert [r["result"] for r in results] == [str(i) for i in range(6)]
+    assert peak[0] == 2
+
+
+def test_time_queued_behind_the_cap_counts_toward_the_timeout(stub_tools, monkeypatch):
+    monkeypatch.setitem(agents._tool_semaphores, "tavily_search_tool", threading.BoundedSemaphore(1))
+    monkeypatch.setitem(agents.TOOL_LIMITS["tavily_search_tool"], "timeout", 0.3)
+    results = agents.execute_tool_calls([
+        _tool_call("tavily_search_tool", query="holds the slot", delay=30),
+        _tool_call("tavily_search_tool", query="queued"),
+    ])
+    assert [r["result"] for r in results] == ["Error executing tavily_search_tool: timed out after 0.3s"] * 2
+
+
+def test_async_dispatch_keeps_order_and_times_out(stub_tools, monkeypatch):
+    monkeypatch.setitem(agents.TOOL_LIMITS["tavily_search_tool"], "timeout", 0.2)
+    results = asyncio.run(agents.execute_tool_calls_async([
+        _tool_call("tavily_search_tool", query="hangs", delay=30),
+        _tool_call("wikipedia_search_tool", query="slow", delay=0.05),
+        _tool_call("arxiv_search_tool", query="fast"),
+        _tool_call("no_such_tool"),
+    ]))
+    assert [r["result"] for r in results] == [
+        "Error executing tavily_search_tool: timed out after 0.2s",
+        [{"tool": "wikipedia_search_tool", "query": "slow"}],
+        [{"tool": "arxiv_search_tool", "query": "fast"}],
+        "Unknown tool: no_such_tool",
+    ]
+
+
+def _ns(data):
+    """Attribute access over plain completion data, standing in for the openai models."""
+    return json.loads(json.dumps(data), object_hook=lambda d: SimpleNamespace(**d))
+
+
+class _Usage(SimpleNamespace):
+    def model_dump(self, mode=None):
+        return dict(vars(self))
+
+
+def _chunk(content=None, tool_calls=None, finish_reason=None, usage=None, choices=True):
+    delta = SimpleNamespace(content=content, tool_calls=tool_calls)
+    return SimpleNamespace(
+        id="chatcmpl-1", created=1700000000, model="test-model",
+        choices=[SimpleNamespace(index=0, delta=delta, finish_reason=finish_reason)] if choices else [],
+        usage=usage,
+    )
+
+
+def _tool_delta(index, id=None, name=None, arguments=None):
+    return SimpleNamespace(index=index, id=id, function=SimpleNamespace(name=name, arguments=arguments))
+
+
+_USAGE = {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}
+
+
+def _unstreamed(message, finish_reason):
+    """What the same response looks like when it is not streamed."""
+    return {
+        "object": "chat.completion", "id": "chatcmpl-1", "created": 1700000000, "model": "test-model",
+        "choices": [{"index": 0, "finish_reason": finish_reason, "message": {"role": "assistant", **message}}],
+        "usage": _USAGE,
+    }
+
+
+TEXT_CHUNKS = [
+    _chunk("Hello"), _chunk(" world"), _chunk(finish_reason="stop"), _chunk(usage=_Usage(**_USAGE), choices=False),
+]
+TEXT_COMPLETION = _unstreamed({"content": "Hello world"}, "stop")
+
+TOOL_CHUNKS = [
+    _chunk(tool_calls=[_tool_delta(0, id="call_1", name="tavily_search_tool", arguments="")]),
+    _chunk(tool_calls=[_tool_delta(0, arguments='{"query": ')]),
+    _chunk(tool_calls=[_tool_delta(1, id="call_2", name="wikipedia_search_tool", arguments='{"query": "b"}')]),
+    _chunk(tool_calls=[_tool_delta(0, arguments='"a"}')]),
+    _chunk(finish_reason="tool_calls"),
+    _chunk(usage=_Usage(**_USAGE), choices=False),
+]
+TOOL_COMPLETION = _unstreamed({
+    "content": None,
+    "tool_calls": [
+        {"id": "call_1", "type": "function", "function": {"name": "tavily_search_tool", "arguments": '{"query": "a"}'}},
+        {"id": "call_2", "type": "function", "function": {"name": "wikipedia_search_tool", "arguments": '{"query": "b"}'}},
+    ],
+}, "tool_calls")
+
+
+@pytest.mark.parametrize("chunks, expected", [(TEXT_CHUNKS, TEXT_COMPLETION), (TOOL_CHUNKS, TOOL_COMPLETION)])
+def test_streamed_chunks_accumulate_into_the_unstreamed_completion(chunks, expected):
+    acc = agents._StreamedCompletion()
+    text = "".join(acc.add(chunk) for chunk in chunks)
+    assert acc.completion() == expected
+    assert text == (expected["choices"][0]["message"]["content"] or "")
+
+
+def test_accumulated_completion_loads_as_a_chat_completion():
+    chat = pytest.importorskip("openai.types.chat")
+    acc = agents._StreamedCompletion()
+    for chunk in TOOL_CHUNKS:
+        acc.add(chunk)
+    assert agents._load_completion(acc.completion()) == chat.ChatCompletion.model_validate(TOOL_COMPLETION)
+
+
+@pytest.fixture
+def streaming(monkeypatch):
+    """Stream writer_agent completions from a stub gateway; the task stream is fresh."""
+    monkeypatch.setattr(agents, "_load_completion", _ns)
+    monkeypatch.setenv("LLM_CACHE_ENABLED", "false")
+    monkeypatch.setenv("CASSETTE_MODE", "off")
+    monkeypatch.setattr(ts, "STREAM_COMPLETIONS", True)
+    monkeypatch.setattr(ts, "task_streams", ts.TaskStreams())
+    stub = SimpleNamespace(calls=[], chunks=[], completion=None)
+
+    def create(**kwargs):
+        stub.calls.append(kwargs)
+        return iter(stub.chunks) if kwargs.get("stream") else _ns(stub.completion)
+
+    stub.create = create
+    monkeypatch.setattr(agents, "get_llm_gateway", lambda: stub)
+    return stub
+
+
+def _backlog(task_id):
+    ts.close_task_stream(task_id, "done")
+
+    async def run():
+        return [event async for event in ts.get_task_streams().subscribe(task_id)]
+
+    return asyncio.run(run())
+
+
+def test_streamed_completion_matches_the_unstreamed_one(streaming):
+    streaming.chunks, streaming.completion = TEXT_CHUNKS, TEXT_COMPLETION
+    with ts.task_stream_scope("t", 4, "Write"):
+        streamed = agents._create_completion(agent="writer_agent", model="test-model", messages=[])
+    unstreamed = agents._create_completion(agent="writer_agent", model="test-model", messages=[])
+    assert streamed == unstreamed
+    assert [call.get("stream") for call in streaming.calls] == [True, None]
+    events = _backlog("t")
+    assert [(e["type"], e.get("text")) for e in events] == [
+        ("step", None), ("delta", "Hello world"), ("part_done", None), ("done", None),
+    ]
+
+
+def test_an_empty_stream_falls_back_to_an_unstreamed_call(streaming):
+    streaming.chunks = [_chunk(usage=_Usage(**_USAGE), choices=False)]
+    streaming.completion = TEXT_COMPLETION
+    with ts.task_stream_scope("t", 4, "Write"):
+        resp = agents._create_completion(agent="writer_agent", model="test-model", messages=[])
+    assert resp == _ns(TEXT_COMPLETION)
+    assert [call.get("stream") for call in streaming.calls] == [True, None]
+    events = _backlog("t")
+    assert [(e["type"], e.get("text")) for e in events] == [
+        ("step", None), ("delta", "Hello world"), ("part_done", None), ("done", None),
+    ]
+
+
+def test_section_messages_keep_the_section_specific_parts_last():
+    methods, results = agents.REPORT_SECTIONS[3], agents.REPORT_SECTIONS[4]
+    a = agents._section_messages(methods, "request", "shared research", {"reportFormat": "academic"}, "survey design")
+    b = agents._section_messages(results, "request", "shared research", {"reportFormat": "academic"})
+    assert a[0] == b[0]
+    assert "shared research" in a[0]["content"]
+    assert a[1]["content"].startswith("Additional research for this section:\nsurvey design\n\n")
+    assert "Write ONLY the Methodology section" in a[1]["content"]
+    assert b[1]["content"].startswith("Write ONLY the Key Findings/Results section")
+
+
+def test_parallel_sections_share_a_byte_identical_system_message(monkeypatch):
+    import src.section_context as sc
+
+    monkeypatch.setattr(sc, "SECTION_RETRIEVAL", True)
+    monkeypatch.setattr(sc, "SECTION_CONTEXT_TOKENS", 150)
+    monkeypatch.setattr(sc, "SECTION_PASSAGE_TOKENS", 30)
+    lines = [
+        "Sleep spindles predict overnight memory consolidation in adults.",
+        "Participants were recruited and data collection used polysomnography; analytical approaches were mixed models.",
+        "Primary outcomes and evidence: recall improved by twelve percent after sleep.",
+        "Limitations include small samples; implications for education are discussed.",
+        "Future research directions include longitudinal studies of older adults.",
+    ] + [f"Unrelated note {i} about the laboratory schedule and the building heating." for i in range(30)]
+    prompt = "User Prompt:\nHow does sleep affect memory?\n\nResearch Results:\n" + "\n".join(lines)
+    requests = []
+    lock = threading.Lock()
+
+    def create(**kwargs):
+        with lock:
+            requests.append(kwargs)
+        return _ns(_unstreamed({"content": f"Text of {kwargs['part']}"}, "stop"))
+
+    monkeypatch.setattr(agents, "_create_completion", create)
+    report, _ = agents.parallel_writer_agent(prompt, advanced_options={"reportFormat": "academic"})
+
+    assert len(requests) == len(agents.REPORT_SECTIONS)
+    systems = {r["messages"][0]["content"] for r in requests}
+    assert len(systems) == 1
+    system = systems.pop()
+    # The request line is the user prompt, not the whole research again
+    assert "Request: How does sleep affect memory?" in system
+    assert "Unrelated note 29" not in system
+    users = {r["part"]: r["messages"][1]["content"] for r in requests}
+    assert any(u.startswith("Additional research for this section") for u in users.values())
+    assert "Text of Discussion" in report
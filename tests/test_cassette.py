@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import src.agents as agents
+import src.cassette as cassette
+import src.llm_cache as llm_cache
+import src.research_tools as rt
+from src.cassette import CassetteMiss, CassetteStore, recorded_call, recorded_call_async
+
+
+@pytest.fixture
+def use_mode(tmp_path, monkeypatch):
+    """Switch CASSETTE_MODE; recordings go to a temporary directory."""
+    monkeypatch.setenv("CASSETTE_DIR", str(tmp_path / "cassettes"))
+    monkeypatch.setattr(cassette, "cassette_store", None)
+
+    def use(mode, latency="none"):
+        monkeypatch.setenv("CASSETTE_MODE", mode)
+        monkeypatch.setenv("CASSETTE_REPLAY_LATENCY", latency)
+        monkeypatch.setattr(cassette, "cassette_store", None)
+        return cassette.get_cassette_store()
+
+    return use
+
+
+def _completion(text):
+    return {"choices": [{"index": 0, "message": {"content": text}, "finish_reason": "stop"}], "usage": {"total_tokens": 5}}
+
+
+@pytest.fixture
+def gateway(monkeypatch):
+    """Completions are plain dicts; the gateway answers from `responses` or fails when it is empty."""
+    monkeypatch.setattr(agents, "_dump_completion", dict)
+    monkeypatch.setattr(agents, "_load_completion", dict)
+    stub = SimpleNamespace(calls=[], responses=[])
+
+    def create(**kwargs):
+        stub.calls.append(kwargs)
+        if not stub.responses:
+            raise AssertionError("the model was called during replay")
+        return stub.responses.pop(0)
+
+    async def create_async(**kwargs):
+        return create(**kwargs)
+
+    stub.create, stub.create_async = create, create_async
+    monkeypatch.setattr(agents, "get_llm_gateway", lambda: stub)
+    return stub
+
+
+def _request(content="Summarize the findings."):
+    return {"model": "test-model", "messages": [{"role": "user", "content": content}]}
+
+
+def test_completion_round_trip(use_mode, gateway, monkeypatch):
+    monkeypatch.setenv("LLM_CACHE_ENABLED", "false")
+    use_mode("record")
+    gateway.responses.append(_completion("recorded answer"))
+    recorded = agents._create_completion(agent="writer_agent", **_request())
+
+    use_mode("replay")
+    assert agents._create_completion(agent="writer_agent", **_request()) == recorded
+    assert asyncio.run(agents._create_completion_async(agent="writer_agent", **_request())) == recorded
+    assert len(gateway.calls) == 1
+    with pytest.raises(CassetteMiss):
+        agents._create_completion(agent="writer_agent", **_request("Something else."))
+
+
+def test_response_cache_hits_are_recorded(use_mode, gateway, tmp_path, monkeypatch):
+    monkeypatch.setenv("LLM_CACHE_ENABLED", "true")
+    monkeypatch.setattr(llm_cache, "llm_cache", llm_cache.LLMCache(path=str(tmp_path / "llm.db"), agents="writer_agent"))
+    use_mode("off")
+    gateway.responses.append(_completion("cached answer"))
+    agents._create_completion(agent="writer_agent", **_request())
+
+    # Served from the response cache, not the model, and still recorded
+    use_mode("record")
+    recorded = agents._create_completion(agent="writer_agent", **_request())
+    assert len(gateway.calls) == 1
+
+    monkeypatch.setenv("LLM_CACHE_ENABLED", "false")
+    use_mode("replay")
+    assert agents._create_completion(agent="writer_agent", **_request()) == recorded
+
+
+def test_tool_call_round_trip(use_mode):
+    calls = []
+
+    def search(query: str, max_results: int = 5):
+        calls.append(query)
+        return [{"title": f"{query} #{i}"} for i in range(max_results)]
+
+    tool = rt._recorded("tavily_search_tool", search)
+    use_mode("record")
+    recorded = tool(query="fusion", max_results=2)
+    use_mode("replay")
+    assert tool(query="fusion", max_results=2) == recorded
+    assert asyncio.run(rt._recorded_async("tavily_search_tool", _unreachable)(query="fusion", max_results=2)) == recorded
+    assert calls == ["fusion"]
+
+
+async def _unreachable(query: str, max_results: int = 5):
+    raise AssertionError("the tool was called during replay")
+
+
+def test_recorded_errors_are_replayed(use_mode):
+    def fail():
+        raise RuntimeError("service unavailable")
+
+    use_mode("record")
+    with pytest.raises(RuntimeError):
+        recorded_call("tavily_search_tool", {"query": "x"}, fail)
+    use_mode("replay")
+    with pytest.raises(RuntimeError, match="service unavailable"):
+        recorded_call("tavily_search_tool", {"query": "x"}, lambda: pytest.fail("called during replay"))
+    assert cassette.get_cassette_store().stats()["replayed"] == 1
+
+
+def test_key_ignores_the_date_line(tmp_path):
+    store = CassetteStore("record", path=str(tmp_path))
+
+    def key(text):
+        return store.key("chat_completion", {"messages": [{"role": "system", "content": text}]})
+
+    assert key("Today is 2025-01-01. Be concise.") == key("Today is 2026-10-18. Be concise.")
+    assert key("Today is 2025-01-01. Be concise.") != key("Today is 2025-01-01. Be thorough.")
+    assert store.key("a", {"q": 1}) != store.key("b", {"q": 1})
+
+
+@pytest.mark.parametrize("latency, expected", [("none", None), ("recorded", 1.5), ("0.25", 0.25)])
+def test_replay_latency(use_mode, monkeypatch, latency, expected):
+    store = use_mode("record")
+    store.save("tool", store.key("tool", {"q": 1}), {"request": {"q": 1}, "response": "ok", "seconds": 1.5})
+    use_mode("replay", latency)
+    sleeps = []
+    monkeypatch.setattr(cassette.time, "sleep", sleeps.append)
+    assert recorded_call("tool", {"q": 1}, lambda: pytest.fail("called during replay")) == "ok"
+    assert sleeps == ([] if expected is None else [expected])
+
+
+def test_async_replay_latency(use_mode, monkeypatch):
+    store = use_mode("record")
+    store.save("tool", store.key("tool", {"q": 1}), {"request": {"q": 1}, "response": "ok", "seconds": 0.05})
+    use_mode("replay", "recorded")
+    delays = []
+    real_sleep = asyncio.sleep
+
+    async def sleep(delay):
+        delays.append(delay)
+        await real_sleep(0)
+
+    monkeypatch.setattr(cassette.asyncio, "sleep", sleep)
+
+    async def fn():
+        raise AssertionError("called during replay")
+
+    assert asyncio.run(recorded_call_async("tool", {"q": 1}, fn)) == "ok"
+    assert delays == [0.05]
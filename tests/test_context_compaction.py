@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+import src.context_compaction as cc
+from src.context_compaction import compact_history, count_tokens, html_to_text, truncate_to_tokens
+
+
+def _html_table(rows):
+    cells = "".join(
+        f"<tr><td>{title}</td><td><a href='{url}'>link</a></td><td>{text}</td></tr>" for title, url, text in rows
+    )
+    return f"<div><h2>Results</h2><table>{cells}</table><script>var x = 1;</script></div>"
+
+
+def _prose(words, url_every=0):
+    lines = []
+    for i in range(words // 10):
+        line = " ".join(f"word{i}x{j}" for j in range(10))
+        if url_every and i % url_every == 0:
+            line += f" see https://example.org/paper/{i}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def test_html_to_text_flattens_tables_and_keeps_links():
+    text = html_to_text(_html_table([("Attention", "https://arxiv.org/abs/1706.03762", "Transformers")]))
+    assert text == "Results\nAttention | link (https://arxiv.org/abs/1706.03762) | Transformers"
+
+
+def test_html_to_text_leaves_plain_text_alone():
+    text = "Plain findings, 3 < 4 and no markup.\n\nSecond paragraph."
+    assert html_to_text(text) == text
+
+
+def test_short_text_is_not_truncated():
+    assert truncate_to_tokens("short text", 50) == "short text"
+
+
+@pytest.mark.parametrize("max_tokens", [40, 120, 400])
+def test_truncation_respects_the_budget(max_tokens):
+    text = _prose(2000, url_every=5)
+    out = truncate_to_tokens(text, max_tokens)
+    assert count_tokens(out) <= max_tokens
+    assert out.startswith("word0x0 word0x1")
+    assert "tokens omitted]" in out
+
+
+def test_truncation_lists_urls_from_the_cut_part():
+    text = _prose(2000, url_every=20)
+    out = truncate_to_tokens(text, 300)
+    body, sources = out.split("\nSources:\n")
+    assert "https://example.org/paper/0" in body
+    listed = sources.splitlines()
+    assert listed[0] == "https://example.org/paper/20"
+    assert all(url not in body for url in listed)
+
+
+def test_a_long_single_line_is_cut_to_fit():
+    out = truncate_to_tokens("x" * 4000, 100)
+    assert out.startswith("x" * 100)
+    assert count_tokens(out) <= 100
+
+
+def test_recent_steps_stay_verbatim_and_older_html_is_stripped():
+    outputs = [_html_table([("Old", "https://example.org/old", "research")]), "<p>draft</p>", "feedback"]
+    compacted, report = compact_history(outputs, reserved_tokens=0, budget=10000, recent_steps=2)
+    assert compacted[0] == "Results\nOld | link (https://example.org/old) | research"
+    assert compacted[1:] == outputs[1:]
+    assert report["steps_compacted"] == 1
+    assert report["tokens_before"] == sum(count_tokens(o) for o in outputs)
+    assert report["tokens_after"] == sum(count_tokens(o) for o in compacted)
+    assert report["tokens_after"] < report["tokens_before"]
+
+
+def test_history_within_the_recent_window_is_untouched():
+    outputs = ["<p>a</p>", "<p>b</p>"]
+    compacted, report = compact_history(outputs, reserved_tokens=0, budget=10, recent_steps=2)
+    assert compacted == outputs
+    assert report == {"tokens_before": 4, "tokens_after": 4, "steps_compacted": 0}
+
+
+def test_older_steps_share_the_remaining_budget_by_size():
+    big, small = _prose(4000), _prose(1000)
+    recent = "the latest draft"
+    compacted, report = compact_history([big, small, recent], reserved_tokens=500, budget=2500, recent_steps=1)
+    available = 2500 - 500 - count_tokens(recent)
+    assert compacted[2] == recent
+    assert count_tokens(compacted[0]) + count_tokens(compacted[1]) <= available
+    assert count_tokens(compacted[0]) > 3 * count_tokens(compacted[1])
+    assert report["steps_compacted"] == 2
+    assert report["tokens_after"] == sum(count_tokens(o) for o in compacted)
+
+
+def test_each_older_step_keeps_the_minimum_allowance(monkeypatch):
+    monkeypatch.setattr(cc, "CONTEXT_MIN_STEP_TOKENS", 200)
+    outputs = [_prose(4000), _prose(4000), "recent"]
+    compacted, _ = compact_history(outputs, reserved_tokens=5000, budget=1000, recent_steps=1)
+    for out in compacted[:2]:
+        assert 150 < count_tokens(out) <= 200
+
+
+def test_compaction_can_be_switched_off(monkeypatch):
+    monkeypatch.setattr(cc, "CONTEXT_COMPACTION", False)
+    outputs = [_prose(4000), "<p>x</p>", "recent"]
+    compacted, report = compact_history(outputs, reserved_tokens=0, budget=100, recent_steps=1)
+    assert compacted == outputs
+    assert report["tokens_after"] == report["tokens_before"]
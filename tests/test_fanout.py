@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import src.fanout as fanout
+from src.fanout import AdaptiveLimiter
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=1000.0, perf_counter=time.perf_counter)
+    clock.monotonic = lambda: clock.now
+    monkeypatch.setattr(fanout, "time", clock)
+    return clock
+
+
+def _wait_for(predicate):
+    deadline = time.monotonic() + 5
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def test_limit_starts_within_bounds():
+    assert AdaptiveLimiter(initial=50, min_limit=1, max_limit=8).limit == 8
+    assert AdaptiveLimiter(initial=0, min_limit=2, max_limit=8).limit == 2
+
+
+def test_saturated_healthy_calls_raise_the_limit_additively():
+    limiter = AdaptiveLimiter(initial=2, min_limit=1, max_limit=3)
+    for _ in range(3):
+        limiter.acquire()
+        limiter.acquire()
+        limiter.release(1.0)  # made while both slots were in use
+        limiter.release(1.0)
+    # 2 -> 2.5 -> 2.9 -> 3 (capped)
+    assert limiter.limit == 3
+    assert limiter.stats()["increases"] == 1
+
+
+def test_unsaturated_or_slow_calls_hold_the_limit():
+    limiter = AdaptiveLimiter(initial=2, min_limit=1, max_limit=8)
+    limiter.acquire()
+    limiter.release(1.0)
+    assert limiter.limit == 2
+    limiter.acquire()
+    limiter.acquire()
+    limiter.release(10.0)
+    assert limiter.limit == 2
+
+
+def test_overload_halves_the_limit_once_per_latency(clock):
+    limiter = AdaptiveLimiter(initial=8, min_limit=1, max_limit=8)
+    limiter.overloaded()
+    limiter.overloaded()
+    assert limiter.limit == 4
+    clock.now += 1.5
+    limiter.overloaded()
+    assert limiter.limit == 2
+    for _ in range(5):
+        clock.now += 1.5
+        limiter.overloaded()
+    assert limiter.limit == 1
+    stats = limiter.stats()
+    assert stats["overloads"] == 8
+    assert stats["decreases"] == 3
+
+
+def test_a_rising_error_rate_cuts_the_limit(clock):
+    limiter = AdaptiveLimiter(initial=8, min_limit=1, max_limit=8)
+    for _ in range(3):
+        limiter.acquire()
+        limiter.release(1.0, ok=False)
+    assert limiter.limit == 4
+    assert limiter.stats()["errors"] == 3
+
+
+def test_waiters_are_served_in_fifo_order():
+    limiter = AdaptiveLimiter(initial=1, min_limit=1, max_limit=1)
+    limiter.acquire()
+    order = []
+
+    def worker(n):
+        with limiter.slot():
+            order.append(n)
+
+    threads = []
+    for n in range(3):
+        t = threading.Thread(target=worker, args=(n,))
+        t.start()
+        threads.append(t)
+        _wait_for(lambda: limiter.stats()["waiting"] == n + 1)
+    limiter.release(0.1)
+    for t in threads:
+        t.join(5)
+    assert order == [0, 1, 2]
+    assert limiter.stats()["in_flight"] == 0
+
+
+def test_async_slots_respect_the_limit():
+    limiter = AdaptiveLimiter(initial=2, min_limit=2, max_limit=2)
+    running = []
+    peak = []
+
+    async def call():
+        async with limiter.slot_async():
+            running.append(1)
+            peak.append(len(running))
+            await asyncio.sleep(0.01)
+            running.pop()
+
+    async def run():
+        await asyncio.gather(*(call() for _ in range(6)))
+
+    asyncio.run(run())
+    assert max(peak) == 2
+    assert limiter.stats()["in_flight"] == 0
+
+
+def test_cancelled_async_waiter_leaves_the_queue():
+    limiter = AdaptiveLimiter(initial=1, min_limit=1, max_limit=1)
+
+    async def run():
+        await limiter.acquire_async()
+        waiter = asyncio.create_task(limiter.acquire_async())
+        await asyncio.sleep(0)
+        assert limiter.stats()["waiting"] == 1
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        limiter.release(0.1)
+
+    asyncio.run(run())
+    stats = limiter.stats()
+    assert stats["waiting"] == 0
+    assert stats["in_flight"] == 0
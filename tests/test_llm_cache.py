@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import time
+
+import pytest
+
+import src.llm_cache as lc
+from src.llm_cache import LLMCache, cached_call, cached_call_async, llm_cache_scope
+
+
+def _response(text, finish_reason="stop", tokens=10):
+    return {
+        "choices": [{"message": {"content": text}, "finish_reason": finish_reason}],
+        "usage": {"total_tokens": tokens},
+    }
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = LLMCache(path=str(tmp_path / "llm.db"), agents="writer_agent")
+    monkeypatch.setenv("LLM_CACHE_ENABLED", "true")
+    monkeypatch.setattr(lc, "llm_cache", cache)
+    return cache
+
+
+def _call(request, text, agent="writer_agent", calls=None, finish_reason="stop", fresh=False):
+    def fn():
+        if calls is not None:
+            calls.append(request)
+        return _response(text, finish_reason=finish_reason)
+
+    return cached_call(agent, request, fn, encode=dict, decode=dict, fresh=fresh)
+
+
+def test_identical_requests_are_served_from_the_cache(cache):
+    calls = []
+    first = _call({"messages": ["hi"]}, "one", calls=calls)
+    second = _call({"messages": ["hi"]}, "two", calls=calls)
+    assert second == first
+    assert len(calls) == 1
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["tokens_saved"] == 10
+
+
+def test_any_request_difference_is_a_miss(cache):
+    calls = []
+    _call({"messages": ["hi"], "temperature": 0}, "one", calls=calls)
+    _call({"messages": ["hi"], "temperature": 1}, "two", calls=calls)
+    assert len(calls) == 2
+
+
+def test_agents_outside_the_list_are_not_cached(cache):
+    calls = []
+    _call({"messages": ["hi"]}, "one", agent="research_agent", calls=calls)
+    _call({"messages": ["hi"]}, "two", agent="research_agent", calls=calls)
+    assert len(calls) == 2
+    assert cache.stats()["entries"] == 0
+
+
+def test_truncated_responses_are_not_cached(cache):
+    _call({"messages": ["hi"]}, "cut", finish_reason="length")
+    assert cache.stats()["entries"] == 0
+
+
+def test_fresh_calls_bypass_and_replace_the_entry(cache):
+    _call({"messages": ["hi"]}, "old")
+    assert _call({"messages": ["hi"]}, "new", fresh=True)["choices"][0]["message"]["content"] == "new"
+    with llm_cache_scope(fresh=True):
+        assert _call({"messages": ["hi"]}, "newer")["choices"][0]["message"]["content"] == "newer"
+    assert _call({"messages": ["hi"]}, "unused")["choices"][0]["message"]["content"] == "newer"
+    assert cache.stats()["bypassed"] == 2
+
+
+def test_scope_collects_the_hits_of_its_calls(cache):
+    _call({"messages": ["hi"]}, "one")
+    with llm_cache_scope() as scope:
+        _call({"messages": ["hi"]}, "two")
+    assert [hit["agent"] for hit in scope["hits"]] == ["writer_agent"]
+    assert "1 model call(s)" in lc.llm_cache_hits_summary(scope["hits"])
+
+
+def test_expired_entries_are_refetched(cache, monkeypatch):
+    cache.ttl = 60
+    calls = []
+    _call({"messages": ["hi"]}, "one", calls=calls)
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 120)
+    _call({"messages": ["hi"]}, "two", calls=calls)
+    assert len(calls) == 2
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    size = len(lc.json.dumps(_response("x" * 100)).encode("utf-8"))
+    cache = LLMCache(path=str(tmp_path / "llm.db"), max_bytes=2 * size + 10)
+    cache.put("a", "w", _response("x" * 100))
+    time.sleep(0.01)
+    cache.put("b", "w", _response("y" * 100))
+    time.sleep(0.01)
+    cache.get("a")
+    time.sleep(0.01)
+    cache.put("c", "w", _response("z" * 100))
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+
+
+def test_disabled_cache_calls_through(monkeypatch):
+    monkeypatch.setenv("LLM_CACHE_ENABLED", "false")
+    calls = []
+    _call({"messages": ["hi"]}, "one", calls=calls)
+    _call({"messages": ["hi"]}, "two", calls=calls)
+    assert len(calls) == 2
+
+
+def test_async_calls_share_the_cache(cache):
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        return _response("async")
+
+    async def run():
+        first = await cached_call_async("writer_agent", {"messages": ["a"]}, fn, encode=dict, decode=dict)
+        second = await cached_call_async("writer_agent", {"messages": ["a"]}, fn, encode=dict, decode=dict)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first == second
+    assert len(calls) == 1
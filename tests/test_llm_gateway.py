@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import src.llm_gateway as lg
+from src.llm_gateway import DeploymentBudget, LLMGateway
+
+
+class _StatusError(Exception):
+    """Stands in for an openai APIStatusError: a status code and the response headers."""
+
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers=headers or {})
+
+
+def _usage(total, prompt=0, cached=0):
+    return SimpleNamespace(
+        total_tokens=total, prompt_tokens=prompt, prompt_tokens_details=SimpleNamespace(cached_tokens=cached)
+    )
+
+
+class _Client:
+    """chat.completions.create stand-in that plays back a script of responses and errors."""
+
+    def __init__(self, *script):
+        self.script = list(script)
+        self.calls = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        step = self.script.pop(0)
+        if isinstance(step, Exception):
+            raise step
+        return step
+
+
+class _AsyncClient(_Client):
+    async def _create(self, **kwargs):
+        return _Client.create(self, **kwargs)
+
+    def __init__(self, *script):
+        super().__init__(*script)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(lg, "time", clock)
+    monkeypatch.setattr(lg, "LLM_RETRY_BASE", 0.0)
+    overloads = []
+    monkeypatch.setattr(lg, "get_fanout_limiter", lambda: SimpleNamespace(overloaded=lambda: overloads.append(1)))
+    clock.overloads = overloads
+    return clock
+
+
+def _request(**kwargs):
+    return {"model": "dep", "messages": [{"role": "user", "content": "hi"}], "max_completion_tokens": 10, **kwargs}
+
+
+def test_budget_holds_requests_past_the_rpm(clock):
+    budget = DeploymentBudget(rpm=2, tpm=0)
+    assert budget.reserve(1)[1] == 0
+    clock.now += 10
+    assert budget.reserve(1)[1] == 0
+    entry, wait = budget.reserve(1)
+    assert entry is None
+    assert wait == pytest.approx(50)
+    clock.now += 50
+    assert budget.reserve(1)[1] == 0
+
+
+def test_budget_settles_estimates_to_actual_usage(clock):
+    budget = DeploymentBudget(rpm=0, tpm=100)
+    entry, _ = budget.reserve(60)
+    assert budget.reserve(60)[0] is None
+    budget.settle(entry, 10)
+    assert budget.tokens == 10
+    assert budget.reserve(60)[1] == 0
+    assert budget.counters["tokens"] == 10
+
+
+def test_budget_lets_an_oversized_request_through_an_empty_window(clock):
+    budget = DeploymentBudget(rpm=0, tpm=100)
+    entry, wait = budget.reserve(500)
+    assert entry is not None and wait == 0
+
+
+def test_parse_rate_limits():
+    assert lg._parse_rate_limits("a=500/200000, b=10,bad") == {"a": (500, 200000), "b": (10, 0)}
+
+
+def test_retry_after_headers():
+    assert lg._retry_after(_StatusError(429, {"retry-after-ms": "1500"})) == 1.5
+    assert lg._retry_after(_StatusError(429, {"retry-after": "3"})) == 3.0
+    assert lg._retry_after(_StatusError(429)) is None
+
+
+def test_create_settles_usage(clock):
+    client = _Client(SimpleNamespace(usage=_usage(42, prompt=30, cached=20)))
+    gateway = LLMGateway(client=client)
+    gateway.create(**_request())
+    stats = gateway.stats()["dep"]
+    assert stats["requests"] == 1
+    assert stats["tokens"] == 42
+    assert stats["tokens_last_minute"] == 42
+    assert stats["cached_tokens"] == 20
+
+
+def test_rate_limited_calls_wait_for_retry_after_and_pause_the_deployment(clock):
+    client = _Client(_StatusError(429, {"retry-after": "5"}), SimpleNamespace(usage=_usage(7)))
+    gateway = LLMGateway(client=client)
+    gateway.create(**_request())
+    assert len(client.calls) == 2
+    assert sum(clock.sleeps) == pytest.approx(5)
+    stats = gateway.stats()["dep"]
+    assert stats["retries"] == 1
+    assert stats["rate_limited"] == 1
+    assert stats["tokens"] == 7
+    assert clock.overloads == [1]
+
+
+def test_server_errors_are_retried_and_client_errors_are_not(clock):
+    client = _Client(_StatusError(503), SimpleNamespace(usage=_usage(1)))
+    LLMGateway(client=client).create(**_request())
+    assert len(client.calls) == 2
+
+    client = _Client(_StatusError(400))
+    with pytest.raises(_StatusError):
+        LLMGateway(client=client).create(**_request())
+    assert len(client.calls) == 1
+
+
+def test_retries_give_up_after_the_limit(clock, monkeypatch):
+    monkeypatch.setattr(lg, "LLM_MAX_RETRIES", 2)
+    client = _Client(*[_StatusError(500) for _ in range(3)])
+    with pytest.raises(_StatusError):
+        LLMGateway(client=client).create(**_request())
+    assert len(client.calls) == 3
+
+
+def test_streamed_usage_is_settled_when_the_last_chunk_arrives(clock):
+    chunks = [SimpleNamespace(usage=None), SimpleNamespace(usage=_usage(9))]
+    gateway = LLMGateway(client=_Client(iter(chunks)))
+    stream = gateway.create(**_request(stream=True))
+    assert list(stream) == chunks
+    assert gateway.stats()["dep"]["tokens"] == 9
+
+
+def test_create_async_retries(clock):
+    client = _AsyncClient(_StatusError(502), SimpleNamespace(usage=_usage(3)))
+    gateway = LLMGateway(client=_Client(), async_client=client)
+    asyncio.run(gateway.create_async(**_request()))
+    assert len(client.calls) == 2
+    assert gateway.stats()["dep"]["retries"] == 1
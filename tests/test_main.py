@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+import uuid
+
+import pytest
+
+
+@pytest.fixture
+def task(main_app, monkeypatch):
+    """A task row and its progress entry, with a three-step plan whose first two steps are independent."""
+    steps = ["Research A", "Research B", "Write the report"]
+    task_id = f"test-{uuid.uuid4()}"
+    db = main_app.SessionLocal()
+    db.add(main_app.Task(id=task_id, prompt="prompt", status="running"))
+    db.commit()
+    db.close()
+    main_app.task_progress[task_id] = {
+        "steps": [{"title": s, "status": "pending", "description": "", "substeps": []} for s in steps]
+    }
+    monkeypatch.setattr(main_app, "WORKFLOW_DAG", True)
+    monkeypatch.setattr(main_app, "plan_dependencies", lambda plan: [[], [], [0, 1]])
+    yield task_id, steps
+    main_app.task_progress.pop(task_id, None)
+
+
+def _task_row(main_app, task_id):
+    db = main_app.SessionLocal()
+    try:
+        row = db.query(main_app.Task).filter(main_app.Task.id == task_id).first()
+        return row.status, row.result
+    finally:
+        db.close()
+
+
+def test_async_workflow_runs_the_plan_and_saves_the_report(main_app, task, monkeypatch):
+    task_id, steps = task
+    calls, running, peak = [], [0], [0]
+
+    async def step(title, history, prompt, advanced_options):
+        calls.append((title, [h[0] for h in history]))
+        running[0] += 1
+        peak[0] = max(peak[0], running[0])
+        await asyncio.sleep(0.02)
+        running[0] -= 1
+        return f"Do: {title}", "writer_agent", f"Output of {title}"
+
+    monkeypatch.setattr(main_app, "executor_agent_step_async", step)
+    asyncio.run(main_app.run_agent_workflow_async(task_id, "prompt", steps))
+
+    # Independent steps overlap; the last one sees both of their outputs
+    assert peak[0] == 2
+    assert calls[-1] == ("Write the report", ["Research A", "Research B"])
+    steps_data = main_app.task_progress[task_id]["steps"]
+    assert [s["status"] for s in steps_data] == ["done"] * 3
+    assert steps_data[2]["depends_on"] == [1, 2]
+    status, result = _task_row(main_app, task_id)
+    assert status == "done"
+    assert json.loads(result)["html_report"] == "Output of Write the report"
+
+
+def test_async_workflow_marks_a_failed_step_and_the_task(main_app, task, monkeypatch):
+    task_id, steps = task
+
+    async def step(title, history, prompt, advanced_options):
+        if title == "Research B":
+            raise RuntimeError("search failed")
+        return title, "research_agent", "ok"
+
+    monkeypatch.setattr(main_app, "executor_agent_step_async", step)
+    asyncio.run(main_app.run_agent_workflow_async(task_id, "prompt", steps))
+
+    steps_data = main_app.task_progress[task_id]["steps"]
+    assert [s["status"] for s in steps_data] == ["done", "error", "pending"]
+    assert "search failed" in steps_data[1]["description"]
+    assert _task_row(main_app, task_id)[0] == "error"
+
+
+class _Request:
+    async def is_disconnected(self):
+        return False
+
+
+def _sse_events(main_app, task_id):
+    """Call /task_stream/{task_id} and parse the server-sent events it returns."""
+
+    async def run():
+        response = await main_app.stream_task(task_id, _Request())
+        return "".join([chunk async for chunk in response.body_iterator])
+
+    body = asyncio.run(run())
+    return [json.loads(line[len("data: "):]) for line in body.splitlines() if line.startswith("data: ")]
+
+
+@pytest.fixture
+def streams(monkeypatch):
+    import src.task_stream as ts
+
+    fresh = ts.TaskStreams()
+    monkeypatch.setattr(ts, "task_streams", fresh)
+    return fresh
+
+
+def test_task_stream_replays_the_backlog_then_done(main_app, task, streams):
+    task_id, _ = task
+    streams.publish(task_id, {"type": "step", "step": 3, "title": "Write the report"})
+    for text in ("Intro", "duction"):
+        streams.publish(task_id, {"type": "delta", "step": 3, "agent": "writer_agent", "part": "report", "text": text})
+    main_app.close_task_stream(task_id, "done")
+    events = _sse_events(main_app, task_id)
+    assert [e["type"] for e in events] == ["step", "delta", "done"]
+    assert events[1]["text"] == "Introduction"
+
+
+@pytest.mark.parametrize("statuses, expected", [(["done"] * 3, "done"), (["done", "error", "error"], "error")])
+def test_a_finished_task_whose_stream_was_purged_gets_one_done(main_app, task, streams, statuses, expected):
+    task_id, _ = task
+    for step, status in zip(main_app.task_progress[task_id]["steps"], statuses):
+        step["status"] = status
+    assert _sse_events(main_app, task_id) == [{"type": "done", "status": expected}]
+
+
+def test_task_stream_of_an_unknown_task_is_not_found(main_app):
+    with pytest.raises(main_app.HTTPException) as e:
+        asyncio.run(main_app.stream_task("no-such-task", _Request()))
+    assert e.value.status_code == 404
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+import time
+
+from src.paper_index import PaperIndex
+
+
+def _paper(n, title, text="", authors=None):
+    return {
+        "title": title,
+        "authors": authors or ["Ada Lovelace"],
+        "published": "2024-01-01",
+        "url": f"https://arxiv.org/abs/2401.0000{n}v1",
+        "summary": text,
+        "link_pdf": f"https://arxiv.org/pdf/2401.0000{n}v1",
+    }
+
+
+def test_add_and_search_ranks_title_matches_first(tmp_path):
+    index = PaperIndex(path=str(tmp_path / "papers.db"))
+    assert index.add(_paper(1, "A survey of optimizers", "graph neural networks appear once"), "abstract")
+    assert index.add(_paper(2, "Graph neural networks", "message passing"), "abstract")
+    results = index.search("graph neural networks", limit=5)
+    assert [r["title"] for r in results] == ["Graph neural networks", "A survey of optimizers"]
+    assert results[0]["authors"] == ["Ada Lovelace"]
+    assert results[0]["summary"] == "message passing"
+    assert index.search("quantum", limit=5) == []
+    assert index.search("graph", limit=0) == []
+
+
+def test_add_without_an_arxiv_id_is_rejected(tmp_path):
+    index = PaperIndex(path=str(tmp_path / "papers.db"))
+    assert not index.add({"title": "x", "url": "https://example.org/x"}, "")
+    assert index.stats()["papers"] == 0
+
+
+def test_readding_a_paper_replaces_it(tmp_path):
+    index = PaperIndex(path=str(tmp_path / "papers.db"))
+    index.add(_paper(1, "Old title", "old words"), "")
+    index.add(_paper(1, "New title", "new words"), "")
+    assert index.stats()["papers"] == 1
+    assert index.search("old", limit=5) == []
+    assert [r["title"] for r in index.search("new", limit=5)] == ["New title"]
+
+
+def test_papers_falls_back_to_the_abstract_without_text(tmp_path):
+    index = PaperIndex(path=str(tmp_path / "papers.db"))
+    index.add(_paper(1, "Title"), "the abstract")
+    found = index.papers(["2401.00001", "2401.09999"])
+    assert list(found) == ["2401.00001"]
+    assert found["2401.00001"]["summary"] == "the abstract"
+    assert index.papers([]) == {}
+
+
+def test_remembered_query_is_served_locally(tmp_path):
+    index = PaperIndex(path=str(tmp_path / "papers.db"))
+    items = [_paper(1, "One", "a"), _paper(2, "Two", "b")]
+    for item in items:
+        index.add(item, "")
+    index.remember_query("q", items, requested=2, exhausted=False)
+    assert [r["title"] for r in index.lookup_query("q", 2)] == ["One", "Two"]
+    assert [r["title"] for r in index.lookup_query("q", 1)] == ["One"]
+    # More than was asked for last time, and the API had more to give
+    assert index.lookup_query("q", 3) is None
+    assert index.lookup_query("other", 1) is None
+    stats = index.stats()
+    assert stats["queries_local"] == 2
+    assert stats["papers_served"] == 3
+
+
+def test_exhausted_query_covers_larger_requests(tmp_path):
+    index = PaperIndex(path=str(tmp_path / "papers.db"))
+    item = _paper(1, "Only", "a")
+    index.add(item, "")
+    index.remember_query("q", [item], requested=5, exhausted=True)
+    assert [r["title"] for r in index.lookup_query("q", 10)] == ["Only"]
+
+
+def test_query_with_a_missing_paper_is_not_served(tmp_path):
+    index = PaperIndex(path=str(tmp_path / "papers.db"))
+    items = [_paper(1, "One", "a"), _paper(2, "Two", "b")]
+    index.add(items[0], "")
+    index.remember_query("q", items, requested=2, exhausted=False)
+    assert index.lookup_query("q", 2) is None
+
+
+def test_expired_queries_and_stale_papers_are_not_served(tmp_path):
+    index = PaperIndex(path=str(tmp_path / "papers.db"), max_age_days=1, query_ttl_hours=1)
+    item = _paper(1, "Graph", "graph")
+    index.add(item, "")
+    index.remember_query("q", [item], requested=1, exhausted=False)
+    conn = index._conn()
+    conn.execute("UPDATE queries SET fetched_at = ?", (time.time() - 7200,))
+    assert index.lookup_query("q", 1) is None
+
+    conn.execute("UPDATE papers SET fetched_at = ?", (time.time() - 2 * 86400,))
+    assert index.search("graph", limit=5) == []
+    assert index.papers(["2401.00001"]) == {}
+    # The next write prunes what can no longer be served
+    index.remember_query("other", [], requested=1, exhausted=True)
+    stats = index.stats()
+    assert stats["papers"] == 0
+    assert stats["queries"] == 1
+
+
+def test_processes_share_the_index(tmp_path):
+    path = str(tmp_path / "papers.db")
+    PaperIndex(path=path).add(_paper(1, "Shared", "text"), "")
+    assert [r["title"] for r in PaperIndex(path=path).search("shared", limit=1)] == ["Shared"]
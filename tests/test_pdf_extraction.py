@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+from src.pdf_extraction import PdfExtractionService, _address_space
+from src.pdf_text import clean_text, pdf_bytes_to_text
+
+
+def _pdf_bytes(pages):
+    pymupdf = pytest.importorskip("pymupdf")
+    doc = pymupdf.open()
+    for text in pages:
+        doc.new_page().insert_text((72, 72), text)
+    return doc.tobytes()
+
+
+def test_clean_text_joins_hyphenation_and_collapses_whitespace():
+    assert clean_text("transfor-\nmers   are\r\n\n\n\ngreat ") == "transformers are\n\ngreat"
+
+
+def test_extraction_stops_at_the_page_limit():
+    pdf = _pdf_bytes([f"Page number {i}" for i in range(5)])
+    text = pdf_bytes_to_text(pdf, max_pages=2)
+    assert "Page number 1" in text
+    assert "Page number 2" not in text
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="reads /proc")
+def test_address_space_is_reported():
+    assert _address_space() > 0
+
+
+def test_service_extracts_in_a_worker_process(tmp_path):
+    path = tmp_path / "paper.pdf"
+    path.write_bytes(_pdf_bytes(["Attention is all you need", "Second page"]))
+    service = PdfExtractionService(max_workers=1, timeout=60, max_memory_mb=512)
+    try:
+        text = service.extract(str(path))
+    finally:
+        service.shutdown()
+    assert "Attention is all you need" in text
+    assert "Second page" in text
+
+
+def _concurrently(*calls):
+    """Run the calls in parallel threads; returns each one's result or exception, in order."""
+    results = [None] * len(calls)
+
+    def run(i, call):
+        try:
+            results[i] = call()
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=run, args=(i, call)) for i, call in enumerate(calls)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(120)
+    return results
+
+
+@pytest.fixture
+def service():
+    service = PdfExtractionService(max_workers=2, timeout=60, max_memory_mb=0)
+    yield service
+    service.shutdown()
+
+
+@pytest.fixture
+def paper(tmp_path):
+    path = tmp_path / "paper.pdf"
+    path.write_bytes(_pdf_bytes(["Attention is all you need"]))
+    return str(path)
+
+
+def test_a_crashed_worker_fails_only_its_own_job(service, paper):
+    crashed, healthy = _concurrently(
+        lambda: service._call(os._exit, (1,), 60),
+        lambda: service.extract(paper),
+    )
+    assert isinstance(crashed, RuntimeError)
+    assert "Attention is all you need" in healthy
+    assert "Attention is all you need" in service.extract(paper)
+
+
+def test_a_hung_job_times_out_without_touching_other_jobs(service, paper):
+    started = time.monotonic()
+    hung, healthy = _concurrently(
+        lambda: service._call(time.sleep, (60,), 5),
+        lambda: service.extract(paper),
+    )
+    assert isinstance(hung, TimeoutError)
+    assert time.monotonic() - started < 30
+    assert "Attention is all you need" in healthy
+    assert "Attention is all you need" in service.extract(paper)
+
+
+def test_extraction_errors_are_raised_and_keep_the_worker(service, tmp_path):
+    with pytest.raises(RuntimeError, match="PDF text extraction failed"):
+        service.extract(str(tmp_path / "missing.pdf"))
+    assert len(service._idle) == 1
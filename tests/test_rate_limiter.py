@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import threading
+import time
+
+import pytest
+
+from src.rate_limiter import RateLimitTimeout, TokenBucketLimiter, _LocalTokenBucketLimiter
+
+
+@pytest.fixture(params=["sqlite", "local"])
+def limiter(request, tmp_path):
+    if request.param == "sqlite":
+        return TokenBucketLimiter(path=str(tmp_path / "rate_limits.db"))
+    return _LocalTokenBucketLimiter()
+
+
+def test_burst_up_to_capacity_then_wait(limiter):
+    assert limiter._try_take("api", rate=1.0, capacity=2) == 0
+    assert limiter._try_take("api", rate=1.0, capacity=2) == 0
+    wait = limiter._try_take("api", rate=1.0, capacity=2)
+    assert 0 < wait <= 1.0
+
+
+def test_buckets_are_independent(limiter):
+    assert limiter._try_take("a", rate=0.1, capacity=1) == 0
+    assert limiter._try_take("b", rate=0.1, capacity=1) == 0
+    assert limiter._try_take("a", rate=0.1, capacity=1) > 0
+
+
+def test_acquire_waits_for_the_refill(limiter):
+    limiter.acquire("api", rate=20.0)
+    waited = limiter.acquire("api", rate=20.0)
+    assert 0.02 <= waited < 0.5
+
+
+def test_acquire_gives_up_after_the_timeout(limiter):
+    limiter.acquire("api", rate=0.01)
+    with pytest.raises(RateLimitTimeout):
+        limiter.acquire("api", rate=0.01, timeout=0.1)
+
+
+def test_acquire_async_waits_without_blocking_the_loop(limiter):
+    async def main():
+        ticks = []
+
+        async def ticker():
+            for _ in range(5):
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.01)
+
+        await limiter.acquire_async("api", rate=10.0)
+        waited, _ = await asyncio.gather(limiter.acquire_async("api", rate=10.0), ticker())
+        return waited, ticks
+
+    waited, ticks = asyncio.run(main())
+    assert waited >= 0.05
+    assert len(ticks) == 5
+
+
+def test_threads_share_one_sqlite_budget(tmp_path):
+    path = str(tmp_path / "rate_limits.db")
+    taken = []
+
+    def take():
+        # A separate limiter per thread stands in for separate worker processes
+        taken.append(TokenBucketLimiter(path=path)._try_take("api", rate=0.001, capacity=3) == 0)
+
+    threads = [threading.Thread(target=take) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert taken.count(True) == 3
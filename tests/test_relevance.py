@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+from src.relevance import BM25, _result_chars, _truncate, rank_tool_results, tokenize
+
+
+def _tool(items, query="", tool="tavily_search"):
+    return {"tool": tool, "args": {"query": query}, "result": items}
+
+
+def test_tokenize_drops_stopwords_and_single_characters():
+    assert tokenize("The Transformer is a model, x 2024") == ["transformer", "model", "2024"]
+
+
+def test_bm25_ranks_matching_documents_first():
+    bm25 = BM25(["graph neural networks", "protein folding with transformers", "cooking pasta"])
+    scores = bm25.scores("protein transformers")
+    assert scores[1] > scores[0]
+    assert scores[1] > scores[2]
+    assert scores[2] == 0
+
+
+def test_truncate_fits_exactly_within_budget():
+    item = {"title": "t", "url": "u", "content": "word " * 200}
+    cut = _truncate(item, 500)
+    assert _result_chars(cut) <= 500
+    assert cut["content"].endswith("...")
+
+
+def test_truncate_leaves_fitting_items_alone():
+    item = {"title": "t", "content": "short"}
+    assert _truncate(item, 100) is item
+
+
+def test_oversized_result_survives_truncation():
+    big = {"title": "Attention", "url": "https://example.org", "content": "attention " * 5000}
+    ranked, report = rank_tool_results([_tool([big], "attention")], "attention", char_budget=30000)
+    assert report["items_kept"] == 1
+    kept = ranked[0]["result"][0]
+    assert _result_chars(kept) <= 30000
+    assert kept["content"].endswith("...")
+    assert report["chars_kept"] <= 30000
+
+
+def test_top_k_per_tool_and_passthrough_entries():
+    items = [{"title": f"doc {i}", "content": "neural" if i % 2 else "unrelated"} for i in range(6)]
+    error = {"error": "timeout"}
+    ranked, report = rank_tool_results([_tool(items + [error], "neural")], "neural", top_k=2)
+    result = ranked[0]["result"]
+    assert report["items_in"] == 6
+    assert report["items_kept"] == 2
+    assert all(r["content"] == "neural" for r in result[:2])
+    assert result[-1] is error
+
+
+def test_non_list_results_pass_through():
+    tr = {"tool": "wikipedia_search", "args": {"query": "x"}, "result": "plain text"}
+    ranked, report = rank_tool_results([tr], "x")
+    assert ranked == [tr]
+    assert report["items_in"] == 0
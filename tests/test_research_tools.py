@@ -0,0 +1,384 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import os
+import time
+
+import pytest
+
+import src.research_tools as rt
+
+
+class _FakeTavily:
+    def __init__(self):
+        self.queries = []
+
+    def search(self, query, max_results, include_images):
+        self.queries.append((query, max_results, include_images))
+        results = [{"title": f"t{i}", "content": f"c{i}", "url": f"https://example.org/{i}"} for i in range(max_results)]
+        return {"results": results, "images": ["https://example.org/img.png"] if include_images else []}
+
+
+@pytest.fixture
+def tavily(monkeypatch):
+    client = _FakeTavily()
+    monkeypatch.setenv("TAVILY_API_KEY", "test-key")
+    monkeypatch.setattr(rt, "_tavily_client", client)
+    rt._tavily_cache.clear()
+    yield client
+    rt._tavily_cache.clear()
+
+
+def test_normalize_query():
+    assert rt.normalize_query("  Large   Language MODELS ") == "large language models"
+
+
+def test_tavily_results_are_cached_by_normalized_query(tavily):
+    first = rt.tavily_search_tool("Graph Neural Networks", max_results=5)
+    second = rt.tavily_search_tool("graph  neural networks", max_results=3)
+    assert len(tavily.queries) == 1
+    assert len(first) == 5
+    assert second == first[:3]
+
+
+def test_tavily_larger_request_misses_a_smaller_entry(tavily, monkeypatch):
+    monkeypatch.setenv("TAVILY_PREFETCH_RESULTS", "5")
+    rt.tavily_search_tool("protein folding", max_results=5)
+    rt.tavily_search_tool("protein folding", max_results=10)
+    assert [q[1] for q in tavily.queries] == [5, 10]
+
+
+def test_tavily_image_entry_answers_requests_without_images(tavily):
+    with_images = rt.tavily_search_tool("mars rover", max_results=2, include_images=True)
+    without = rt.tavily_search_tool("mars rover", max_results=2)
+    assert len(tavily.queries) == 1
+    assert {"image_url": "https://example.org/img.png"} in with_images
+    assert all("image_url" not in r for r in without)
+
+
+def test_time_sensitive_queries_use_the_fresh_window(tavily, monkeypatch):
+    now = time.time()
+    rt.tavily_search_tool("latest fusion energy news", max_results=2)
+    rt.tavily_search_tool("history of fusion energy", max_results=2)
+    monkeypatch.setattr(time, "time", lambda: now + rt.TAVILY_FRESH_MAX_AGE + 60)
+    rt.tavily_search_tool("latest fusion energy news", max_results=2)
+    rt.tavily_search_tool("history of fusion energy", max_results=2)
+    assert [q[0] for q in tavily.queries] == [
+        "latest fusion energy news",
+        "history of fusion energy",
+        "latest fusion energy news",
+    ]
+
+
+def test_tavily_errors_are_returned_not_cached(tavily, monkeypatch):
+    def fail(**kwargs):
+        raise RuntimeError("quota exceeded")
+
+    monkeypatch.setattr(tavily, "search", fail)
+    assert rt.tavily_search_tool("anything") == [{"error": "quota exceeded"}]
+    assert rt._tavily_cache.stats()["entries"] == 0
+
+
+class _FakeResponse:
+    def __init__(self, chunks, headers=None):
+        self.chunks = chunks
+        self.headers = headers or {}
+        self.closed = False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        yield from self.chunks
+
+    def close(self):
+        self.closed = True
+
+
+def test_spooled_pdf_rolls_over_to_disk(tmp_path, monkeypatch):
+    monkeypatch.setattr(rt.tempfile, "tempdir", str(tmp_path))
+    pdf = rt.SpooledPdf(spool_bytes=10)
+    pdf.write(b"%PDF-1.4 ")
+    assert pdf.path is None
+    assert pdf.source() == b"%PDF-1.4 "
+    pdf.write(b"more than ten bytes")
+    pdf.finish()
+    path = pdf.source()
+    assert isinstance(path, str)
+    with open(path, "rb") as f:
+        assert f.read() == b"%PDF-1.4 more than ten bytes"
+    pdf.close()
+    assert not os.path.exists(path)
+
+
+def test_fetch_pdf_to_buffer_streams_the_body(monkeypatch):
+    response = _FakeResponse([b"%PDF", b"-1.4"])
+    monkeypatch.setattr(rt.session, "get", lambda *a, **k: response)
+    with rt.fetch_pdf_to_buffer("https://arxiv.org/pdf/2101.00001", max_bytes=100) as pdf:
+        assert pdf.size == 8
+        assert pdf.source() == b"%PDF-1.4"
+    assert response.closed
+
+
+def test_fetch_pdf_to_buffer_rejects_an_announced_oversized_pdf(monkeypatch):
+    response = _FakeResponse([b"x"], headers={"Content-Length": "1000"})
+    monkeypatch.setattr(rt.session, "get", lambda *a, **k: response)
+    with pytest.raises(rt.PdfTooLargeError):
+        rt.fetch_pdf_to_buffer("https://arxiv.org/pdf/2101.00001", max_bytes=100)
+    assert response.closed
+
+
+def test_fetch_pdf_to_buffer_stops_reading_past_the_cap(monkeypatch):
+    read = []
+
+    def chunks():
+        for _ in range(10):
+            read.append(1)
+            yield b"x" * 40
+
+    response = _FakeResponse(chunks())
+    monkeypatch.setattr(rt.session, "get", lambda *a, **k: response)
+    with pytest.raises(rt.PdfTooLargeError):
+        rt.fetch_pdf_to_buffer("https://arxiv.org/pdf/2101.00001", max_bytes=100)
+    assert len(read) == 3
+
+
+def _feed(ids, total=None):
+    entries = "".join(
+        f"<entry><id>http://arxiv.org/abs/{i}v1</id><title>Paper {i}</title>"
+        f"<summary>Abstract {i}</summary><published>2024-01-01T00:00:00Z</published>"
+        f"<author><name>Author {i}</name></author></entry>"
+        for i in ids
+    )
+    header = f"<opensearch:totalResults>{total}</opensearch:totalResults>" if total is not None else ""
+    return (
+        '<feed xmlns="http://www.w3.org/2005/Atom" xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/">'
+        f"{header}{entries}</feed>"
+    ).encode()
+
+
+def test_arxiv_pages_split_searches_and_id_lists(monkeypatch):
+    monkeypatch.setattr(rt, "ARXIV_PAGE_SIZE", 2)
+    pages = list(rt._arxiv_pages("graph nets", 5))
+    assert [(size, is_search) for _, size, is_search in pages] == [(2, True), (2, True), (1, True)]
+    assert "search_query=all:graph%20nets" in pages[0][0]
+    assert "start=4&max_results=1" in pages[2][0]
+
+    pages = list(rt._arxiv_pages("", 0, id_list=["a", "b", "c"]))
+    assert [(size, is_search) for _, size, is_search in pages] == [(2, False), (1, False)]
+    assert "id_list=a,b" in pages[0][0]
+    assert "id_list=c" in pages[1][0]
+
+
+def test_arxiv_ids_normalizes_and_dedupes():
+    assert rt._arxiv_ids("2101.00001v2, https://arxiv.org/abs/2101.00002,2101.00001") == ["2101.00001", "2101.00002"]
+    assert rt._arxiv_ids(["hep-th/9901001", "not an id"]) == ["hep-th/9901001"]
+    assert rt._arxiv_ids(None) == []
+
+
+def test_in_id_order_follows_the_requested_ids():
+    items = [{"url": "http://arxiv.org/abs/2101.00002v1"}, {"url": "http://arxiv.org/abs/2101.00001v1"}]
+    ordered = rt._in_id_order(items, ["2101.00001", "2101.00002"])
+    assert [item["url"] for item in ordered] == [items[1]["url"], items[0]["url"]]
+    assert rt._in_id_order(items, None) is items
+
+
+def test_feed_parser_yields_entries_as_they_complete():
+    data = _feed(["2101.00001", "2101.00002"], total=7)
+    parser = rt.ArxivFeedParser()
+    split = data.index(b"</entry>") + len(b"</entry>")
+    first = parser.feed(data[:split])
+    assert [item["title"] for item in first] == ["Paper 2101.00001"]
+    rest = parser.feed(data[split:]) + parser.close()
+    assert [item["title"] for item in rest] == ["Paper 2101.00002"]
+    assert rest[0]["authors"] == ["Author 2101.00002"]
+    assert rest[0]["link_pdf"] == "https://arxiv.org/pdf/2101.00002v1.pdf"
+    assert parser.total == 7
+    assert parser.entries == 2
+
+
+def test_last_page_on_a_short_page_or_the_reported_total():
+    parser = rt.ArxivFeedParser()
+    parser.feed(_feed(["2101.00001", "2101.00002"], total=10))
+    parser.close()
+    assert not rt._last_page(parser, got=2, size=2)
+    assert rt._last_page(parser, got=2, size=3)
+    assert rt._last_page(parser, got=10, size=2)
+
+
+class _Pages:
+    """session.get stand-in serving one Atom page per request, or raising."""
+
+    def __init__(self, pages):
+        self.pages = list(pages)
+        self.urls = []
+
+    def get(self, url, **kwargs):
+        self.urls.append(url)
+        page = self.pages.pop(0)
+        if isinstance(page, Exception):
+            raise page
+        return _FakeResponse([page[:40], page[40:]])
+
+
+@pytest.fixture
+def arxiv_pages(monkeypatch):
+    monkeypatch.setattr(rt, "ARXIV_PAGE_SIZE", 2)
+    monkeypatch.setattr(rt, "_wait_for_arxiv", lambda url: None)
+
+    def install(*pages):
+        fake = _Pages(pages)
+        monkeypatch.setattr(rt.session, "get", fake.get)
+        return fake
+
+    return install
+
+
+def test_fetch_arxiv_feed_pages_until_the_results_run_out(arxiv_pages):
+    fake = arxiv_pages(_feed(["2101.00001", "2101.00002"], total=3), _feed(["2101.00003"], total=3))
+    out = rt._fetch_arxiv_feed("graph", 6)
+    assert [item["title"] for item in out] == ["Paper 2101.00001", "Paper 2101.00002", "Paper 2101.00003"]
+    assert len(fake.urls) == 2
+
+
+def test_fetch_arxiv_feed_keeps_pages_read_before_a_failure(arxiv_pages):
+    arxiv_pages(_feed(["2101.00001", "2101.00002"]), rt.requests.exceptions.RequestException("reset"))
+    out = rt._fetch_arxiv_feed("graph", 4)
+    assert [item["title"] for item in out] == ["Paper 2101.00001", "Paper 2101.00002"]
+
+
+def test_fetch_arxiv_feed_raises_when_the_first_page_fails(arxiv_pages):
+    arxiv_pages(rt.requests.exceptions.RequestException("down"))
+    with pytest.raises(rt.requests.exceptions.RequestException):
+        rt._fetch_arxiv_feed("graph", 4)
+
+
+def test_fetch_arxiv_feed_sends_id_lists_in_chunks(arxiv_pages):
+    fake = arxiv_pages(_feed(["2101.00001", "2101.00002"]), _feed(["2101.00003"]))
+    out = rt._fetch_arxiv_feed("", 0, id_list=["2101.00001", "2101.00002", "2101.00003"])
+    assert len(out) == 3
+    assert ["id_list=" in url for url in fake.urls] == [True, True]
+
+
+class _FakeAsyncTavily(_FakeTavily):
+    async def search(self, query, max_results, include_images):
+        await asyncio.sleep(0.02)
+        return _FakeTavily.search(self, query, max_results, include_images)
+
+
+def test_async_tavily_tool_shares_the_sync_cache(tavily, monkeypatch):
+    client = _FakeAsyncTavily()
+    monkeypatch.setattr(rt, "_async_tavily_client", client)
+    tool = rt.async_tool_mapping["tavily_search_tool"]
+
+    async def run():
+        # Identical concurrent calls are coalesced into one search
+        return await asyncio.gather(tool(query="dark matter", max_results=3), tool(query="dark matter", max_results=3))
+
+    first, second = asyncio.run(run())
+    assert first == second
+    assert len(client.queries) == 1
+    assert rt.tool_mapping["tavily_search_tool"](query="Dark  Matter", max_results=3) == first
+    assert tavily.queries == []
+
+
+class _FakeAsyncClient:
+    def __init__(self, **kwargs):
+        self.closed = False
+
+    async def aclose(self):
+        self.closed = True
+
+
+def test_async_http_client_is_kept_per_loop_and_closed(monkeypatch):
+    monkeypatch.setattr(rt.httpx, "AsyncClient", _FakeAsyncClient)
+    monkeypatch.setattr(rt, "_async_http", rt.weakref.WeakKeyDictionary())
+
+    async def use():
+        client = rt._get_async_http()
+        assert rt._get_async_http() is client
+        await rt.close_async_http()
+        return client
+
+    first = asyncio.run(use())
+    second = asyncio.run(use())
+    assert first is not second
+    assert first.closed and second.closed
+    assert len(rt._async_http) == 0
+
+
+def test_clients_of_closed_loops_are_dropped(monkeypatch):
+    monkeypatch.setattr(rt.httpx, "AsyncClient", _FakeAsyncClient)
+    monkeypatch.setattr(rt, "_async_http", rt.weakref.WeakKeyDictionary())
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(asyncio.sleep(0))
+        rt._async_http[loop] = _FakeAsyncClient()
+    finally:
+        loop.close()
+
+    async def use():
+        rt._get_async_http()
+        return list(rt._async_http.values())
+
+    assert len(asyncio.run(use())) == 1
+
+
+def test_fetch_arxiv_feed_skips_a_failed_id_chunk(arxiv_pages):
+    fake = arxiv_pages(
+        rt.requests.exceptions.RequestException("reset"),
+        _feed(["2101.00003", "2101.00004"]),
+        _feed(["2101.00005"]),
+    )
+    ids = [f"2101.0000{i}" for i in range(1, 6)]
+    out = rt._fetch_arxiv_feed("", 0, id_list=ids)
+    assert [item["title"] for item in out] == ["Paper 2101.00003", "Paper 2101.00004", "Paper 2101.00005"]
+    assert len(fake.urls) == 3
+
+
+def test_fetch_arxiv_feed_raises_when_every_id_chunk_fails(arxiv_pages):
+    arxiv_pages(rt.requests.exceptions.RequestException("down"), rt.requests.exceptions.RequestException("down"))
+    with pytest.raises(rt.requests.exceptions.RequestException):
+        rt._fetch_arxiv_feed("", 0, id_list=["2101.00001", "2101.00002", "2101.00003"])
+
+
+class _AsyncPage:
+    """An httpx streaming response (and its context manager) serving one Atom page, or raising on entry."""
+
+    def __init__(self, page):
+        self.page = page
+
+    async def __aenter__(self):
+        if isinstance(self.page, Exception):
+            raise self.page
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    async def aiter_bytes(self, size):
+        yield self.page
+
+
+class _AsyncPages:
+    def __init__(self, pages):
+        self.pages = list(pages)
+
+    def stream(self, method, url, timeout=None):
+        return _AsyncPage(self.pages.pop(0))
+
+
+def test_async_fetch_skips_a_failed_id_chunk(monkeypatch):
+    monkeypatch.setattr(rt, "ARXIV_PAGE_SIZE", 2)
+
+    async def no_wait(url):
+        pass
+
+    monkeypatch.setattr(rt, "_wait_for_arxiv_async", no_wait)
+    client = _AsyncPages([_feed(["2101.00001", "2101.00002"]), rt.httpx.HTTPError("reset"), _feed(["2101.00005"])])
+    monkeypatch.setattr(rt, "_get_async_http", lambda: client)
+    ids = [f"2101.0000{i}" for i in range(1, 6)]
+    out = asyncio.run(rt._fetch_arxiv_feed_async("", 0, id_list=ids))
+    assert [item["title"] for item in out] == ["Paper 2101.00001", "Paper 2101.00002", "Paper 2101.00005"]
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import hashlib
+
+from src.result_dedup import canonicalize_url, dedup_tool_results, simhash
+
+TEXT = (
+    "Transformers replace recurrence with self-attention, letting every token attend to every other "
+    "token in the sequence and making training far easier to parallelize on modern accelerators."
+)
+
+
+def _reference_simhash(text):
+    # Straightforward per-bit SimHash the fast version must agree with
+    import re
+
+    words = re.findall(r"\w+", text.lower())
+    weights = [0] * 64
+    for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+        h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+
+def _tool(tool_name, items):
+    return {"tool_name": tool_name, "args": {}, "result": items}
+
+
+def test_canonicalize_url_ignores_trivial_differences():
+    a = canonicalize_url("http://www.example.com/post/?utm_source=x&b=2&a=1#top")
+    b = canonicalize_url("https://example.com/post?a=1&b=2")
+    assert a == b
+
+
+def test_canonicalize_url_maps_arxiv_links_to_ids():
+    assert canonicalize_url("https://arxiv.org/abs/1706.03762v5") == "arxiv:1706.03762"
+    assert canonicalize_url("http://arxiv.org/pdf/1706.03762.pdf") == "arxiv:1706.03762"
+
+
+def test_simhash_matches_reference():
+    for text in (TEXT, TEXT + " " + TEXT, "the the the " * 20):
+        assert simhash(text) == _reference_simhash(text)
+
+
+def test_simhash_skips_short_text():
+    assert simhash("too short to compare") is None
+
+
+def test_simhash_near_duplicates_are_close():
+    near = TEXT.replace("far easier", "much easier")
+    distance = bin(simhash(TEXT) ^ simhash(near)).count("1")
+    assert distance <= 6
+
+
+def test_dedup_keeps_the_primary_source():
+    arxiv = {"title": "Attention", "url": "https://arxiv.org/abs/1706.03762", "summary": "paper"}
+    web = {"title": "Attention (mirror)", "url": "http://arxiv.org/pdf/1706.03762v2", "content": "copy"}
+    results = [_tool("tavily_search_tool", [web]), _tool("arxiv_search_tool", [arxiv])]
+    deduped, report = dedup_tool_results(results)
+    assert deduped[0]["result"] == []
+    assert deduped[1]["result"] == [arxiv]
+    assert report["by_url"] == 1
+
+
+def test_dedup_removes_near_duplicate_text():
+    first = {"title": "A", "url": "https://a.example/x", "content": TEXT}
+    second = {"title": "B", "url": "https://b.example/y", "content": TEXT.replace("far easier", "much easier")}
+    error = {"error": "timeout"}
+    deduped, report = dedup_tool_results([_tool("tavily_search_tool", [first, second, error])])
+    assert deduped[0]["result"] == [first, error]
+    assert report["near_duplicate"] == 1
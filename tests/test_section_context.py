@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+import src.section_context as sc
+from src.context_compaction import count_tokens
+from src.section_context import section_contexts, split_passages
+
+METHODS = "Sampling used structured interviews and a questionnaire with forty participants across three clinics."
+RESULTS = "Benchmark accuracy scores rose to ninety one percent on the held out evaluation split."
+BOTH = "Interview and questionnaire answers were compared with the benchmark accuracy scores afterwards."
+FILLER = [
+    f"The weather near site {i} stayed mild and dry through the spring season of that year."
+    for i in range(12)
+]
+
+SECTIONS = [
+    {"name": "methods", "title": "Methods", "description": "sampling interviews questionnaire participants"},
+    {"name": "results", "title": "Results", "description": "benchmark accuracy scores evaluation"},
+]
+
+
+@pytest.fixture(autouse=True)
+def one_line_passages(monkeypatch):
+    monkeypatch.setattr(sc, "SECTION_RETRIEVAL", True)
+    monkeypatch.setattr(sc, "SECTION_PASSAGE_TOKENS", 30)
+
+
+def _research():
+    return "\n".join(FILLER[:4] + [METHODS] + FILLER[4:8] + [RESULTS, BOTH] + FILLER[8:])
+
+
+def test_split_passages_flattens_html_and_respects_the_size():
+    html = "<table>" + "".join(f"<tr><td>row {i}</td><td>{FILLER[i]}</td></tr>" for i in range(6)) + "</table>"
+    passages = split_passages(html, target_tokens=60)
+    assert all("<" not in p for p in passages)
+    assert passages[0].startswith("row 0 | The weather")
+    assert all(count_tokens(p) <= 60 for p in passages)
+    assert "\n".join(passages).count("row ") == 6
+
+
+def test_an_overlong_line_is_split_at_word_boundaries():
+    line = " ".join(f"word{i}" for i in range(400))
+    passages = split_passages(line, target_tokens=50)
+    assert len(passages) > 1
+    assert " ".join(passages).split() == line.split()
+
+
+def test_passages_go_to_the_sections_that_match_them():
+    research = _research()
+    shared, contexts, request, report = section_contexts(research, SECTIONS, research, "clinic study", budget=60)
+    assert contexts["methods"] == METHODS
+    assert contexts["results"] == RESULTS
+    # Wanted by both sections: sent once, as the shared prefix
+    assert shared == BOTH
+    assert request == "clinic study"
+    assert report["tokens_shared"] == count_tokens(BOTH)
+    assert report["tokens_sent"] < report["tokens_full"]
+
+
+def test_each_section_stays_within_its_budget():
+    research = _research()
+    shared, contexts, _, _ = section_contexts(research, SECTIONS, "request", "clinic study", budget=40)
+    for name in ("methods", "results"):
+        assert count_tokens(shared) + count_tokens(contexts[name]) <= 40
+
+
+def test_sections_with_no_matching_passage_get_the_start_of_the_research():
+    research = _research()
+    sections = [{"name": "other", "title": "Zebras", "description": "giraffes"}]
+    shared, contexts, _, _ = section_contexts(research, sections, "request", "", budget=50)
+    assert shared == ""
+    assert contexts["other"].startswith(FILLER[0])
+
+
+def test_research_within_the_budget_is_shared_whole():
+    research = METHODS + "\n" + RESULTS
+    shared, contexts, request, report = section_contexts(research, SECTIONS, research, "clinic study", budget=1000)
+    assert shared == research
+    assert contexts == {"methods": "", "results": ""}
+    assert request == "clinic study"
+    assert report["tokens_sent"] < report["tokens_full"]
+
+
+def test_retrieval_can_be_switched_off(monkeypatch):
+    monkeypatch.setattr(sc, "SECTION_RETRIEVAL", False)
+    research = _research()
+    shared, contexts, _, _ = section_contexts(research, SECTIONS, "request", "clinic study", budget=40)
+    assert shared == research
+    assert contexts == {"methods": "", "results": ""}
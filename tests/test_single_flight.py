@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import threading
+import time
+
+import pytest
+
+from src.single_flight import SingleFlight
+
+
+def _run_concurrently(n, target):
+    results = [None] * n
+    errors = [None] * n
+
+    def run(i):
+        try:
+            results[i] = target()
+        except Exception as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, errors
+
+
+def test_concurrent_identical_calls_run_once():
+    flights = SingleFlight()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        time.sleep(0.2)
+        return {"items": [1, 2, 3]}
+
+    results, errors = _run_concurrently(4, lambda: flights.do("tool", "key", fetch))
+    assert calls == [1]
+    assert errors == [None] * 4
+    assert all(r == {"items": [1, 2, 3]} for r in results)
+    # Every caller has its own copy
+    assert len({id(r) for r in results}) == 4
+    stats = flights.stats()
+    assert stats["calls"] == 4
+    assert stats["coalesced"] == 3
+    assert stats["in_flight"] == 0
+
+
+def test_leader_mutation_does_not_reach_followers():
+    flights = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+
+    def fetch():
+        started.set()
+        release.wait()
+        return {"items": [1]}
+
+    leader_result = {}
+
+    def leader():
+        result = flights.do("tool", "key", fetch)
+        result["items"].append("mutated")
+        leader_result["value"] = result
+
+    leader_thread = threading.Thread(target=leader)
+    leader_thread.start()
+    started.wait()
+    follower_result = {}
+    follower_thread = threading.Thread(
+        target=lambda: follower_result.update(value=flights.do("tool", "key", fetch))
+    )
+    follower_thread.start()
+    time.sleep(0.05)
+    release.set()
+    leader_thread.join()
+    follower_thread.join()
+    assert leader_result["value"]["items"] == [1, "mutated"]
+    assert follower_result["value"]["items"] == [1]
+
+
+def test_errors_reach_every_caller():
+    flights = SingleFlight()
+
+    def fail():
+        time.sleep(0.1)
+        raise ValueError("boom")
+
+    _, errors = _run_concurrently(3, lambda: flights.do("tool", "key", fail))
+    assert all(isinstance(e, ValueError) for e in errors)
+
+
+def test_sequential_calls_are_not_cached():
+    flights = SingleFlight()
+    calls = []
+    flights.do("tool", "key", lambda: calls.append(1))
+    flights.do("tool", "key", lambda: calls.append(1))
+    assert calls == [1, 1]
+
+
+def test_async_calls_coalesce_and_get_copies():
+    flights = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"items": [1]}
+
+    async def main():
+        results = await asyncio.gather(*(flights.do_async("tool", "key", fetch) for _ in range(3)))
+        results[0]["items"].append("mutated")
+        return results
+
+    results = asyncio.run(main())
+    assert calls == [1]
+    assert [r["items"] for r in results[1:]] == [[1], [1]]
+    assert flights.stats()["in_flight"] == 0
+
+
+def test_async_errors_reach_every_caller():
+    flights = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def main():
+        return await asyncio.gather(
+            *(flights.do_async("tool", "key", fail) for _ in range(2)), return_exceptions=True
+        )
+
+    assert all(isinstance(r, ValueError) for r in asyncio.run(main()))
+
+
+def test_unhashable_key_is_rejected():
+    with pytest.raises(TypeError):
+        SingleFlight().do("tool", ["not", "hashable"], lambda: None)
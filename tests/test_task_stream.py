@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+import src.task_stream as ts
+from src.task_stream import StreamSink, TaskStreams
+
+
+def _collect(streams, task_id):
+    async def run():
+        return [event async for event in streams.subscribe(task_id)]
+
+    return asyncio.run(run())
+
+
+def _delta(text, part="Introduction", step=3):
+    return {"type": "delta", "step": step, "agent": "write_section_parallel", "part": part, "text": text}
+
+
+def test_consecutive_deltas_are_merged_in_the_backlog():
+    streams = TaskStreams()
+    streams.publish("t", {"type": "step", "step": 3, "title": "Write"})
+    for text in ("Hel", "lo", " world"):
+        streams.publish("t", _delta(text))
+    streams.publish("t", _delta("Other", part="Methods"))
+    streams.publish("t", _delta(" part", part="Methods"))
+    streams.publish("t", _delta("!", part="Introduction"))
+    streams.publish("t", {"type": "done", "status": "done"})
+    events = _collect(streams, "t")
+    assert [e.get("text") for e in events] == [None, "Hello world", "Other part", "!", None]
+    assert events[-1] == {"type": "done", "status": "done"}
+
+
+def test_a_late_subscriber_gets_the_backlog_then_live_events():
+    streams = TaskStreams()
+    sink = StreamSink(streams, "t", 3)
+    sink.delta("writer_agent", "report", "Draft ")
+
+    async def run():
+        received = []
+
+        async def subscribe():
+            async for event in streams.subscribe("t"):
+                received.append(event)
+
+        reader = asyncio.create_task(subscribe())
+        await asyncio.sleep(0.01)
+        # Published from another thread, as the sync workflow does
+        await asyncio.to_thread(sink.delta, "writer_agent", "report", "one")
+        await asyncio.to_thread(sink.delta, "writer_agent", "report", " two")
+        await asyncio.to_thread(sink.part_done, "writer_agent", "report")
+        await asyncio.to_thread(streams.publish, "t", {"type": "done", "status": "done"})
+        await asyncio.wait_for(reader, 5)
+        return received
+
+    received = asyncio.run(run())
+    # Live subscribers see every delta unmerged
+    assert [e.get("text") for e in received] == ["Draft ", "one", " two", None, None]
+    assert [e["type"] for e in received[-2:]] == ["part_done", "done"]
+    assert streams._streams["t"]["subscribers"] == set()
+
+
+def test_empty_deltas_are_not_published():
+    streams = TaskStreams()
+    StreamSink(streams, "t", 1).delta("writer_agent", "report", "")
+    assert not streams.known("t")
+
+
+def test_finished_streams_are_purged_after_the_retention(monkeypatch):
+    streams = TaskStreams()
+    streams.publish("old", {"type": "done", "status": "done"})
+    monkeypatch.setattr(ts, "STREAM_RETENTION", -1)
+    streams.publish("new", {"type": "done", "status": "done"})
+    assert not streams.known("old")
+
+
+def test_idle_subscribers_get_keep_alives(monkeypatch):
+    monkeypatch.setattr(ts, "STREAM_HEARTBEAT", 0.01)
+    streams = TaskStreams()
+
+    async def run():
+        events = streams.subscribe("t")
+        first = await events.__anext__()
+        streams.publish("t", {"type": "done", "status": "done"})
+        rest = [event async for event in events]
+        return first, rest
+
+    first, rest = asyncio.run(run())
+    assert first is None
+    assert rest[-1]["type"] == "done"
+
+
+def test_stream_sink_follows_the_step_scope(monkeypatch):
+    monkeypatch.setattr(ts, "task_streams", TaskStreams())
+    monkeypatch.setattr(ts, "STREAM_COMPLETIONS", True)
+    assert ts.stream_sink("writer_agent") is None
+    with ts.task_stream_scope("t", 2, "Write"):
+        sink = ts.stream_sink("writer_agent")
+        assert sink.task_id == "t" and sink.step == 2
+        assert ts.stream_sink("research_agent") is None
+    assert ts.stream_sink("writer_agent") is None
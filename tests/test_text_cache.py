@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+import time
+
+from src.text_cache import TextCache, arxiv_cache_key, arxiv_id
+
+
+def test_arxiv_id_parses_abs_and_pdf_links():
+    assert arxiv_id("https://arxiv.org/abs/2101.00001v2") == ("2101.00001", "v2")
+    assert arxiv_id("http://arxiv.org/pdf/2101.00001.pdf") == ("2101.00001", "")
+    assert arxiv_id("https://arxiv.org/abs/hep-th/9901001v1") == ("hep-th/9901001", "v1")
+    assert arxiv_id("https://example.org/paper.pdf") is None
+
+
+def test_arxiv_cache_key_prefers_the_versioned_id():
+    assert arxiv_cache_key("https://arxiv.org/abs/2101.00001v2", None) == "arxiv:2101.00001v2"
+    assert arxiv_cache_key(None, "http://example.org/a.pdf") == "url:https://example.org/a.pdf"
+    assert arxiv_cache_key(None, None) is None
+
+
+def test_put_and_get_round_trip(tmp_path):
+    cache = TextCache(path=str(tmp_path / "text.db"))
+    assert cache.get("arxiv:1") is None
+    cache.put("arxiv:1", "extracted text", pdf_bytes=1000, extract_seconds=0.5)
+    assert cache.get("arxiv:1") == "extracted text"
+    stats = cache.stats()
+    assert stats["process"] == {"hits": 1, "misses": 1}
+    assert stats["shared"]["pdf_bytes_saved"] == 1000
+    assert stats["entries"] == 1
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = TextCache(path=str(tmp_path / "text.db"), max_bytes=25)
+    cache.put("a", "x" * 10)
+    time.sleep(0.01)
+    cache.put("b", "y" * 10)
+    time.sleep(0.01)
+    cache.get("a")
+    time.sleep(0.01)
+    cache.put("c", "z" * 10)
+    assert cache.get("b") is None
+    assert cache.get("a") == "x" * 10
+    assert cache.get("c") == "z" * 10
+    assert cache.stats()["shared"]["evictions"] == 1
+
+
+def test_text_larger_than_the_cache_is_not_stored(tmp_path):
+    cache = TextCache(path=str(tmp_path / "text.db"), max_bytes=5)
+    cache.put("big", "too long to fit")
+    assert cache.get("big") is None
+
+
+def test_processes_share_the_store(tmp_path):
+    path = str(tmp_path / "text.db")
+    TextCache(path=path).put("k", "shared")
+    assert TextCache(path=path).get("k") == "shared"
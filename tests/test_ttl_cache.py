@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+import time
+
+from src.ttl_cache import TTLCache
+
+
+def test_get_returns_fresh_entries():
+    cache = TTLCache(ttl=60)
+    cache.set("k", {"v": 1})
+    assert cache.get("k") == {"v": 1}
+    assert cache.get("missing") is None
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    cache = TTLCache(ttl=60)
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now)
+    cache.set("k", 1)
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert cache.get("k") is None
+    assert cache.stats()["expired"] == 1
+    assert cache.stats()["entries"] == 0
+
+
+def test_max_age_is_per_lookup(monkeypatch):
+    cache = TTLCache(ttl=3600)
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now)
+    cache.set("k", 1)
+    monkeypatch.setattr(time, "time", lambda: now + 600)
+    # Too old for this caller, but kept for callers with a wider window
+    assert cache.get("k", max_age=300) is None
+    assert cache.get("k") == 1
+    # max_age never extends the TTL
+    monkeypatch.setattr(time, "time", lambda: now + 7200)
+    assert cache.get("k", max_age=10000) is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(ttl=60, max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import threading
+import time
+
+import pytest
+
+from src.workflow_dag import ancestors, linear_dependencies, run_dag, run_dag_async
+
+
+def test_linear_dependencies_and_ancestors():
+    assert linear_dependencies(3) == [[], [0], [1]]
+    assert linear_dependencies(0) == []
+    deps = [[], [], [0, 1], [2], [1]]
+    assert ancestors(deps, 3) == [0, 1, 2]
+    assert ancestors(deps, 4) == [1]
+    assert ancestors(deps, 0) == []
+
+
+@pytest.mark.parametrize("deps", [[[1], [0]], [[0]], [[], [5]]])
+def test_invalid_graphs_are_rejected_before_any_step_runs(deps):
+    ran = []
+    with pytest.raises(ValueError):
+        run_dag(deps, ran.append)
+    assert ran == []
+
+
+def test_steps_run_after_their_dependencies():
+    deps = [[], [], [0, 1], [2]]
+    order = []
+    lock = threading.Lock()
+
+    def step(i):
+        with lock:
+            order.append(i)
+
+    run_dag(deps, step)
+    assert sorted(order) == [0, 1, 2, 3]
+    assert order.index(2) > max(order.index(0), order.index(1))
+    assert order[-1] == 3
+
+
+def test_independent_steps_run_concurrently():
+    # Steps 0 and 1 each wait for the other to start, so they must overlap
+    started = [threading.Event(), threading.Event()]
+
+    def step(i):
+        if i < 2:
+            started[i].set()
+            assert started[1 - i].wait(5)
+
+    run_dag([[], [], [0, 1]], step)
+
+
+def test_a_failed_step_stops_new_steps_and_raises_the_first_error():
+    ran = []
+
+    def step(i):
+        ran.append(i)
+        if i == 0:
+            raise RuntimeError("step 1 failed")
+        if i == 1:
+            # Still running when step 1 fails; it is let finish
+            time.sleep(0.05)
+            raise RuntimeError("step 2 failed later")
+
+    with pytest.raises(RuntimeError, match="step 1 failed"):
+        run_dag([[], [], [0], [1]], step)
+    assert sorted(ran) == [0, 1]
+
+
+def test_run_dag_async_overlaps_independent_steps():
+    active, peak, order = [0], [0], []
+
+    async def step(i):
+        active[0] += 1
+        peak[0] = max(peak[0], active[0])
+        await asyncio.sleep(0.01)
+        active[0] -= 1
+        order.append(i)
+
+    asyncio.run(run_dag_async([[], [], [0, 1]], step))
+    assert peak[0] == 2
+    assert order[-1] == 2
+
+
+def test_run_dag_async_raises_the_first_error():
+    with pytest.raises(RuntimeError, match="step 1 failed"):
+        asyncio.run(run_dag_async([[], [0]], _failing_step))
+
+
+async def _failing_step(i):
+    if i == 0:
+        raise RuntimeError("step 1 failed")
+    raise AssertionError("a step after a failure must not start")
+
+
+def test_planner_dependencies_form_a_valid_graph():
+    from src.planning_agent import PLAN_DEPENDENCIES, plan_dependencies
+
+    steps = ["step"] * len(PLAN_DEPENDENCIES)
+    deps = plan_dependencies(steps)
+    run_dag(deps, lambda i: None)
+    assert plan_dependencies(["a", "b"]) == [[], [0]]